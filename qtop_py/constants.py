@@ -8,6 +8,7 @@ QTOP_LOGFILE = os.path.expandvars(QTOP_LOGFILE)
 USERPATH = os.path.expandvars("$HOME/.local/qtop")
 MAX_UNIX_ACCOUNTS = 87  # was : 62
 KEYPRESS_TIMEOUT = 2  # in sec, time to wait before autorefreshing display
+SCHEDULER_COMMAND_TIMEOUT = 120  # in sec, unless set in QTOPCONF_YAML
 FALLBACK_TERMSIZE = [53, 176]
 SYMBOL_LONG_TAIL_USER = "*"
 SYMBOL_UNKNOWN_NODE_STATE = "?"
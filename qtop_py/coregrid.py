@@ -0,0 +1,181 @@
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+from itertools import accumulate, chain
+
+from qtop_py import utils
+
+
+class CellPalette(object):
+    """
+    Hands out one-byte codes for the symbols and the colors of the core matrix cells,
+    and one shared ColorStr per (symbol, color) pair for the display.
+    Codes are never reassigned, so a palette can be carried over from one refresh to the next
+    along with the node columns encoded with it.
+    """
+
+    MAX_CODES = 256
+
+    def __init__(self):
+        self.symbols = []
+        self.colors = []
+        self._symbol_codes = dict()
+        self._color_codes = dict()
+        self._symbol_translation = dict()
+        self._cells = dict()
+
+    def symbol_code(self, symbol):
+        try:
+            return self._symbol_codes[symbol]
+        except KeyError:
+            code = self._add_code(self.symbols, self._symbol_codes, symbol)
+            self._symbol_translation[code] = symbol
+            return code
+
+    def color_code(self, color):
+        try:
+            return self._color_codes[color]
+        except KeyError:
+            return self._add_code(self.colors, self._color_codes, color)
+
+    def _add_code(self, values, codes, value):
+        if len(values) == self.MAX_CODES:
+            raise CellPaletteFull("More than %s distinct cell symbols/colors in the core matrix" % self.MAX_CODES)
+        codes[value] = len(values)
+        values.append(value)
+        return codes[value]
+
+    def new_column(self, core_count, symbol, color):
+        """Returns a (symbols, colors) pair of bytearrays for a node column with all its cells set to symbol/color"""
+        return bytearray((self.symbol_code(symbol),)) * core_count, bytearray((self.color_code(color),)) * core_count
+
+    def set_cell(self, column, core, symbol, color):
+        symbols, colors = column
+        symbols[core] = self.symbol_code(symbol)
+        colors[core] = self.color_code(color)
+
+    def decode_symbols(self, codes):
+        """Turns a run of symbol codes into the string of the respective symbols"""
+        return codes.decode("latin-1").translate(self._symbol_translation)
+
+    def get_cell(self, symbol_code, color_code):
+        try:
+            return self._cells[(symbol_code, color_code)]
+        except KeyError:
+            cell = self._cells[(symbol_code, color_code)] = utils.ColorStr(self.symbols[symbol_code], color=self.colors[color_code])
+            return cell
+
+
+class CellPaletteFull(Exception):
+    pass
+
+
+class LineCounts(object):
+    """
+    The cells of a core line that are counted, as one byte per node, 1 if counted and 0 otherwise,
+    along with the running count of the counted cells at the start of every BLOCK nodes.
+    The counted cells of any window of nodes are the ones of the whole blocks in between, corrected by at most two partial blocks.
+    """
+
+    BLOCK = 64
+
+    def __init__(self, counted):
+        self.counted = counted
+        block = self.BLOCK
+        self.block_counts = list(accumulate(chain((0,), (counted.count(1, node, node + block) for node in range(0, len(counted), block)))))
+
+    def count(self, start, stop):
+        """Number of counted cells from node start up to node stop, both within the line"""
+        first, last = start // self.BLOCK, stop // self.BLOCK
+        counted = self.counted
+        return self.block_counts[last] - self.block_counts[first] - counted.count(1, first * self.BLOCK, start) + counted.count(1, last * self.BLOCK, stop)
+
+
+class CoreGrid(object):
+    """
+    The core matrix, as two planes of one-byte codes (see CellPalette): the symbols and the colors of the cells.
+    Both planes are stored node after node, so that a node's column is a contiguous slice,
+    whereas a core line is an extended slice with a step of core_count.
+    The cells of given symbols are counted along each core line once (see get_line_counts), so that they are counted in O(1) for any window of nodes.
+    """
+
+    def __init__(self, core_count, palette):
+        self.core_count = core_count
+        self.node_count = 0
+        self.palette = palette
+        self.symbols = bytearray()
+        self.colors = bytearray()
+        self._line_counts = dict()
+
+    @classmethod
+    def from_columns(cls, core_count, palette, columns):
+        """columns is a list of (symbols, colors) pairs, each core_count long, as returned by CellPalette.new_column"""
+        grid = cls(core_count, palette)
+        grid.symbols = bytearray(b"".join(symbols for symbols, colors in columns))
+        grid.colors = bytearray(b"".join(colors for symbols, colors in columns))
+        grid.node_count = len(columns)
+        return grid
+
+    def set_column(self, node, column):
+        symbols, colors = column
+        start = node * self.core_count
+        self.symbols[start : start + self.core_count] = symbols
+        self.colors[start : start + self.core_count] = colors
+        self._line_counts.clear()
+
+    def _get_line_slice(self, core, start, stop):
+        stop = self.node_count if stop is None else min(stop, self.node_count)
+        start = max(start, 0)
+        return slice(start * self.core_count + core, stop * self.core_count, self.core_count)
+
+    def get_line_length(self, start=0, stop=None):
+        """The number of cells of a core line from node start up to node stop"""
+        stop = self.node_count if stop is None else min(stop, self.node_count)
+        return max(stop - max(start, 0), 0)
+
+    def get_line_counts(self, symbols):
+        """
+        The LineCounts of the cells whose symbol is one of symbols, one per core line.
+        They are made once per symbols, until a column is set.
+        """
+        symbols = frozenset(symbols)
+        try:
+            return self._line_counts[symbols]
+        except KeyError:
+            is_counted = bytearray(256)  # translates each symbol code to 1 if its cells are counted, 0 otherwise
+            for symbol in symbols:
+                if symbol in self.palette._symbol_codes:
+                    is_counted[self.palette._symbol_codes[symbol]] = 1
+            counted = self.symbols.translate(is_counted)
+            line_counts = self._line_counts[symbols] = [LineCounts(bytes(counted[core :: self.core_count])) for core in range(self.core_count)]
+            return line_counts
+
+    def count_line_cells(self, core, symbols, start=0, stop=None):
+        """Number of cells of a core line, from node start up to node stop, whose symbol is one of symbols"""
+        stop = self.node_count if stop is None else min(stop, self.node_count)
+        start = max(start, 0)
+        return self.get_line_counts(symbols)[core].count(start, stop) if start < stop else 0
+
+    def get_line_symbols(self, core, start=0, stop=None):
+        """The symbols of a core line, from node start up to node stop, as a string"""
+        return self.palette.decode_symbols(self.symbols[self._get_line_slice(core, start, stop)])
+
+    def get_line_cells(self, core, start=0, stop=None):
+        """The cells of a core line, from node start up to node stop, as ColorStr instances"""
+        line_slice = self._get_line_slice(core, start, stop)
+        get_cell = self.palette.get_cell
+        return [get_cell(symbol_code, color_code) for symbol_code, color_code in zip(self.symbols[line_slice], self.colors[line_slice])]
+
+    def get_node_cells(self, node, cores):
+        """The cells of the given cores of a node, as ColorStr instances"""
+        start = node * self.core_count
+        get_cell = self.palette.get_cell
+        return [get_cell(self.symbols[start + core], self.colors[start + core]) for core in cores]
+
+    def count_cells_except(self, symbols):
+        """Number of cells in the grid whose symbol isn't one of symbols"""
+        symbol_codes = self.palette._symbol_codes
+        return len(self.symbols) - sum(self.symbols.count(symbol_codes[symbol]) for symbol in set(symbols) if symbol in symbol_codes)
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import errno
@@ -23,6 +24,37 @@ def check_empty_file(orig_file):
         raise FileEmptyError(orig_file)
 
 
+def get_stat_fingerprint(path):
+    """
+    Returns a (size, mtime, inode) tuple for path, or None if path doesn't exist.
+    Cheap enough to be called on every refresh to find out whether a file may have changed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def get_content_fingerprint(path, previous=None, blocksize=1 << 20):
+    """
+    Returns a (stat fingerprint, digest) pair for path.
+    The file is only hashed if its stat fingerprint differs from the one in previous,
+    so that an untouched file costs a single stat() call.
+    """
+    stat_fingerprint = get_stat_fingerprint(path)
+    if stat_fingerprint is None:
+        return None, None
+    if previous is not None and previous[0] == stat_fingerprint:
+        return previous
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(blocksize), b""):
+            digest.update(block)
+    return stat_fingerprint, digest.hexdigest()
+
+
 def get_new_temp_file(_savepath, suffix, prefix):  # **kwargs
     """
     Using mkstemp instead of NamedTemporaryFile because a file descriptor
@@ -96,6 +128,16 @@ def get_sample_filename(SAMPLE_FILENAME, config):
     return SAMPLE_FILENAME
 
 
+def is_json_file(path, blocksize=4096):
+    """Tells whether path holds a JSON object, judging from its first non-whitespace character"""
+    with open(path) as fin:
+        for block in iter(lambda: fin.read(blocksize), ""):
+            block = block.lstrip()
+            if block:
+                return block[0] == "{"
+    return False
+
+
 class FileNotFound(Exception):
     def __init__(self, fn):
         msg = "File %s not found.\nMaybe the correct scheduler is not specified?" % fn
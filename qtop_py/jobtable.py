@@ -0,0 +1,205 @@
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+from array import array
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+
+JobDoc = namedtuple("JobDoc", ["user_name", "job_state", "job_queue"])
+
+
+def strip_array_suffix(job_id):
+    """The key of a job in a JobTable: job array ids such as 123[] lose their trailing []"""
+    return job_id[:-2] if job_id.endswith("[]") else job_id
+
+
+class SymbolTable(object):
+    """
+    Interns the strings of a column: each distinct string gets the next small integer id, in order of first appearance.
+    Ids are never reassigned, so that columns encoded with a table stay valid as it grows.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._ids = dict()
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, symbol_id):
+        return self.values[symbol_id]
+
+    def intern(self, value):
+        try:
+            return self._ids[value]
+        except KeyError:
+            symbol_id = self._ids[value] = len(self.values)
+            self.values.append(value)
+            return symbol_id
+
+    def decode(self, symbol_ids):
+        values = self.values
+        return [values[symbol_id] for symbol_id in symbol_ids]
+
+    def translation_from(self, other):
+        """A list mapping each id of other, another SymbolTable, to the id of the same string in this one, or -1 if it's not in it"""
+        ids = self._ids
+        return [ids.get(value, -1) for value in other.values]
+
+
+class Symbols(object):
+    """
+    The symbol tables of a session's snapshots: users, job states, queues and hosts.
+    RefreshEngine hands the same Symbols to each refresh, so that an id stands for the same string in consecutive snapshots,
+    and results kept on ids, such as the users of each node, can be compared and patched from one refresh to the next.
+    """
+
+    def __init__(self):
+        self.users = SymbolTable()
+        self.states = SymbolTable()
+        self.queues = SymbolTable()
+        self.hosts = SymbolTable()
+
+    def intern_worker_nodes(self, worker_nodes):
+        """Swaps the domainname of each worker node for the one in the hosts table, so that a node name is one string across nodes and refreshes"""
+        hosts = self.hosts
+        for worker_node in worker_nodes:
+            worker_node["domainname"] = hosts.values[hosts.intern(worker_node["domainname"])]
+        return worker_nodes
+
+
+class JobTable(Mapping):
+    """
+    The jobs of a snapshot, column by column: the job ids as the batch system reported them,
+    and the user, state and queue of each job as integer codes into the respective SymbolTable of symbols, a Symbols instance.
+    It reads as a {job id: JobDoc} mapping, job array ids being stored without their trailing [] (see strip_array_suffix).
+    A job id reported twice keeps the row of its first report, with the values of the last one, as a dict would.
+    """
+
+    def __init__(self, symbols=None):
+        self.symbols = symbols = symbols if symbols is not None else Symbols()
+        self.job_ids = []
+        self.users = symbols.users
+        self.states = symbols.states
+        self.queues = symbols.queues
+        self.user_codes = array("i")
+        self.state_codes = array("i")
+        self.queue_codes = array("i")
+        self._rows = dict()
+
+    @classmethod
+    def from_columns(cls, job_ids, user_names, job_states, job_queues, symbols=None):
+        """Builds a JobTable out of the four parallel lists of get_jobs_info, interning each column in one go"""
+        table = cls(symbols)
+        keys = [job_id[:-2] if job_id.endswith("[]") else job_id for job_id in job_ids]
+        rows = dict(zip(keys, range(len(keys))))
+        if len(rows) != len(keys) or not len(keys) == len(user_names) == len(job_states) == len(job_queues):
+            for job in zip(job_ids, user_names, job_states, job_queues):
+                table.add(*job)
+            return table
+
+        table.job_ids = list(job_ids)
+        table.user_codes = array("i", map(table.users.intern, user_names))
+        table.state_codes = array("i", map(table.states.intern, job_states))
+        table.queue_codes = array("i", map(table.queues.intern, job_queues))
+        table._rows = rows
+        return table
+
+    @classmethod
+    def from_mapping(cls, jobs, symbols=None):
+        """
+        Builds a JobTable out of a {job id: (user, state, queue)} mapping, such as the jobs of a saved Document.
+        A JobTable is returned as it is, unless it doesn't use symbols.
+        """
+        if isinstance(jobs, cls) and (symbols is None or jobs.symbols is symbols):
+            return jobs
+        values = list(jobs.values())
+        return cls.from_columns(list(jobs), [value[0] for value in values], [value[1] for value in values], [value[2] for value in values], symbols)
+
+    def add(self, job_id, user_name, job_state, job_queue):
+        """Appends a job, or updates its row if its id is already in the table"""
+        key = strip_array_suffix(job_id)
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self.job_ids)
+            self.job_ids.append(job_id)
+            self.user_codes.append(self.users.intern(user_name))
+            self.state_codes.append(self.states.intern(job_state))
+            self.queue_codes.append(self.queues.intern(job_queue))
+        else:
+            self.job_ids[row] = job_id
+            self.user_codes[row] = self.users.intern(user_name)
+            self.state_codes[row] = self.states.intern(job_state)
+            self.queue_codes[row] = self.queues.intern(job_queue)
+
+    def __getitem__(self, job_id):
+        row = self._rows[job_id]
+        return JobDoc(self.users.values[self.user_codes[row]], self.states.values[self.state_codes[row]], self.queues.values[self.queue_codes[row]])
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, job_id):
+        return job_id in self._rows
+
+    def user_names(self):
+        return self.users.decode(self.user_codes)
+
+    def job_states(self):
+        return self.states.decode(self.state_codes)
+
+    def job_queues(self):
+        return self.queues.decode(self.queue_codes)
+
+    def user_queue_ids(self, job_id):
+        """The (user id, queue id) pair of job_id, which may end in [] (see strip_array_suffix); KeyError if the job isn't in the table"""
+        row = self._rows[strip_array_suffix(job_id)]
+        return self.user_codes[row], self.queue_codes[row]
+
+    def user_ids_of(self, job_ids):
+        """The set of the ids of the users running any of job_ids, which may end in []; job ids that aren't in the table are skipped"""
+        rows, user_codes = self._rows, self.user_codes
+        return set(user_codes[rows[key]] for key in map(strip_array_suffix, job_ids) if key in rows)
+
+    def count_triplets(self):
+        """
+        Counts the jobs of each (user, job state, job queue) triplet, in order of first appearance.
+        The jobs are counted on their codes; only the distinct triplets are turned back into strings.
+        """
+        users, states, queues = self.users.values, self.states.values, self.queues.values
+        triplets = Counter()
+        for (user_code, state_code, queue_code), count in Counter(zip(self.user_codes, self.state_codes, self.queue_codes)).items():
+            triplets[(users[user_code], states[state_code], queues[queue_code])] = count
+        return triplets
+
+    def diff(self, old):
+        """
+        The (added, removed, changed) sets of job ids since old, another JobTable.
+        The codes of old are translated into the ones of this table, so that no job is turned back into strings.
+        """
+        rows, old_rows = self._rows, old._rows
+        added = set(rows).difference(old_rows)
+        removed = set(old_rows).difference(rows)
+        to_user = self.users.translation_from(old.users)
+        to_state = self.states.translation_from(old.states)
+        to_queue = self.queues.translation_from(old.queues)
+        user_codes, state_codes, queue_codes = self.user_codes, self.state_codes, self.queue_codes
+        old_user_codes, old_state_codes, old_queue_codes = old.user_codes, old.state_codes, old.queue_codes
+        changed = set()
+        for job_id, row in rows.items():
+            old_row = old_rows.get(job_id)
+            if old_row is None:
+                continue
+            if (
+                to_user[old_user_codes[old_row]] != user_codes[row]
+                or to_state[old_state_codes[old_row]] != state_codes[row]
+                or to_queue[old_queue_codes[old_row]] != queue_codes[row]
+            ):
+                changed.add(job_id)
+        return added, removed, changed
@@ -183,6 +183,8 @@ class DemoBatchSystem(GenericBatchSystem):
     by qtop in order to run.
     """
 
+    snapshot_from_output_files = False  # the simulation advances on every refresh
+
     @staticmethod
     def get_mnemonic():
         return "demo"
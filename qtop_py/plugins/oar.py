@@ -1,12 +1,124 @@
-from qtop_py.serialiser import StatExtractor, GenericBatchSystem
+try:
+    import ujson as json
+except ImportError:
+    import json
+from qtop_py.serialiser import StatExtractor, GenericBatchSystem, iter_json_members
 import logging
 import os
+import re
 
-##import re
-import qtop_py.yaml_parser as yaml
 from qtop_py import fileutils
 from qtop_py.utils import CountCalls
-from collections import OrderedDict
+from collections import Counter, OrderedDict
+
+# oarnodes -s -Y: a node name at the start of a line, then an indented "resource_id: state" line per resource
+OARNODES_S_RE = re.compile(r"^(?:(\S.*?):|[ \t]+(\d+):[ \t]*(\S+))[ \t\r]*$", re.M)
+# oarnodes -Y: a resource id at the start of a line, then its attributes, indented, of which only jobs is kept.
+# Matches start with the newline rather than with ^ in MULTILINE mode, which lets re skip ahead to the next newline.
+OARNODES_Y_RE = re.compile(r"\n(?:(\d+):|[ \t]+jobs:[ \t]*([^\n]*))")
+# the only resource attributes of oarnodes -J and job attributes of oarstat -J that are needed
+OARNODES_JSON_ATTRIBUTES = frozenset(["jobs"])
+OARSTAT_JSON_ATTRIBUTES = frozenset(["owner", "state", "queue"])
+# the state letters oarstat prints for the states oarstat -J spells out
+OARSTAT_STATE_CODES = {
+    "Waiting": "W",
+    "toAckReservation": "W",
+    "Hold": "H",
+    "toLaunch": "L",
+    "Launching": "L",
+    "Running": "R",
+    "Suspended": "S",
+    "Resuming": "S",
+    "Finishing": "F",
+    "Terminated": "T",
+    "Error": "E",
+    "toError": "E",
+}
+
+
+class OarResources(object):
+    """
+    The resources of oarnodes -s -Y as columns, in the order of the file: resource_ids, states and jobs,
+    jobs holding the job oarnodes -Y reports for each resource, or None if it is idle.
+    The resources of a node are contiguous; node_names and node_starts give each node and the index of its first resource,
+    so that the resources of a node are a slice of the columns.
+    """
+
+    def __init__(self):
+        self.node_names = []
+        self.node_starts = []
+        self.resource_ids = []
+        self.states = []
+        self.jobs = []
+
+    def __len__(self):
+        return len(self.resource_ids)
+
+    def iter_nodes(self):
+        """Yields the name, the states and the jobs of each node that has resources"""
+        ends = self.node_starts[1:] + [len(self.resource_ids)]
+        for node, start, end in zip(self.node_names, self.node_starts, ends):
+            if start < end:
+                yield node, self.states[start:end], self.jobs[start:end]
+
+
+def scan_oarnodes_s(text, resources):
+    """Appends the nodes, resource ids and states of an oarnodes -s -Y output to resources, in a single pass"""
+    add_node, add_start = resources.node_names.append, resources.node_starts.append
+    add_resource_id, add_state = resources.resource_ids.append, resources.states.append
+    for node, resource_id, state in OARNODES_S_RE.findall(text):
+        if node:
+            add_node(node)
+            add_start(len(resources.resource_ids))
+        else:
+            add_resource_id(int(resource_id))
+            add_state(state)
+    return resources
+
+
+def scan_oarnodes_y(text):
+    """Returns a {resource id: job} dict of the busy resources of an oarnodes -Y output, in a single pass"""
+    resids_jobs = dict()
+    resource_id = None
+    for resource_id_field, job in OARNODES_Y_RE.findall(text if text.startswith("\n") else "\n" + text):
+        if resource_id_field:
+            resource_id = int(resource_id_field)
+        elif resource_id not in resids_jobs:
+            resids_jobs[resource_id] = job.rstrip()
+    return resids_jobs
+
+
+def iter_json_document(fin, streaming, keep=None):
+    """
+    The (name, value) members of the top-level object of a JSON document, e.g. the jobs of oarstat -J.
+    If streaming, they are decoded one at a time, keeping only the attributes in keep; otherwise the whole document is loaded at once.
+    """
+    if streaming:
+        return iter_json_members(fin, None, keep=keep)
+    return json.load(fin).items()
+
+
+def read_oarnodes_s_json(fin, resources, streaming=False):
+    """Appends the nodes, resource ids and states of an oarnodes -s -J output to resources"""
+    for node, resids_states in iter_json_document(fin, streaming):
+        resources.node_names.append(node)
+        resources.node_starts.append(len(resources.resource_ids))
+        for resource_id, state in resids_states.items():
+            resources.resource_ids.append(int(resource_id))
+            resources.states.append(state)
+    return resources
+
+
+def read_oarnodes_y_json(fin, streaming=False):
+    """Returns a {resource id: job} dict of the busy resources of an oarnodes -J output"""
+    resids_jobs = dict()
+    for resource_id, resource in iter_json_document(fin, streaming, keep=OARNODES_JSON_ATTRIBUTES):
+        jobs = resource.get("jobs")
+        if isinstance(jobs, list):
+            jobs = jobs[0] if jobs else None
+        if jobs is not None and jobs != "":
+            resids_jobs[int(resource_id)] = str(jobs).strip()
+    return resids_jobs
 
 
 class OarStatExtractor(StatExtractor):
@@ -18,17 +130,31 @@ class OarStatExtractor(StatExtractor):
             r"(?P<user>[0-9A-Za-z_.-]+)\s+"
             r"(?:\d{4}-\d{2}-\d{2})\s+"
             r"(?:\d{2}:\d{2}:\d{2})\s+"
-            r"(?P<job_state>[RWF])\s+"
-            r"(?P<queue>default|besteffort)"
+            r"(?P<job_state>[A-Z])\s+"
+            r"(?P<queue>\S+)"
         )
 
     def extract_qstat(self, orig_file):
+        """
+        Parse output from:
+        oarstat
+        or oarstat -J
+        """
         all_values = list()
         try:
             fileutils.check_empty_file(orig_file)
         except fileutils.FileEmptyError:
             logging.error("File %s seems to be empty." % orig_file)
             return all_values
+
+        if fileutils.is_json_file(orig_file):
+            logging.info("Extracting oarstat output using json")
+            try:
+                return self._extract_qstat_json(orig_file)
+            except ValueError as e:
+                logging.error("File %s could not be parsed as json (%s)." % (orig_file, e))
+                return list()
+
         with open(orig_file, "r") as fin:
             logging.debug("File state before OarStatExtractor.extract_qstat: %(fin)s" % {"fin": fin})
             _ = fin.readline()  # header
@@ -41,8 +167,24 @@ class OarStatExtractor(StatExtractor):
 
         return all_values
 
+    def _extract_qstat_json(self, orig_file):
+        all_values = list()
+        with open(orig_file, "r") as fin:
+            for job_id, job in iter_json_document(fin, self.config.get("streaming_json_parsing"), keep=OARSTAT_JSON_ATTRIBUTES):
+                state = job.get("state") or "?"
+                qstat_values = dict()
+                qstat_values["JobId"] = job_id
+                qstat_values["UnixAccount"] = self.anonymize(job.get("owner"), "users")
+                qstat_values["S"] = OARSTAT_STATE_CODES.get(state, state[0].upper())
+                qstat_values["Queue"] = job.get("queue")
+                all_values.append(qstat_values)
+        return all_values
+
 
 class OARBatchSystem(GenericBatchSystem):
+    RUNNING_STATES = set(["R"])
+    QUEUED_STATES = set(["W"])
+
     @staticmethod
     def get_mnemonic():
         return "oar"
@@ -55,38 +197,41 @@ class OARBatchSystem(GenericBatchSystem):
         self.config = config
         self.options = options
         self.oar_stat_maker = OarStatExtractor(self.config, self.options)
+        self._qstats = None
 
     def get_worker_nodes(self, job_ids_oarstat, job_queues, options):
-        nodes_resids = self._read_oarnodes_s_yaml(self.oarnodes_s_file)
-        resids_jobs = self._read_oarnodes_y_textyaml(self.oarnodes_y_file)
-
-        job_discrepancy = self._check_job_discrepancy(job_ids_oarstat, resids_jobs, options)
-
-        nodes_jobs = {}
-        for node in nodes_resids:
-            resids_state_lot = nodes_resids[node]
-            for resid, state in resids_state_lot:
-                nodes_jobs.setdefault(node, []).append((resids_jobs[int(resid)], state))
+        resources = self._read_oarnodes()
+        # jobs oarnodes reports but oarstat doesn't know about are left out of the cores as they are come across
+        known_job_ids = set(job_ids_oarstat)
+        job_discrepancy = set()
 
         worker_nodes = list()
         # TODO: make user-tuneable
         node_state_mapping = {"Alive": "-", "Dead": "d", "Suspected": "s", "Mixed": "%"}
-        for node in nodes_jobs:
+        for node, states, jobs in resources.iter_nodes():
+            core_job_map = dict()
+            for idx, job in enumerate(jobs):
+                if job is None:
+                    continue
+                if job in known_job_ids:
+                    core_job_map[idx] = job
+                else:
+                    job_discrepancy.add(job)
             d = OrderedDict()
             d["domainname"] = node
-            nr_of_jobs = len(nodes_jobs[node])
-            d["np"] = nr_of_jobs
-            d["core_job_map"] = dict((idx, job[0]) for idx, job in enumerate(nodes_jobs[node]) if job[0] is not None and job[0] not in job_discrepancy)
-            d["state"] = self._calculate_oar_state(nodes_jobs[node], nr_of_jobs, node_state_mapping)
+            d["np"] = len(jobs)
+            d["core_job_map"] = core_job_map
+            d["state"] = self._calculate_oar_state(states, node_state_mapping)
             worker_nodes.append(d)
 
+        self._check_job_discrepancy(job_discrepancy, options)
         logging.info("worker_nodes contains %s entries" % len(worker_nodes))
         worker_nodes = self.ensure_worker_nodes_have_qnames(worker_nodes, job_ids_oarstat, job_queues)
         return worker_nodes
 
     def get_jobs_info(self):
         job_ids, usernames, job_states, queue_names = [], [], [], []
-        qstats = self.oar_stat_maker.extract_qstat(self.oarstat_file)
+        qstats = self._get_qstats()
         # TODO: clumsily glued, should be more naturally connected
         for qstat in qstats:
             job_ids.append(str(qstat["JobId"]))
@@ -103,74 +248,66 @@ class OARBatchSystem(GenericBatchSystem):
 
     def get_queues_info(self):
         """
-        OAR does not provide this info.
+        OAR has no per-queue job counts of its own, so the running and queued jobs of each queue are counted off oarstat,
+        queues in order of appearance. Queue states and limits are not known.
         """
+        qstats = self._get_qstats()
+        state_counts = Counter((qstat["Queue"], qstat["S"]) for qstat in qstats)
         total_running_jobs = 0
         total_queued_jobs = 0
         qstatq_lod = []
+        for queue_name in OrderedDict.fromkeys(qstat["Queue"] for qstat in qstats):
+            running_jobs = sum(state_counts[(queue_name, state)] for state in self.RUNNING_STATES)
+            queued_jobs = sum(state_counts[(queue_name, state)] for state in self.QUEUED_STATES)
+            total_running_jobs += running_jobs
+            total_queued_jobs += queued_jobs
+            qstatq_lod.append({"queue_name": queue_name, "run": str(running_jobs), "queued": str(queued_jobs), "lm": "--", "state": "?"})
         return total_running_jobs, total_queued_jobs, qstatq_lod
 
-    def _read_oarnodes_s_yaml(self, fn_s):
+    def _get_qstats(self):
+        if self._qstats is None:
+            self._qstats = self.oar_stat_maker.extract_qstat(self.oarstat_file)
+        return self._qstats
+
+    def _read_oarnodes(self):
+        """
+        Scans oarnodes -s -Y into the columns of an OarResources, then oarnodes -Y for the job of each resource,
+        skipping all its other attributes. Either file may hold the -J (JSON) output of the same command instead.
+        """
+        fn_s = self.oarnodes_s_file
         assert os.path.isfile(fn_s)
-        anonymize = self.oar_stat_maker.anonymize_func()
         logging.debug("File %s exists: %s" % (fn_s, os.path.isfile(fn_s)))
         try:
             assert os.stat(fn_s).st_size != 0
         except AssertionError:
             logging.critical("File %s is empty!! Exiting...\n" % fn_s)
             raise
-        data = yaml.safe_load(fn_s, DEF_INDENT=4)
+        with open(fn_s, mode="r") as fin:
+            if fileutils.is_json_file(fn_s):
+                logging.info("Extracting oarnodes -s output using json")
+                resources = read_oarnodes_s_json(fin, OarResources(), self.config.get("streaming_json_parsing"))
+            else:
+                resources = scan_oarnodes_s(fin.read(), OarResources())
         if self.options.ANONYMIZE:
-            nodes_resids = dict([(anonymize(node, "wns"), resid_state.items()) for node, resid_state in data.items()])
-        else:
-            nodes_resids = dict([(node, resid_state.items()) for node, resid_state in data.items()])
-        return nodes_resids
-
-    def _read_oarnodes_y_textyaml(self, fn):
-        oar_nodes = {}
-        logging.debug("Before opening %s" % fn)
-        with open(fn, mode="r") as fin:
-            logging.debug("File state %s" % fin)
-            fin.readline()  # '---'
-            line = fin.readline().strip()  # first res_id
-            while line:
-                oar_node, line = self._read_oar_node_y_textyaml(fin, line)
-                oar_nodes.update(oar_node)
-
-        resids_jobs = dict([(resid, info["jobs"]) for resid, info in oar_nodes.items()])
-        return resids_jobs
-
-    @staticmethod
-    @CountCalls
-    def _read_oar_node_y_textyaml(fin, line):
-        """
-        reads one res-id block at a time, skipping all information except its job
-        """
-        _oarnode = dict()
-
-        res_id = line.strip(": ")
-
-        line = fin.readline().strip()
-        while line and not line[0].isdigit():
-            if line.startswith("jobs"):
-                key, value = line.split(": ")
-                _oarnode[int(res_id)] = dict()
-                _oarnode[int(res_id)][key] = value
-                break
-            line = fin.readline().strip()
-        while line and not line[0].isdigit():  # no need to check every line for jobs key anymore!
-            line = fin.readline().strip()
+            anonymize = self.oar_stat_maker.anonymize_func()
+            resources.node_names = [anonymize(node, "wns") for node in resources.node_names]
 
-        _oarnode.setdefault(int(res_id), {"jobs": None})
-        return _oarnode, line
+        logging.debug("Before opening %s" % self.oarnodes_y_file)
+        with open(self.oarnodes_y_file, mode="r") as fin:
+            if fileutils.is_json_file(self.oarnodes_y_file):
+                logging.info("Extracting oarnodes output using json")
+                resids_jobs = read_oarnodes_y_json(fin, self.config.get("streaming_json_parsing"))
+            else:
+                resids_jobs = scan_oarnodes_y(fin.read())
+        resources.jobs = [resids_jobs.get(resource_id) for resource_id in resources.resource_ids]
+        return resources
 
-    def _calculate_oar_state(self, jobid_state_lot, nr_of_jobs, node_state_mapping):
+    def _calculate_oar_state(self, states, node_state_mapping):
         """
         If all resource ids within the node are either alive or dead or suspected, the respective label is given to the node.
         Otherwise, a mixed-state is reported
         """
         # todo: make user-tuneable
-        states = [job_state_tpl[1] for job_state_tpl in jobid_state_lot]
         alive = states.count("Alive")
         dead = states.count("Dead")
         suspected = states.count("Suspected")
@@ -181,15 +318,12 @@ class OARBatchSystem(GenericBatchSystem):
         else:
             return node_state_mapping[states[0]]
 
-    def _check_job_discrepancy(self, job_ids_oarstat, resids_jobs, options):
+    def _check_job_discrepancy(self, discrepancy, options):
         """
-        compares job_ids reported by oarstat with job_ids reported by oarnodes_s_Y
+        reports the jobs of the resources reported by oarnodes_Y that oarstat does not know about
         A debug msg is printed twice in the beginning, if displaying a cluster instance (-s switch)
         in watch mode, otherwise it is printed forever, every time a discrepancy is detected anew.
         """
-        set_jobs_in_oarnodes = set(resids_jobs.values())
-        set_jobs_in_oarnodes.discard(None)
-        discrepancy = set_jobs_in_oarnodes.difference(set(job_ids_oarstat))
         if discrepancy and ((self.report_discrepancy.count() < 2 and options.SOURCEDIR) or (not options.SOURCEDIR)):
             discr_str = ", ".join(str(c) for c in list(discrepancy))
             self.report_discrepancy(self, discr_str)
@@ -15,10 +15,18 @@ except ImportError:
     import json
 import logging
 import re
-from qtop_py.serialiser import StatExtractor, GenericBatchSystem
+from qtop_py.serialiser import StatExtractor, GenericBatchSystem, iter_json_members
 import qtop_py.fileutils as fileutils
 import itertools
 
+# the core/job entries of the jobs attribute of pbsnodes -a, e.g. 0/10102182.f-batch01 (Torque) or 2257887.cluster-pbs5/0 (PBS Pro)
+CORE_JOB_RE = re.compile(r"[0-9][0-9a-zA-Z\[\],.-]*\/[^,]+")
+TORQUE_CORES_RE = re.compile(r"^\d+[,-]?[\d,-]*$")
+PBSPRO_JOB_ID_RE = re.compile(r"[\w.-]+")
+SUBJOB_INDEX_RE = re.compile(r"\[\d*\]$")
+# the only job attributes of qstat -f -F json that are needed
+QSTAT_JSON_ATTRIBUTES = frozenset(["Job_Owner", "queue", "job_state", "Job_Name"])
+
 
 class PBSStatExtractor(StatExtractor):
     def __init__(self, config, options):
@@ -66,15 +74,16 @@ class PBSStatExtractor(StatExtractor):
             logging.error("File %s seems to be empty." % orig_file)
             all_qstat_values = []
         else:
-            try:
-                with open(orig_file) as f:
-                    _ = json.load(f)
-            except json.JSONDecodeError:
+            if fileutils.is_json_file(orig_file):
+                logging.info("Extracting qstat output using json")
+                try:
+                    all_qstat_values = self._extract_qstat_json(orig_file)
+                except ValueError as e:
+                    logging.warning("File %s could not be parsed as json (%s). Extracting qstat output using regex" % (orig_file, e))
+                    all_qstat_values = self._extract_qstat_regex(orig_file)
+            else:
                 logging.info("Extracting qstat output using regex")
                 all_qstat_values = self._extract_qstat_regex(orig_file)
-            else:
-                logging.info("Extracting qstat output using json")
-                all_qstat_values = self._extract_qstat_json(orig_file)
 
         return all_qstat_values
 
@@ -109,11 +118,17 @@ class PBSStatExtractor(StatExtractor):
         return all_qstat_values
 
     def _extract_qstat_json(self, qstat_file):
+        """
+        The file is parsed once, either whole, or incrementally if streaming_json_parsing is set in QTOPCONF_YAML,
+        in which case only the needed attributes of one job at a time are held in memory.
+        """
         all_qstat_values = list()
         with open(qstat_file, "r") as fin:
-            data = json.load(fin)
-            jobs = data["Jobs"]
-            for job_id, job in jobs.items():
+            if self.config.get("streaming_json_parsing"):
+                jobs = iter_json_members(fin, "Jobs", keep=QSTAT_JSON_ATTRIBUTES)
+            else:
+                jobs = json.load(fin).get("Jobs", {}).items()
+            for job_id, job in jobs:
                 qstat_values = dict()
                 user = job["Job_Owner"].split("@")[0]
                 user = self.anonymize(user, "users")
@@ -145,15 +160,16 @@ class PBSStatExtractor(StatExtractor):
             logging.error("File %s seems to be empty." % orig_file)
             all_qstatq_values = []
         else:
-            try:
-                with open(orig_file) as f:
-                    _ = json.load(f)
-            except json.JSONDecodeError:
+            if fileutils.is_json_file(orig_file):
+                logging.info("Extracting qstat_q output using json")
+                try:
+                    all_qstatq_values = self._extract_qstatq_json(orig_file)
+                except ValueError as e:
+                    logging.warning("File %s could not be parsed as json (%s). Extracting qstat_q output using regex" % (orig_file, e))
+                    all_qstatq_values = self._extract_qstatq_regex(orig_file)
+            else:
                 logging.info("Extracting qstat_q output using regex")
                 all_qstatq_values = self._extract_qstatq_regex(orig_file)
-            else:
-                logging.info("Extracting qstat_q output using json")
-                all_qstatq_values = self._extract_qstatq_json(orig_file)
 
         return all_qstatq_values
 
@@ -208,7 +224,7 @@ class PBSStatExtractor(StatExtractor):
             queues = data["Queue"]
             for queue_name, queue in queues.items():
                 qstatq_values = dict()
-                queue_name = queue_name if not self.options.ANONYMIZE else anonymize(queue_name)
+                queue_name = queue_name if not self.options.ANONYMIZE else anonymize(queue_name, "qs")
                 qstatq_values["queue_name"] = queue_name
                 qstatq_values["run"] = queue["state_count"].split(" ")[4].split(":")[1]
                 qstatq_values["queued"] = queue["state_count"].split(" ")[1].split(":")[1]
@@ -242,12 +258,21 @@ class PBSBatchSystem(GenericBatchSystem):
             all_pbs_values = []
             return all_pbs_values
 
-        raw_blocks = self._read_all_blocks(self.pbsnodes_file)
-        all_pbs_values = []
-        anonymize = self.qstat_maker.anonymize_func()
-        for block in raw_blocks:
+        with open(self.pbsnodes_file, mode="r") as fin:
+            all_pbs_values = list(self._iter_worker_nodes(fin))
+
+        all_pbs_values = self.ensure_worker_nodes_have_qnames(all_pbs_values, job_ids, job_queues)
+        return all_pbs_values
+
+    def _iter_worker_nodes(self, fin):
+        """
+        Generator of the worker nodes of a pbsnodes -a file, each one yielded as soon as its block has been read,
+        so that the blocks themselves are never kept.
+        """
+        anonymize = self.qstat_maker.anonymize_func() if self.options.ANONYMIZE else None
+        for block in self._iter_blocks(fin):
             pbs_values = dict()
-            pbs_values["domainname"] = block["domainname"] if not self.options.ANONYMIZE else anonymize(block["domainname"], "wns")
+            pbs_values["domainname"] = block["domainname"] if anonymize is None else anonymize(block["domainname"], "wns")
 
             nextchar = block["state"][0]
             state = (nextchar == "f") and "-" or nextchar
@@ -266,18 +291,12 @@ class PBSBatchSystem(GenericBatchSystem):
                 pbs_values["gpus"] = block["gpus"]
 
             try:  # this should turn up more often, hence the try/except.
-                _ = block["jobs"]
+                jobs = block["jobs"]
             except KeyError:
                 pbs_values["core_job_map"] = dict()  # change of behaviour: all entries should contain the key even if no value
             else:
-                # jobs = re.split(r'(?<=[A-Za-z0-9]),\s?', block['jobs'])
-                jobs = re.findall(r"[0-9][0-9a-zA-Z\[\],.-]*\/[^,]+", block["jobs"])
-                pbs_values["core_job_map"] = dict((core, job) for job, core in self._get_jobs_cores(jobs))
-            finally:
-                all_pbs_values.append(pbs_values)
-
-        all_pbs_values = self.ensure_worker_nodes_have_qnames(all_pbs_values, job_ids, job_queues)
-        return all_pbs_values
+                pbs_values["core_job_map"] = dict((core, job) for job, core in self._get_jobs_cores(CORE_JOB_RE.findall(jobs)))
+            yield pbs_values
 
     def get_jobs_info(self):
         """
@@ -331,9 +350,14 @@ class PBSBatchSystem(GenericBatchSystem):
         """
         for core_job in jobs:
             part1, part2 = core_job.strip().split("/")
-            if re.search(r"^\d+[,-]?[\d,-]*$", part1):  # Torque job id
+            if part1.isdecimal():  # Torque job id on a single core, by far the most common entry
+                job = part2.strip().split(".", 1)[0]
+                yield (SUBJOB_INDEX_RE.sub("", job) if "[" in job else job), part1
+                continue
+
+            if TORQUE_CORES_RE.search(part1):  # Torque job id
                 core, job = part1, part2
-            elif re.match(r"[\w.-]+", part1):  # PBS Pro job id
+            elif PBSPRO_JOB_ID_RE.match(part1):  # PBS Pro job id
                 job, core = part1, part2
 
             if ("," in core) or ("-" in core):  # job id with subjobs
@@ -342,44 +366,31 @@ class PBSBatchSystem(GenericBatchSystem):
                     yield subjob, subcore  # TODO: int or no int?
             else:  # job id without subjobs
                 job = job.strip().split("/")[0].split(".")[0]
-                job = re.sub(r"\[\d*\]$", "", job)
+                job = SUBJOB_INDEX_RE.sub("", job)
                 yield job, core
 
-    def _read_all_blocks(self, orig_file):
+    @staticmethod
+    def _iter_blocks(fin):
         """
-        reads pbsnodes txt file block by block
+        Generator of the blocks of a pbsnodes -a file, as dicts of the node's attributes, plus its domainname.
+        Blocks are separated by empty lines; an empty line instead of a domainname ends the file.
         """
-        with open(orig_file, mode="r") as fin:
-            result = []
-            reading = True
-            while reading:
-                wn_block = self._read_block(fin)
-                if wn_block:
-                    result.append(wn_block)
-                else:
-                    reading = False
-        return result
-
-    @staticmethod
-    def _read_block(fin):
-        domain_name = fin.readline().strip()
-        if not domain_name:
-            return None
-
-        block = {"domainname": domain_name}
-        reading = True
-        while reading:
-            line = fin.readline()
-            if line == "\n":
-                reading = False
+        block = None
+        for line in fin:
+            if block is None:
+                domain_name = line.strip()
+                if not domain_name:
+                    return
+                block = {"domainname": domain_name}
+            elif line == "\n":
+                yield block
+                block = None
             else:
-                try:
-                    key, value = line.split(" = ")
-                except ValueError:  # e.g. if line is 'jobs =' with no jobs
-                    pass
-                else:
-                    block[key.strip()] = value.strip()
-        return block
+                key_value = line.split(" = ")
+                if len(key_value) == 2:  # e.g. not if line is 'jobs =' with no jobs
+                    block[key_value[0].strip()] = key_value[1].strip()
+        if block is not None:  # no empty line after the last block
+            yield block
 
     @staticmethod
     def get_corejob_from_range(core_selections, job):
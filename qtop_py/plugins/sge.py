@@ -16,20 +16,66 @@ except ImportError:
 import logging
 import sys
 from qtop_py.serialiser import StatExtractor, GenericBatchSystem
-from xml.etree import ElementTree as etree
+from xml.etree import ElementTree
 import qtop_py.fileutils as fileutils
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+class XMLBackend(object):
+    """
+    The XML library the sge file is parsed with: lxml.etree or xml.etree.ElementTree, both behind the ElementTree API.
+    findall paths are compiled once per backend: into XPath objects for lxml,
+    whereas ElementTree keeps its own cache of compiled paths.
+    """
+
+    def __init__(self, etree):
+        self.etree = etree
+        self.name = etree.__name__
+        self._xpaths = dict()
+
+    def findall(self, elem, path):
+        if self.etree is ElementTree:
+            return elem.findall(path)
+        try:
+            xpath = self._xpaths[path]
+        except KeyError:
+            xpath = self._xpaths[path] = self.etree.XPath(path)
+        return xpath(elem)
+
+
+_xml_backends = dict()
+
+
+def get_xml_backend(faster_xml_parsing):
+    """lxml if faster_xml_parsing is set in QTOPCONF_YAML and lxml is installed, ElementTree otherwise"""
+    use_lxml = bool(faster_xml_parsing)
+    try:
+        return _xml_backends[use_lxml]
+    except KeyError:
+        pass
+
+    if use_lxml and lxml_etree is None:
+        logging.warning('Module lxml is missing. Try issuing "pip install lxml". Reverting to xml module.')
+    backend = _xml_backends[use_lxml] = XMLBackend(lxml_etree if use_lxml and lxml_etree is not None else ElementTree)
+    logging.info("XML files are parsed with %s" % backend.name)
+    return backend
+
 
 class SGEStatExtractor(StatExtractor):
     def __init__(self, config, options, scheduler_output_filenames):
         StatExtractor.__init__(self, config, options)
         self.scheduler_output_filenames = scheduler_output_filenames
+        self.xml = get_xml_backend(config.get("faster_xml_parsing"))
 
     def get_xml_tree(self, xml_file):
         with open(xml_file, mode="rb") as fin:
             try:
-                tree = etree.parse(fin)
-            except etree.ParseError:
+                tree = self.xml.etree.parse(fin)
+            except self.xml.etree.ParseError:
                 logging.critical("Something happened during the parsing of the XML file. Exiting...")
                 raise
             except IOError:
@@ -48,25 +94,8 @@ class SGEStatExtractor(StatExtractor):
         self.tree, self.root = self.get_xml_tree(orig_file)
         root = self.root
 
-        for queue_elem in root.findall("queue_info/Queue-List"):
-            queue_name_elems = queue_elem.findall("resource")
-            queue_list_nametag = queue_elem.find("name")
-            queue_list_nametag.text = self.anonymize_queue_list_nametag(queue_list_nametag)
-            _q_name_elems = iter(queue_name_elems)
-            for queue_name_elem in _q_name_elems:
-                if queue_name_elem.attrib.get("name") == "qname":
-                    queue_name_elem.text = self.anonymize(queue_name_elem.text, "qs")
-                    next_q_name_elem = next(_q_name_elems)
-                    # if queue_name_elem.attrib.get('name') == 'hostname': # assume next must be hostname?
-                    next_q_name_elem.text = self.anonymize(next_q_name_elem.text, "wns")
-                    break
-            else:
-                raise ValueError("No such queue name")
-
-            try:
-                all_values = self._extract_job_info(all_values, queue_elem, "job_list", queue_name=queue_name_elem.text)
-            except ValueError:
-                logging.warning("No jobs found in XML file!")
+        for queue_elem in self.xml.findall(root, "queue_info/Queue-List"):
+            all_values = self.extract_queue_list_jobs(all_values, queue_elem)
 
         # look for the remaining, pending jobs, found later in the xml file
         job_info_elem = root.find("./job_info")
@@ -80,30 +109,56 @@ class SGEStatExtractor(StatExtractor):
 
         return all_values
 
+    def extract_queue_list_jobs(self, all_values, queue_elem):
+        """appends the jobs of a queue_info/Queue-List element to all_values"""
+        queue_name_elems = self.xml.findall(queue_elem, "resource")
+        queue_list_nametag = queue_elem.find("name")
+        queue_list_nametag.text = self.anonymize_queue_list_nametag(queue_list_nametag)
+        _q_name_elems = iter(queue_name_elems)
+        for queue_name_elem in _q_name_elems:
+            if queue_name_elem.attrib.get("name") == "qname":
+                queue_name_elem.text = self.anonymize(queue_name_elem.text, "qs")
+                next_q_name_elem = next(_q_name_elems)
+                # if queue_name_elem.attrib.get('name') == 'hostname': # assume next must be hostname?
+                next_q_name_elem.text = self.anonymize(next_q_name_elem.text, "wns")
+                break
+        else:
+            raise ValueError("No such queue name")
+
+        try:
+            all_values = self._extract_job_info(all_values, queue_elem, "job_list", queue_name=queue_name_elem.text)
+        except ValueError:
+            logging.warning("No jobs found in XML file!")
+        return all_values
+
     def _extract_job_info(self, all_values, elem, elem_text, queue_name):
         """
         inside elem, iterates over subelems named elem_text and extracts relevant job information
         TODO: check difference between extract_job_info and _extract_job_info
         """
-        for subelem in elem.findall(elem_text):
-            owner = subelem.find("./JB_owner").text = self.anonymize(subelem.find("./JB_owner").text, "users")
-            job_num = subelem.find("./JB_job_number").text = self.anonymize(subelem.find("./JB_job_number").text, "jobnums")
-            subelem.find("./JB_name").text = self.anonymize(subelem.find("./JB_name").text, "jobnames")
-            subm_time = subelem.find("./JB_submission_time")
-            if subm_time is not None:
-                subm_time.text = self.anonymize(subelem.find("./JB_submission_time").text, "jobtimes")
-            queue_name = self.anonymize(queue_name, "qs")
-            qstat_values = dict()
-            qstat_values["JobId"] = job_num
-            qstat_values["UnixAccount"] = owner
-            qstat_values["S"] = subelem.find("./state").text
-            qstat_values["Queue"] = queue_name
-            all_values.append(qstat_values)
+        for subelem in self.xml.findall(elem, elem_text):
+            all_values.append(self.extract_job(subelem, queue_name))
         if not all_values:
             raise ValueError("No jobs found in XML file!")
 
         return all_values
 
+    def extract_job(self, subelem, queue_name):
+        """the qstat values of a job_list element"""
+        owner = subelem.find("./JB_owner").text = self.anonymize(subelem.find("./JB_owner").text, "users")
+        job_num = subelem.find("./JB_job_number").text = self.anonymize(subelem.find("./JB_job_number").text, "jobnums")
+        subelem.find("./JB_name").text = self.anonymize(subelem.find("./JB_name").text, "jobnames")
+        subm_time = subelem.find("./JB_submission_time")
+        if subm_time is not None:
+            subm_time.text = self.anonymize(subelem.find("./JB_submission_time").text, "jobtimes")
+        queue_name = self.anonymize(queue_name, "qs")
+        qstat_values = dict()
+        qstat_values["JobId"] = job_num
+        qstat_values["UnixAccount"] = owner
+        qstat_values["S"] = subelem.find("./state").text
+        qstat_values["Queue"] = queue_name
+        return qstat_values
+
 
 class SGEBatchSystem(GenericBatchSystem):
     @staticmethod
@@ -115,18 +170,26 @@ class SGEBatchSystem(GenericBatchSystem):
         self.config = config
         self.options = options
         self.sge_stat_maker = SGEStatExtractor(self.config, self.options, scheduler_output_filenames)
+        self.xml = self.sge_stat_maker.xml
         if self.options.ANONYMIZE:
             self.anonymize = self.sge_stat_maker.anonymize_func()
         else:
             self.anonymize = self.sge_stat_maker.eponymize_func()
+        # anonymizing, or writing the sge file into a sample, needs the whole tree; otherwise the file is read in one pass
+        self.one_pass = not (self.options.ANONYMIZE or self.options.SAMPLE)
+        self._one_pass_results = None
 
     def get_queues_info(self):
         logging.debug("Parsing tree of %s" % self.sge_file)
         fileutils.check_empty_file(self.sge_file)
 
-        root = self.sge_stat_maker.root
-
-        qstatq_list = self._extract_queues("queue_info/Queue-List", root)
+        if self.one_pass:
+            _, qstatq_list, total_queued_jobs, _ = self.read_in_one_pass()
+            qstatq_list = [dict(d) for d in qstatq_list]  # the counts are turned into strings below
+        else:
+            root = self.sge_stat_maker.root
+            qstatq_list = self._extract_queues("queue_info/Queue-List", root)
+            total_queued_jobs = self._get_total_queued_jobs("job_info/job_list", root)
 
         total_running_jobs = sum([d["run"] for d in qstatq_list])
         logging.info("Total running jobs found: %s" % total_running_jobs)
@@ -135,8 +198,6 @@ class SGEBatchSystem(GenericBatchSystem):
             d["run"] = str(d["run"])
             d["queued"] = str(d["queued"])
 
-        total_queued_jobs = self._get_total_queued_jobs("job_info/job_list", root)
-
         qstatq_list.append({"run": "0", "queued": total_queued_jobs, "queue_name": "Pending", "state": "Q", "lm": "0"})
         logging.debug("qstatq_list contains %s elements" % len(qstatq_list))
         # TODO: check validity. 'state' shouldnt just be 'Q'!
@@ -147,38 +208,14 @@ class SGEBatchSystem(GenericBatchSystem):
     def get_worker_nodes(self, job_ids, job_queues, options):
         logging.debug("Parsing tree of %s" % self.sge_file)
 
-        tree, root = self.sge_stat_maker.tree, self.sge_stat_maker.root
-
-        existing_wns = list()
-        existing_node_names = set()
-
-        for queue_elem in root.findall("queue_info/Queue-List"):
-            worker_node = self._get_host_qname_np(queue_elem)
-            worker_node["state"] = self._get_state(queue_elem)
-
-            if worker_node["domainname"] not in existing_node_names:
-                job_ids, _, _ = self._extract_job_info(queue_elem, "job_list")
-                worker_node["core_job_map"] = dict((idx, job_id) for idx, job_id in enumerate(job_ids))
-                worker_node["existing_busy_cores"] = len(worker_node["core_job_map"])
-                worker_node["np"] = max(int(worker_node["np"]), len(worker_node["core_job_map"]))
-
-                existing_node_names.update([worker_node["domainname"]])
-                existing_wns.append(worker_node)
-            else:
-                for existing_wn in existing_wns:
-                    if worker_node["domainname"] != existing_wn["domainname"]:
-                        continue
-
-                    job_ids, _, _ = self._extract_job_info(queue_elem, "job_list")
-                    core_jobs = dict((idx, job_id) for idx, job_id in enumerate(job_ids, existing_wn["existing_busy_cores"]))
-                    existing_wn["core_job_map"].update(core_jobs)
-                    existing_wn["existing_busy_cores"] = len(existing_wn["core_job_map"])
-                    # don't change the node state to free.
-                    # Just keep the state reported in the last queue mentioning the node.
-                    existing_wn["state"] = (worker_node["state"] == "-") and existing_wn["state"] or worker_node["state"]
-                    existing_wn["qname"].update(worker_node["qname"])
-                    existing_wn["np"] = max(int(existing_wn["np"]), len(existing_wn["core_job_map"]))
-                    break
+        if self.one_pass:
+            _, _, _, existing_wns = self.read_in_one_pass()
+        else:
+            tree, root = self.sge_stat_maker.tree, self.sge_stat_maker.root
+            existing_wns = list()
+            wns_by_name = dict()
+            for queue_elem in self.xml.findall(root, "queue_info/Queue-List"):
+                self._add_worker_node(existing_wns, wns_by_name, queue_elem)
 
         logging.debug("Closing %s" % self.sge_file)
         logging.info("existing_wns contains %s entries" % len(existing_wns))
@@ -186,16 +223,99 @@ class SGEBatchSystem(GenericBatchSystem):
             existing_wn["qname"] = list(existing_wn["qname"])
 
         # last to be reading the xml file, can now write back if anonymizing..
-        if self.options.SAMPLE >= 1:
+        if not self.one_pass and self.options.SAMPLE >= 1:
             anon_file = self.sge_stat_maker.orig_file + "%s" % ("_anon" if self.options.ANONYMIZE else "")
             self.sge_stat_maker.scheduler_output_filenames["sge_file"] = anon_file
             tree.write(anon_file)
         return existing_wns
 
+    def _add_worker_node(self, existing_wns, wns_by_name, queue_elem):
+        """
+        adds the worker node of a queue_info/Queue-List element to existing_wns,
+        or merges it into the same-named one, found through wns_by_name, which maps domain names to the nodes in existing_wns
+        """
+        worker_node = self._get_host_qname_np(queue_elem)
+        worker_node["state"] = self._get_state(queue_elem)
+        job_ids, _, _ = self._extract_job_info(queue_elem, "job_list")
+
+        existing_wn = wns_by_name.get(worker_node["domainname"])
+        if existing_wn is None:
+            worker_node["core_job_map"] = dict((idx, job_id) for idx, job_id in enumerate(job_ids))
+            worker_node["existing_busy_cores"] = len(worker_node["core_job_map"])
+            worker_node["np"] = max(int(worker_node["np"]), len(worker_node["core_job_map"]))
+
+            wns_by_name[worker_node["domainname"]] = worker_node
+            existing_wns.append(worker_node)
+        else:
+            existing_wn["core_job_map"].update(enumerate(job_ids, existing_wn["existing_busy_cores"]))
+            existing_wn["existing_busy_cores"] = len(existing_wn["core_job_map"])
+            # don't change the node state to free.
+            # Just keep the state reported in the last queue mentioning the node.
+            existing_wn["state"] = (worker_node["state"] == "-") and existing_wn["state"] or worker_node["state"]
+            existing_wn["qname"].update(worker_node["qname"])
+            existing_wn["np"] = max(int(existing_wn["np"]), len(existing_wn["core_job_map"]))
+
+    def read_in_one_pass(self):
+        """
+        Reads the sge file with iterparse, extracting the jobs, the queues and the worker nodes in a single pass.
+        Each queue_info/Queue-List and job_info/job_list element is processed as soon as it has been read and then dropped,
+        so that memory is bounded by the largest Queue-List instead of the whole document.
+        Returns all_values (as extract_qstat), qstatq_list (as _extract_queues), the total queued jobs and the worker nodes.
+        The results are kept, so that get_jobs_info, get_queues_info and get_worker_nodes share the same pass.
+        """
+        if self._one_pass_results is not None:
+            return self._one_pass_results
+
+        stat_maker = self.sge_stat_maker
+        queue_jobs, pending_jobs = list(), list()
+        qstatq_list, queues_by_name = list(), dict()
+        pending_count = 0
+        existing_wns, wns_by_name = list(), dict()
+        first_job_info = None
+
+        path = []  # the elements from the root down to the current one
+        with open(self.sge_file, mode="rb") as fin:
+            try:
+                for event, elem in self.xml.etree.iterparse(fin, events=("start", "end")):
+                    if event == "start":
+                        path.append(elem)
+                        if elem.tag == "job_info" and len(path) == 2 and first_job_info is None:
+                            first_job_info = elem
+                        continue
+
+                    path.pop()
+                    if len(path) != 2:
+                        continue
+                    parent = path[1]
+                    if elem.tag == "Queue-List" and parent.tag == "queue_info":
+                        queue_jobs = stat_maker.extract_queue_list_jobs(queue_jobs, elem)
+                        self._add_queue(qstatq_list, queues_by_name, elem)
+                        self._add_worker_node(existing_wns, wns_by_name, elem)
+                        parent.clear()
+                    elif elem.tag == "job_list" and parent.tag == "job_info":
+                        if parent is first_job_info:
+                            pending_jobs.append(stat_maker.extract_job(elem, "Pending"))
+                        if elem.attrib.get("state") == "pending":
+                            pending_count += 1
+                        parent.clear()
+            except self.xml.etree.ParseError:
+                logging.critical("Something happened during the parsing of the XML file. Exiting...")
+                raise
+
+        if first_job_info is None:
+            logging.debug("No pending jobs found!")
+        total_queued_jobs = str(pending_count)
+        logging.info("Total queued jobs found: %s" % total_queued_jobs)
+        self._one_pass_results = queue_jobs + pending_jobs, qstatq_list, total_queued_jobs, existing_wns
+        return self._one_pass_results
+
     def get_jobs_info(self):
         job_ids, usernames, job_states, queue_names = [], [], [], []
 
-        all_values = self.sge_stat_maker.extract_qstat(self.sge_file)
+        if self.one_pass:
+            all_values, _, _, _ = self.read_in_one_pass()
+        else:
+            all_values = self.sge_stat_maker.extract_qstat(self.sge_file)
         # TODO: needs better glueing
         for qstat in all_values:
             job_id = str(qstat["JobId"])
@@ -222,7 +342,7 @@ class SGEBatchSystem(GenericBatchSystem):
         TODO: check difference between extract_job_info and _extract_job_info
         """
         job_ids, usernames, job_states = [], [], []
-        for subelem in elem.findall(elem_text):
+        for subelem in self.xml.findall(elem, elem_text):
             state = subelem.get("state")
             if state != "running":
                 continue
@@ -244,7 +364,7 @@ class SGEBatchSystem(GenericBatchSystem):
         except AttributeError:
             slots_used = 0
 
-        resources = queue_elem.findall("resource")
+        resources = self.xml.findall(queue_elem, "resource")
         for resource in resources:
             if resource.attrib.get("name") == "hostname":
                 worker_node["domainname"] = self.anonymize(resource.text, "wns")
@@ -275,47 +395,47 @@ class SGEBatchSystem(GenericBatchSystem):
         return state.text
 
     def _extract_queues(self, xpath, root):
-        qstatq_list = []
-        for queue_elem in root.findall(xpath):
-            queue_names = queue_elem.findall("resource")
-            for _queue_name in queue_names:
-                if _queue_name.attrib.get("name") == "qname":
-                    queue_name = self.anonymize(_queue_name.text, "qs")
-                    break
-            else:
-                raise ValueError("No such resource")
-
-            for exist_d in qstatq_list:
-                if queue_name == exist_d["queue_name"]:
-                    jobs = queue_elem.findall("job_list")
-                    run_count = 0
-                    for _run in jobs:
-                        if _run.attrib.get("state") == "running":
-                            run_count += 1
-                    exist_d["run"] += run_count
-                    break
-            else:  # first instance of queue in the xml
-                d = dict()
-                d["queue_name"] = queue_name
-                try:
-                    d["state"] = queue_elem.find("./state").text
-                except AttributeError:
-                    d["state"] = "?"
-
-                job_lists = queue_elem.findall("job_list")
-                run_count = 0
-                for _run in job_lists:
-                    if _run.attrib.get("state") == "running":
-                        run_count += 1
-                d["run"] = run_count
-                d["lm"] = 0
-                d["queued"] = 0
-                qstatq_list.append(d)
-
+        qstatq_list, queues_by_name = [], {}
+        for queue_elem in self.xml.findall(root, xpath):
+            self._add_queue(qstatq_list, queues_by_name, queue_elem)
         return qstatq_list
 
+    def _add_queue(self, qstatq_list, queues_by_name, queue_elem):
+        """
+        counts the running jobs of a queue_info/Queue-List element into its queue in qstatq_list, which is added if not there yet;
+        queues_by_name maps queue names to the dicts in qstatq_list
+        """
+        queue_names = self.xml.findall(queue_elem, "resource")
+        for _queue_name in queue_names:
+            if _queue_name.attrib.get("name") == "qname":
+                queue_name = self.anonymize(_queue_name.text, "qs")
+                break
+        else:
+            raise ValueError("No such resource")
+
+        run_count = 0
+        for _run in self.xml.findall(queue_elem, "job_list"):
+            if _run.attrib.get("state") == "running":
+                run_count += 1
+
+        exist_d = queues_by_name.get(queue_name)
+        if exist_d is not None:
+            exist_d["run"] += run_count
+        else:  # first instance of queue in the xml
+            d = dict()
+            d["queue_name"] = queue_name
+            try:
+                d["state"] = queue_elem.find("./state").text
+            except AttributeError:
+                d["state"] = "?"
+            d["run"] = run_count
+            d["lm"] = 0
+            d["queued"] = 0
+            queues_by_name[queue_name] = d
+            qstatq_list.append(d)
+
     def _get_total_queued_jobs(self, xpath, root):
-        total_queued_jobs_elems = root.findall(xpath)
+        total_queued_jobs_elems = self.xml.findall(root, xpath)
         pending_count = 0
         for job in total_queued_jobs_elems:
             if job.attrib.get("state") == "pending":
@@ -10,10 +10,261 @@
 
 import logging
 import re
-from collections import OrderedDict
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from collections.abc import ItemsView, Mapping, ValuesView
+from functools import lru_cache
+from itertools import chain, product, repeat
 
 import qtop_py.fileutils as fileutils
-from qtop_py.serialiser import GenericBatchSystem, StatExtractor
+from qtop_py.serialiser import GenericBatchSystem, StatExtractor, iter_json_items
+
+# squeue --json spells out job states, which are shown the way squeue -o %t abbreviates them
+JOB_STATE_CODES = {
+    "BOOT_FAIL": "BF",
+    "CANCELLED": "CA",
+    "COMPLETED": "CD",
+    "COMPLETING": "CG",
+    "CONFIGURING": "CF",
+    "DEADLINE": "DL",
+    "FAILED": "F",
+    "NODE_FAIL": "NF",
+    "OUT_OF_MEMORY": "OOM",
+    "PENDING": "PD",
+    "PREEMPTED": "PR",
+    "REQUEUE_HOLD": "RH",
+    "REQUEUED": "RQ",
+    "RESIZING": "RS",
+    "RUNNING": "R",
+    "STOPPED": "ST",
+    "SUSPENDED": "S",
+    "TIMEOUT": "TO",
+}
+ALLOCATED_CORE_STATUSES = frozenset(["ALLOCATED", "IN_USE", "ALLOCATED_AND_IN_USE"])
+
+
+@lru_cache(maxsize=4096)
+def expand_hostlist(hostlist):
+    """
+    Expands a Slurm hostlist expression into a tuple of host names, e.g. "cn[01-02,05],gpu[1-2]-ib[0-1]"
+    gives cn01, cn02, cn05, gpu1-ib0, gpu1-ib1, gpu2-ib0, gpu2-ib1.
+    Hosts are separated by the commas outside brackets; each bracketed range of a host multiplies it,
+    zero-padded numbers keep their width. Expansions are cached, as the same nodelists come up in every refresh.
+    """
+    if not hostlist or hostlist.startswith("("):  # e.g. (Priority) or (Resources), for pending jobs
+        return ()
+
+    hosts = []
+    for host_expr in _split_hostlist(hostlist):
+        parts = _split_host_expr(host_expr)
+        if len(parts) == 1:
+            hosts.append(host_expr)
+        else:
+            hosts.extend("".join(choice) for choice in product(*parts))
+    return tuple(hosts)
+
+
+def _split_hostlist(hostlist):
+    """The host expressions of a hostlist, i.e. its comma-separated parts outside brackets"""
+    if "[" not in hostlist:
+        return hostlist.split(",")
+
+    host_exprs, start, depth = [], 0, 0
+    for idx, char in enumerate(hostlist):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth = max(0, depth - 1)
+        elif char == "," and not depth:
+            host_exprs.append(hostlist[start:idx])
+            start = idx + 1
+    host_exprs.append(hostlist[start:])
+    return host_exprs
+
+
+def _split_host_expr(host_expr):
+    """
+    A host expression as a list of choices: literal text is a 1-tuple, each bracketed range a tuple of its values.
+    An unterminated bracket is kept as literal text.
+    """
+    parts, pos = [], 0
+    while True:
+        opening = host_expr.find("[", pos)
+        closing = host_expr.find("]", opening + 1) if opening >= 0 else -1
+        if closing < 0:
+            parts.append((host_expr[pos:],))
+            return parts
+        parts.append((host_expr[pos:opening],))
+        parts.append(tuple(_expand_ranges(host_expr[opening + 1 : closing])))
+        pos = closing + 1
+
+
+def _expand_ranges(ranges):
+    """Values of a bracketed range list, e.g. 01-03,07 gives 01, 02, 03, 07"""
+    for token in ranges.split(","):
+        start, sep, end = token.partition("-")
+        if not sep or not (start.isdigit() and end.isdigit()):
+            yield token
+            continue
+        width = len(start)
+        for number in range(int(start), int(end) + 1):
+            yield str(number).zfill(width)
+
+
+class CoreAllocation(object):
+    """
+    The cores of a worker node handed out to jobs, in order, as runs of [job_id, count]:
+    a job spanning 128 cores of the node is a single run rather than 128 entries.
+    Jobs whose exact cores are known (squeue --json) are placed on them instead, and the others take the lowest free cores.
+    """
+
+    __slots__ = ("runs", "used", "placed")
+
+    def __init__(self):
+        self.runs = []
+        self.used = 0
+        self.placed = None
+
+    def allocate(self, job_id, count):
+        if self.runs and self.runs[-1][0] == job_id:
+            self.runs[-1][1] += count
+        else:
+            self.runs.append([job_id, count])
+        self.used += count
+
+    def place(self, job_id, cores):
+        """Allocates the given core numbers to job_id"""
+        if self.placed is None:
+            self.placed = dict()
+        for core in cores:
+            if core not in self.placed:
+                self.used += 1
+            self.placed[core] = job_id
+
+    def core_job_map(self):
+        if not self.placed:
+            return CoreJobMap(self.runs)
+
+        core_jobs = dict(self.placed)
+        core = 0
+        for job_id in chain.from_iterable(repeat(job_id, count) for job_id, count in self.runs):
+            while core in core_jobs:
+                core += 1
+            core_jobs[core] = job_id
+            core += 1
+
+        runs = []  # free cores in between make runs of None
+        for core in range(max(core_jobs) + 1):
+            job_id = core_jobs.get(core)
+            if runs and runs[-1][0] == job_id:
+                runs[-1][1] += 1
+            else:
+                runs.append([job_id, 1])
+        return CoreJobMap(runs)
+
+
+class CoreJobMap(Mapping):
+    """
+    Read-only {core: job_id} view over the runs of a CoreAllocation, used as the core_job_map of a worker node.
+    Cores are numbered from 0 in run order, runs of None being free cores; single cores are looked up by bisecting the run ends,
+    and the cores of a run are only spelled out while iterating over the view.
+    """
+
+    __slots__ = ("_runs", "_ends", "_len")
+
+    def __init__(self, runs):
+        self._runs = tuple((job_id, count) for job_id, count in runs if count > 0)
+        self._ends = []
+        self._len = 0
+        end = 0
+        for job_id, count in self._runs:
+            end += count
+            self._ends.append(end)
+            if job_id is not None:
+                self._len += count
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        start = 0
+        for (job_id, _), end in zip(self._runs, self._ends):
+            if job_id is not None:
+                for core in range(start, end):
+                    yield core
+            start = end
+
+    def __getitem__(self, core):
+        if not isinstance(core, int) or not 0 <= core < (self._ends[-1] if self._ends else 0):
+            raise KeyError(core)
+        job_id = self._runs[bisect_right(self._ends, core)][0]
+        if job_id is None:
+            raise KeyError(core)
+        return job_id
+
+    def __eq__(self, other):
+        if isinstance(other, CoreJobMap):
+            return self._runs == other._runs
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self.items()))
+
+    def values(self):
+        return CoreJobValues(self)
+
+    def items(self):
+        return CoreJobItems(self)
+
+
+class CoreJobValues(ValuesView):
+    def __iter__(self):
+        return chain.from_iterable(repeat(job_id, count) for job_id, count in self._mapping._runs if job_id is not None)
+
+
+class CoreJobItems(ItemsView):
+    def __iter__(self):
+        return zip(self._mapping, CoreJobValues(self._mapping))
+
+
+class SlurmSnapshot(object):
+    """
+    The squeue output of a refresh, parsed once: the jobs are kept as columns, one list per field,
+    so that get_jobs_info hands them out as they are and the other accessors don't go through the jobs again.
+    allocations maps the row of each job whose exact allocation is known (squeue --json) to it.
+    """
+
+    def __init__(self):
+        self.job_ids = []
+        self.users = []
+        self.states = []
+        self.partitions = []
+        self.cpus = []
+        self.nodelists = []
+        self.allocations = dict()
+        self._state_counts = None
+
+    def __len__(self):
+        return len(self.job_ids)
+
+    def state_counts(self):
+        """{partition: Counter({state: number of jobs})}, partitions in order of appearance; counted once and kept"""
+        if self._state_counts is None:
+            self._state_counts = OrderedDict()
+            for partition in OrderedDict.fromkeys(self.partitions):
+                self._state_counts[partition] = Counter()
+            for (partition, state), jobs in Counter(zip(self.partitions, self.states)).items():
+                self._state_counts[partition][state] = jobs
+        return self._state_counts
+
+    def iter_jobs(self, states):
+        """(job_id, cpus, nodelist, allocation) of each job in one of states, allocation being None if not known"""
+        allocations = self.allocations
+        for idx, state in enumerate(self.states):
+            if state in states:
+                yield self.job_ids[idx], self.cpus[idx], self.nodelists[idx], allocations.get(idx)
 
 
 class SlurmStatExtractor(StatExtractor):
@@ -21,14 +272,31 @@ class SlurmStatExtractor(StatExtractor):
         """
         Parse output from:
         squeue -h -o %i|%u|%t|%P|%C|%N
+        or squeue --json
+        into a SlurmSnapshot
         """
+        snapshot = SlurmSnapshot()
         try:
             fileutils.check_empty_file(orig_file)
         except fileutils.FileEmptyError:
             logging.error("File %s seems to be empty." % orig_file)
-            return []
-
-        jobs = []
+            return snapshot
+
+        if fileutils.is_json_file(orig_file):
+            logging.info("Extracting squeue output using json")
+            try:
+                with open(orig_file, "r") as fin:
+                    for job in iter_json_items(fin, "jobs"):
+                        self._add_json_job(snapshot, job)
+            except ValueError as e:
+                logging.error("File %s could not be parsed as json (%s)." % (orig_file, e))
+                return SlurmSnapshot()
+            return snapshot
+
+        # the columns are appended to straight away, as there may be hundreds of thousands of pending jobs
+        add_job_id, add_user, add_state = snapshot.job_ids.append, snapshot.users.append, snapshot.states.append
+        add_partition, add_cpus, add_nodelist = snapshot.partitions.append, snapshot.cpus.append, snapshot.nodelists.append
+        anonymize = self.anonymize if self.options.ANONYMIZE else None
         with open(orig_file, "r") as fin:
             for line in fin:
                 line = line.strip()
@@ -40,22 +308,22 @@ class SlurmStatExtractor(StatExtractor):
                     logging.warning("Line: %s not properly parsed as Slurm squeue output." % line)
                     continue
 
-                jobs.append(
-                    {
-                        "JobId": job_id,
-                        "UnixAccount": self.anonymize(user, "users"),
-                        "S": state,
-                        "Queue": self.anonymize(partition.rstrip("*"), "qs"),
-                        "CPUs": self._safe_int(cpus, default=1),
-                        "Nodes": nodes,
-                    }
-                )
-        return jobs
+                partition = partition.rstrip("*")
+                if anonymize is not None:
+                    user, partition = anonymize(user, "users"), anonymize(partition, "qs")
+                add_job_id(job_id)
+                add_user(user)
+                add_state(state)
+                add_partition(partition)
+                add_cpus(int(cpus) if cpus.isdigit() else self._safe_int(cpus, default=1))
+                add_nodelist(nodes)
+        return snapshot
 
     def extract_sinfo(self, orig_file):
         """
         Parse output from:
         sinfo -N -h -o %N|%P|%t|%c
+        or scontrol show nodes --json (sinfo --json, up to Slurm 22.05)
         """
         try:
             fileutils.check_empty_file(orig_file)
@@ -63,6 +331,18 @@ class SlurmStatExtractor(StatExtractor):
             logging.error("File %s seems to be empty." % orig_file)
             return []
 
+        if fileutils.is_json_file(orig_file):
+            logging.info("Extracting sinfo output using json")
+            nodes = []
+            try:
+                with open(orig_file, "r") as fin:
+                    for node in iter_json_items(fin, "nodes"):
+                        nodes.extend(self._get_json_nodes(node))
+            except ValueError as e:
+                logging.error("File %s could not be parsed as json (%s)." % (orig_file, e))
+                return []
+            return nodes
+
         nodes = []
         with open(orig_file, "r") as fin:
             for line in fin:
@@ -86,6 +366,118 @@ class SlurmStatExtractor(StatExtractor):
                 )
         return nodes
 
+    def _add_json_job(self, snapshot, job):
+        """Adds a job of squeue --json to snapshot, along with its exact per-node allocation"""
+        job_id = str(job.get("job_id"))
+        het_job_id = self._json_number(job.get("het_job_id"), default=0)
+        array_job_id = self._json_number(job.get("array_job_id"), default=0)
+        if het_job_id:
+            job_id = "%s+%s" % (het_job_id, self._json_number(job.get("het_job_offset"), default=0))
+        elif array_job_id:
+            array_task_id = job.get("array_task_id")
+            if isinstance(array_task_id, dict) and not array_task_id.get("set"):
+                array_task_id = None
+            if array_task_id is not None:
+                job_id = "%s_%s" % (array_job_id, self._json_number(array_task_id, default=0))
+            elif job.get("array_task_string"):
+                job_id = "%s_[%s]" % (array_job_id, job["array_task_string"])
+
+        allocation = self._get_json_allocation(job.get("job_resources"))
+        if allocation:
+            snapshot.allocations[len(snapshot)] = allocation
+        snapshot.job_ids.append(job_id)
+        snapshot.users.append(self.anonymize(job.get("user_name", ""), "users"))
+        snapshot.states.append(self._map_job_state(job.get("job_state")))
+        snapshot.partitions.append(self.anonymize(job.get("partition", ""), "qs"))
+        snapshot.cpus.append(self._json_number(job.get("cpus"), default=1))
+        snapshot.nodelists.append(job.get("nodes", ""))
+
+    def _get_json_nodes(self, node):
+        """The rows sinfo -N would print for a node of scontrol show nodes --json, one per partition"""
+        node_name = node.get("name") or node.get("hostname")
+        sockets, cores, threads = (self._json_number(node.get(key), default=0) for key in ("sockets", "cores", "threads"))
+        state = node.get("state")
+        states = state if isinstance(state, list) else [state or ""] + list(node.get("state_flags", []))
+        node_state = self._map_node_states(states)
+        np = str(self._json_number(node.get("cpus"), default=0))
+
+        return [
+            {
+                "domainname": self.anonymize(node_name, "wns"),
+                "raw_domainname": node_name,
+                "qname": self.anonymize(partition, "qs"),
+                "state": node_state,
+                "np": np,
+                "layout": (sockets, cores, threads) if sockets and cores and threads else None,
+            }
+            for partition in node.get("partitions") or []
+        ]
+
+    @classmethod
+    def _get_json_allocation(cls, job_resources):
+        """
+        The per-node allocation in the job_resources of a job of squeue --json, as (node name, CPUs, cores) triplets,
+        cores being the (socket, core) pairs allocated on the node, or empty if the output does not list them.
+        Covers the layouts of Slurm 21.08 up to 24.05.
+        """
+        if not job_resources:
+            return []
+        nodes = job_resources.get("nodes")
+        allocated_nodes = nodes.get("allocation", []) if isinstance(nodes, dict) else job_resources.get("allocated_nodes", [])
+        if isinstance(allocated_nodes, dict):  # 21.08 keys the nodes by their index
+            allocated_nodes = [allocated_nodes[idx] for idx in sorted(allocated_nodes, key=int)]
+
+        allocation = []
+        for node in allocated_nodes:
+            cores = cls._get_json_cores(node.get("sockets"))
+            cpus = node.get("cpus")
+            if isinstance(cpus, dict):
+                cpus = cpus.get("count")
+            cpus = cls._safe_int(cpus if cpus is not None else node.get("cpus_used"), default=0) or len(cores)
+            if cpus:
+                allocation.append((node.get("nodename") or node.get("name"), cpus, cores))
+        return allocation
+
+    @staticmethod
+    def _get_json_cores(sockets):
+        """The allocated (socket, core) pairs of the sockets of an allocated node of squeue --json"""
+        if not sockets:
+            return []
+        if isinstance(sockets, dict):  # up to 22.05: {socket: {"cores": {core: status}}}
+            socket_cores = ((int(socket), dict(values.get("cores", {}))) for socket, values in sockets.items())
+        else:
+            socket_cores = ((socket["index"], dict((core["index"], core.get("status")) for core in socket.get("cores", []))) for socket in sockets)
+
+        cores = []
+        for socket, core_statuses in socket_cores:
+            for core, status in core_statuses.items():
+                statuses = status if isinstance(status, list) else [status or ""]
+                if any(status.upper().replace(" ", "_") in ALLOCATED_CORE_STATUSES for status in statuses):
+                    cores.append((socket, int(core)))
+        return sorted(cores)
+
+    @classmethod
+    def _json_number(cls, value, default):
+        """Numbers of Slurm 23.11 and later come as {"set": true, "infinite": false, "number": 4}"""
+        if isinstance(value, dict):
+            value = value.get("number") if value.get("set", True) else None
+        return cls._safe_int(value, default)
+
+    @staticmethod
+    def _map_job_state(state):
+        states = state if isinstance(state, list) else [state or ""]
+        if "COMPLETING" in states:
+            return "CG"
+        return JOB_STATE_CODES.get(states[0], states[0][:2]) if states else "?"
+
+    @classmethod
+    def _map_node_states(cls, states):
+        """The state of a node with a base state and flags (e.g. MIXED, DRAIN), where a node unavailable for any reason is down"""
+        node_states = [cls._map_node_state(state) for state in states if state]
+        if "d" in node_states:
+            return "d"
+        return node_states[0] if node_states else "?"
+
     @staticmethod
     def _safe_int(value, default):
         try:
@@ -112,6 +504,7 @@ class SlurmStatExtractor(StatExtractor):
             "fail": "d",
             "failing": "d",
             "maint": "d",
+            "maintenance": "d",
             "resv": "r",
             "reserved": "r",
             "planned": "-",
@@ -136,15 +529,12 @@ class SlurmBatchSystem(GenericBatchSystem):
         self.config = config
         self.options = options
         self.slurm_stat_maker = SlurmStatExtractor(self.config, self.options)
+        self._snapshot = None
+        self._nodes = None
 
     def get_jobs_info(self):
-        job_ids, usernames, job_states, queue_names = [], [], [], []
-
-        for job in self._get_jobs():
-            job_ids.append(job["JobId"])
-            usernames.append(job["UnixAccount"])
-            job_states.append(job["S"])
-            queue_names.append(job["Queue"])
+        snapshot = self._get_snapshot()
+        job_ids, usernames, job_states, queue_names = snapshot.job_ids, snapshot.users, snapshot.states, snapshot.partitions
 
         logging.debug(
             "job_ids, usernames, job_states, queue_names lengths: "
@@ -161,15 +551,14 @@ class SlurmBatchSystem(GenericBatchSystem):
         for node in self._get_nodes():
             queue_counts.setdefault(node["qname"], {"run": 0, "queued": 0, "lm": "--", "state": "E"})
 
-        for job in self._get_jobs():
-            queue = job["Queue"]
+        for queue, state_counts in self._get_snapshot().state_counts().items():
             queue_counts.setdefault(queue, {"run": 0, "queued": 0, "lm": "--", "state": "E"})
-            if job["S"] == "R":
-                queue_counts[queue]["run"] += 1
-                total_running_jobs += 1
-            elif job["S"] in self.QUEUED_STATES:
-                queue_counts[queue]["queued"] += 1
-                total_queued_jobs += 1
+            running_jobs = state_counts["R"]
+            queued_jobs = sum(state_counts[state] for state in self.QUEUED_STATES)
+            queue_counts[queue]["run"] += running_jobs
+            queue_counts[queue]["queued"] += queued_jobs
+            total_running_jobs += running_jobs
+            total_queued_jobs += queued_jobs
 
         qstatq_lod = []
         for queue_name, values in queue_counts.items():
@@ -205,21 +594,22 @@ class SlurmBatchSystem(GenericBatchSystem):
             worker_node["state"] = self._merge_node_state(worker_node["state"], node["state"])
             worker_node["np"] = str(max(int(worker_node["np"]), int(node["np"])))
 
-        node_jobs = self._map_jobs_to_nodes(self._get_jobs(), worker_nodes_by_name)
+        layouts = dict((node["raw_domainname"], node["layout"]) for node in self._get_nodes() if node.get("layout"))
+        node_cores = self._map_jobs_to_nodes(self._get_snapshot().iter_jobs(self.ACTIVE_STATES), worker_nodes_by_name, layouts)
         for raw_name, worker_node in worker_nodes_by_name.items():
-            worker_node["core_job_map"] = dict((idx, job_id) for idx, job_id in enumerate(node_jobs.get(raw_name, [])))
+            worker_node["core_job_map"] = node_cores[raw_name].core_job_map()
 
         worker_nodes = list(worker_nodes_by_name.values())
         logging.info("worker_nodes contains %s entries" % len(worker_nodes))
         return worker_nodes
 
-    def _get_jobs(self):
-        if not hasattr(self, "_jobs"):
-            self._jobs = self.slurm_stat_maker.extract_squeue(self.squeue_file)
-        return self._jobs
+    def _get_snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self.slurm_stat_maker.extract_squeue(self.squeue_file)
+        return self._snapshot
 
     def _get_nodes(self):
-        if not hasattr(self, "_nodes"):
+        if self._nodes is None:
             self._nodes = self.slurm_stat_maker.extract_sinfo(self.sinfo_file)
         return self._nodes
 
@@ -230,57 +620,56 @@ class SlurmBatchSystem(GenericBatchSystem):
         return current if current_priority > previous_priority else previous
 
     @classmethod
-    def _map_jobs_to_nodes(cls, jobs, worker_nodes_by_name):
-        node_jobs = OrderedDict((node_name, []) for node_name in worker_nodes_by_name)
-        for job in jobs:
-            if job["S"] not in cls.ACTIVE_STATES:
+    def _map_jobs_to_nodes(cls, jobs, worker_nodes_by_name, layouts=None):
+        """
+        jobs are the (job_id, cpus, nodelist, allocation) of the active jobs, as SlurmSnapshot.iter_jobs yields them.
+        Gives each job the CPUs of its allocation (squeue --json), on their exact cores if the node layout is known,
+        or otherwise spreads the CPUs of the job evenly over the nodes of its nodelist, up to their capacity.
+        layouts maps node names to their (sockets, cores per socket, threads per core).
+        Returns {node name: CoreAllocation}.
+        """
+        node_cores = OrderedDict((node_name, CoreAllocation()) for node_name in worker_nodes_by_name)
+        capacities = dict((node_name, int(worker_node["np"])) for node_name, worker_node in worker_nodes_by_name.items())
+        layouts = layouts or dict()
+        for job_id, cpus, nodelist, job_allocation in jobs:
+            if job_allocation:
+                cls._allocate_exactly(job_id, job_allocation, node_cores, capacities, layouts)
                 continue
-            nodes = [node for node in cls.expand_nodelist(job["Nodes"]) if node in worker_nodes_by_name]
+            nodes = [node for node in expand_hostlist(nodelist) if node in node_cores]
             if not nodes:
                 continue
 
-            remaining_cpus = max(1, job["CPUs"])
+            remaining_cpus = max(1, cpus)
             for idx, node in enumerate(nodes):
-                capacity = int(worker_nodes_by_name[node]["np"])
-                available = max(0, capacity - len(node_jobs[node]))
-                if not available:
+                allocation = node_cores[node]
+                available = capacities[node] - allocation.used
+                if available <= 0:
                     continue
                 nodes_left = len(nodes) - idx
-                cpus_for_node = max(1, remaining_cpus // nodes_left)
-                cpus_for_node = min(available, cpus_for_node, remaining_cpus)
-                node_jobs[node].extend([job["JobId"]] * cpus_for_node)
+                cpus_for_node = remaining_cpus // nodes_left or 1  # never more than remaining_cpus, which is at least 1 here
+                if cpus_for_node > available:
+                    cpus_for_node = available
+                allocation.allocate(job_id, cpus_for_node)
                 remaining_cpus -= cpus_for_node
                 if remaining_cpus <= 0:
                     break
-        return node_jobs
-
-    @classmethod
-    def expand_nodelist(cls, nodelist):
-        if not nodelist or nodelist.startswith("("):
-            return []
-
-        expanded = [nodelist]
-        while any("[" in item for item in expanded):
-            next_expanded = []
-            for item in expanded:
-                next_expanded.extend(cls._expand_first_range(item))
-            expanded = next_expanded
-        return expanded
+        return node_cores
 
     @staticmethod
-    def _expand_first_range(value):
-        match = re.search(r"\[([^\]]+)\]", value)
-        if not match:
-            return [value]
-
-        prefix = value[: match.start()]
-        suffix = value[match.end() :]
-        choices = []
-        for token in match.group(1).split(","):
-            if "-" not in token:
-                choices.append(token)
+    def _allocate_exactly(job_id, allocation, node_cores, capacities, layouts):
+        for node, cpus, cores in allocation:
+            if node not in node_cores:
                 continue
-            start, end = token.split("-", 1)
-            width = len(start)
-            choices.extend(str(number).zfill(width) for number in range(int(start), int(end) + 1))
-        return [prefix + choice + suffix for choice in choices]
+            layout = layouts.get(node)
+            if cores and layout:
+                _, cores_per_socket, threads = layout
+                cpu_ids = [(socket * cores_per_socket + core) * threads + thread for socket, core in cores for thread in range(threads)]
+                node_cores[node].place(job_id, [cpu_id for cpu_id in cpu_ids[:cpus] if cpu_id < capacities[node]])
+            else:
+                available = capacities[node] - node_cores[node].used
+                if available > 0:
+                    node_cores[node].allocate(job_id, min(cpus, available))
+
+    @staticmethod
+    def expand_nodelist(nodelist):
+        return list(expand_hostlist(nodelist))
@@ -24,9 +24,11 @@ import shutil
 import select
 import os
 import re
+import stat
 import json
 import datetime
 from collections import namedtuple, OrderedDict, Counter
+from collections.abc import Mapping
 from os.path import realpath
 from signal import SIG_DFL, signal
 
@@ -38,6 +40,16 @@ try:
     import termios
 except ImportError:
     termios = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import grp
+except ImportError:
+    grp = None
+import hashlib
+import io
 import contextlib
 import glob
 import tempfile
@@ -49,12 +61,15 @@ from qtop_py.constants import (
     QTOP_LOGFILE,
     USERPATH,
     KEYPRESS_TIMEOUT,
+    SCHEDULER_COMMAND_TIMEOUT,
     FALLBACK_TERMSIZE,
     SYMBOL_LONG_TAIL_USER,
     SYMBOL_UNKNOWN_NODE_STATE,
 )
 from qtop_py import fileutils
 from qtop_py import utils
+from qtop_py.coregrid import CoreGrid, CellPalette, CellPaletteFull
+from qtop_py.jobtable import JobDoc, JobTable, Symbols  # noqa: F401
 from qtop_py.plugins.demo import DemoBatchSystem
 from qtop_py.plugins.oar import OARBatchSystem
 from qtop_py.plugins.pbs import PBSBatchSystem
@@ -63,6 +78,8 @@ from qtop_py.plugins.slurm import SlurmBatchSystem
 from math import ceil
 from qtop_py.colormap import user_to_color_default, color_to_code, queue_to_color, nodestate_to_color_default
 import qtop_py.yaml_parser as yaml
+from qtop_py.ui.ansi import RESET, CellEscapes, EscapeTable, join_runs
+from qtop_py.ui.frame import Frame, Screen, write_frame
 from qtop_py.ui.viewport import Viewport
 from qtop_py.web import Web
 from qtop_py import __version__
@@ -70,6 +87,7 @@ import time
 
 here = sys.path[0]
 PLUGIN_BATCH_SYSTEMS = (DemoBatchSystem, OARBatchSystem, PBSBatchSystem, SGEBatchSystem, SlurmBatchSystem)
+color_escapes = EscapeTable(color_to_code)  # the escape sequence of each color colorize has been asked for
 
 
 def reset_sigpipe():
@@ -106,33 +124,6 @@ def _available_possible_ids(config):
 #     args.COLORFILE = os.path.expandvars('$HOME/qtop/qtop/qtop.colormap')
 
 
-def compress_colored_line(s):
-    ## TODO: black sheep
-    t = [item for item in re.split(r"\x1b\[0;m", s) if item != ""]
-
-    sts = []
-    st = []
-    colors = []
-    prev_code = t[0][:-1]
-    colors.append(prev_code)
-    for idx, code_letter in enumerate(t):
-        code, letter = code_letter[:-1], code_letter[-1]
-        if prev_code == code:
-            st.append(letter)
-        else:
-            sts.append(st)
-            st = []
-            st.append(letter)
-            colors.append(code)
-        prev_code = code
-    sts.append(st)
-
-    final_t = []
-    for color, seq in zip(colors, sts):
-        final_t.append(color + "".join(seq) + "\x1b[0;m")
-    return "".join(final_t)
-
-
 def literal_config_value(value):
     try:
         return literal_eval(value)
@@ -153,16 +144,27 @@ def extract_regex_detail(regex, field):
     return found.group(int(match.group("group")))
 
 
-def gauge_core_vectors(core_user_map, print_char_start, print_char_stop, coreline_notthere_or_unused, non_existent_symbol, remove_corelines):
+def gauge_core_vectors(core_grid, print_char_start, print_char_stop, coreline_notthere_or_unused, non_existent_symbol, remove_corelines):
     """
-    generator that loops over each core user vector and yields a boolean stating whether the core vector can be omitted via
-    REM_EMPTY_CORELINES or its respective switch
+    generator that loops over each core line of the grid and yields a boolean stating whether the core line can be omitted via
+    REM_EMPTY_CORELINES or its respective switch.
+    This is decided on the number of not-really-there and unused cores of the line, as counted by core_grid, without reading the line itself.
     """
+    if remove_corelines == 1:
+        for ind in range(core_grid.core_count):
+            yield ind, False
+        return
+
     delta = print_char_stop - print_char_start
-    for ind, k in enumerate(core_user_map.copy()):
-        core_x_vector = core_user_map["Core" + str(ind) + "vector"][print_char_start:print_char_stop]
-        core_x_str = "".join(str(x) for x in core_x_vector)
-        yield core_x_vector, ind, k, coreline_notthere_or_unused(non_existent_symbol, remove_corelines, delta, core_x_str)
+    length = core_grid.get_line_length(print_char_start, print_char_stop)
+    start = min(max(print_char_start, 0), core_grid.node_count)
+    stop = start + length
+    not_there_counts = core_grid.get_line_counts([non_existent_symbol])
+    not_there_or_unused_counts = core_grid.get_line_counts([non_existent_symbol, "_"])
+    for ind in range(core_grid.core_count):
+        not_there = not_there_counts[ind].count(start, stop)
+        not_there_or_unused = not_there_or_unused_counts[ind].count(start, stop)
+        yield ind, coreline_notthere_or_unused(remove_corelines, delta, length, not_there, not_there_or_unused)
 
 
 def get_date_obj_from_str(s, now):
@@ -303,7 +305,14 @@ def load_yaml_config():
         logging.debug("%s files will be saved in directory %s." % (config["scheduler"], _savepath))
     config["savepath"] = _savepath
 
-    for key in ("transpose_wn_matrices", "fill_with_user_firstletter", "faster_xml_parsing", "vertical_separator_every_X_columns", "overwrite_sample_file"):
+    for key in (
+        "transpose_wn_matrices",
+        "fill_with_user_firstletter",
+        "faster_xml_parsing",
+        "streaming_json_parsing",
+        "vertical_separator_every_X_columns",
+        "overwrite_sample_file",
+    ):
         config[key] = literal_config_value(config[key])  # TODO config should not be writeable!!
     config["sorting"]["reverse"] = literal_config_value(config["sorting"].get("reverse", "0"))  # TODO config should not be writeable!!
     config["ALT_LABEL_COLORS"] = yaml.fix_config_list(config["workernodes_matrix"][0]["wn id lines"]["alt_label_colors"])
@@ -356,7 +365,7 @@ def calculate_term_size(config, FALLBACK_TERM_SIZE, viewport):
     return term_height, term_columns
 
 
-def finalize_filepaths_schedulercommands(args, config):
+def finalize_filepaths_schedulercommands(args, config, savepath=None, pid=None):
     """
     returns a dictionary with contents of the form
     {fn : (filepath, schedulercommand)}, e.g.
@@ -364,13 +373,16 @@ def finalize_filepaths_schedulercommands(args, config):
     if the -s switch (set sourcedir) has been invoked, or
     {'pbsnodes_file': ('savepath/pbsnodes_a<some_pid>.txt', 'pbsnodes -a')}
     if ran without the -s switch.
+    savepath and pid, if given, are used instead, e.g. for the shared snapshot directory.
     """
     d = dict()
     fn_append = "_" + str(os.getpid()) if not args.SOURCEDIR else ""
+    savepath = args.workdir if savepath is None else savepath
+    fn_append = fn_append if pid is None else pid
     for fn, path_command in config["schedulers"][scheduler].items():
         path, command = path_command.strip().split(", ")
-        path = path % {"savepath": args.workdir, "pid": fn_append}
-        command = command % {"savepath": args.workdir}
+        path = path % {"savepath": savepath, "pid": fn_append}
+        command = command % {"savepath": savepath}
         d[fn] = (path, command)
     return d
 
@@ -391,35 +403,86 @@ def auto_get_avail_batch_system(config):
     raise SchedulerNotSpecified
 
 
-def execute_shell_batch_commands(batch_system_commands, filenames, _file, _savepath):
+def launch_batch_command(batch_system_command, filename, _savepath):
     """
-    scheduler-specific commands are invoked from the shell and their output is saved *atomically* to files,
-    as defined by the user in QTOPCONF_YAML
+    Starts a scheduler-specific command, with its output going to a temporary file in _savepath.
+    Returns the process, the name of the temporary file and the (temporary) file its stderr goes to.
     """
-    _batch_system_command = batch_system_commands[_file].strip()
     with tempfile.NamedTemporaryFile("w", dir=_savepath, delete=False) as fin:
-        logging.debug('Command: "%s" -- result will be saved in: %s' % (_batch_system_command, filenames[_file]))
+        logging.debug('Command: "%s" -- result will be saved in: %s' % (batch_system_command, filename))
         logging.debug("\tFile state before subprocess call: %(fin)s" % {"fin": fin})
-        logging.debug("\tWaiting on subprocess.call...")
 
         # splitting the command passed in so only the first item in a command
         # from the yaml file is executed with the rest of the line treated as
         # arguments, this enables shell=False, and keeps us from having
         # injected commands
-        command = subprocess.Popen(_batch_system_command.split(), stdout=fin, stderr=subprocess.PIPE)
-        error = command.communicate()[1]
+        stderr = tempfile.TemporaryFile()
+        try:
+            command = subprocess.Popen(batch_system_command.split(), stdout=fin, stderr=stderr)
+        except OSError:
+            stderr.close()
+            fin.close()
+            os.remove(fin.name)
+            raise
+    return command, fin.name, stderr
+
+
+def cancel_batch_command(command, tempname):
+    if command.poll() is None:
+        command.kill()
         command.wait()
-        if error:
-            logging.exception("A message from your shell: %s" % error)
-            logging.critical('%s could not be executed. Maybe try "module load %s"?' % (_batch_system_command, scheduler))
+    try:
+        os.remove(tempname)
+    except OSError:
+        pass
 
-            web.stop()
-            sys.exit(1)
-        tempname = fin.name
-        logging.debug("File state after subprocess call: %(fin)s" % {"fin": fin})
-    os.rename(tempname, filenames[_file])
 
-    return filenames[_file]
+def execute_shell_batch_commands(batch_system_commands, filenames, _savepath, timeout=None):
+    """
+    scheduler-specific commands are invoked from the shell and their output is saved *atomically* to files,
+    as defined by the user in QTOPCONF_YAML.
+    All the commands are launched at once, so the wait is as long as the slowest of them. If one of them fails,
+    or if they haven't all finished timeout seconds after the launch, the ones still running are cancelled
+    and none of the files is saved.
+    """
+    launched = []
+    completed = False
+    try:
+        for _file in batch_system_commands:
+            command, tempname, stderr = launch_batch_command(batch_system_commands[_file].strip(), filenames[_file], _savepath)
+            launched.append((_file, command, tempname, stderr))
+
+        deadline = time.time() + timeout if timeout else None
+        logging.debug("\tWaiting on %s subprocesses..." % len(launched))
+        for _file, command, tempname, stderr in launched:
+            _batch_system_command = batch_system_commands[_file].strip()
+            try:
+                command.wait(timeout=max(deadline - time.time(), 0) if deadline is not None else None)
+            except subprocess.TimeoutExpired:
+                logging.critical("%s did not complete within %s seconds (scheduler_command_timeout in %s)." % (_batch_system_command, timeout, QTOPCONF_YAML))
+                break
+
+            stderr.seek(0)
+            error = stderr.read()
+            if error:
+                logging.exception("A message from your shell: %s" % error)
+                logging.critical('%s could not be executed. Maybe try "module load %s"?' % (_batch_system_command, scheduler))
+                break
+            logging.debug("File state after subprocess call: %s" % tempname)
+        else:
+            for _file, command, tempname, stderr in launched:
+                os.rename(tempname, filenames[_file])
+            completed = True
+    finally:
+        for _file, command, tempname, stderr in launched:
+            stderr.close()
+            if not completed:
+                cancel_batch_command(command, tempname)
+
+    if not completed:
+        web.stop()
+        sys.exit(1)
+    return filenames
 
 
 def get_detail_of_name(account_jobs_table):
@@ -486,10 +549,12 @@ def get_input_filenames(INPUT_FNs_commands, config):
     for _file in INPUT_FNs_commands:
         filenames[_file], batch_system_commands[_file] = INPUT_FNs_commands[_file]
 
-        if not args.SOURCEDIR:
-            _savepath = os.path.realpath(os.path.expandvars(config["savepath"]))
-            filenames[_file] = execute_shell_batch_commands(batch_system_commands, filenames, _file, _savepath)
+    if not args.SOURCEDIR:
+        _savepath = os.path.realpath(os.path.expandvars(config["savepath"]))
+        timeout = float(config.get("scheduler_command_timeout", SCHEDULER_COMMAND_TIMEOUT))
+        filenames = execute_shell_batch_commands(batch_system_commands, filenames, _savepath, timeout)
 
+    for _file in filenames:
         if not os.path.isfile(filenames[_file]):
             raise fileutils.FileNotFound(filenames[_file])
     return filenames
@@ -786,10 +851,115 @@ def control_qtop(viewport, read_char, cluster, old_attrs, new_attrs):
 
 def fetch_scheduler_files(args, config):
     INPUT_FNs_commands = finalize_filepaths_schedulercommands(args, config)
-    scheduler_output_filenames = get_input_filenames(INPUT_FNs_commands, config)
+    shared_snapshot_ttl = float(config.get("shared_snapshot_ttl", 0))
+    if not args.SOURCEDIR and shared_snapshot_ttl > 0 and fcntl is not None:
+        scheduler_output_filenames = fetch_shared_snapshot(args, config, INPUT_FNs_commands, shared_snapshot_ttl)
+    else:
+        scheduler_output_filenames = get_input_filenames(INPUT_FNs_commands, config)
     return scheduler_output_filenames
 
 
+def get_shared_snapshot_dir(shared_dir, batch_system_commands):
+    """One directory per scheduler and set of batch commands, e.g. shared_dir/pbs-1f0e3dad99"""
+    commands = "\n".join("%s=%s" % (_file, batch_system_commands[_file].strip()) for _file in sorted(batch_system_commands))
+    return os.path.join(shared_dir, "%s-%s" % (scheduler, hashlib.sha1(commands.encode("utf-8")).hexdigest()[:10]))
+
+
+def is_shared_snapshot_fresh(stamp, filenames, ttl):
+    try:
+        age = time.time() - os.stat(stamp).st_mtime
+    except OSError:
+        return False
+    return 0 <= age < ttl and all(os.path.isfile(filename) for filename in filenames.values())
+
+
+def refresh_shared_snapshot(batch_system_commands, filenames, snapshot_dir, stamp, config):
+    """
+    Runs the batch commands into the snapshot directory and marks the snapshot as complete.
+    The files are made readable by everyone sharing the directory.
+    """
+    timeout = float(config.get("scheduler_command_timeout", SCHEDULER_COMMAND_TIMEOUT))
+    execute_shell_batch_commands(batch_system_commands, filenames, snapshot_dir, timeout)
+    for filename in filenames.values():
+        os.chmod(filename, 0o644)
+    with tempfile.NamedTemporaryFile("w", dir=snapshot_dir, delete=False) as fin:
+        fin.write("%s\n" % os.getpid())
+    os.chmod(fin.name, 0o644)
+    os.rename(fin.name, stamp)
+
+
+def make_shared_snapshot_dir(snapshot_dir, gid=None):
+    """
+    Creates snapshot_dir, unless it's there already, writable by its owner only or, given gid, by that group too (setgid).
+    Then checks that it can be trusted: a real directory, not a symlink, owned by the current user or by group gid,
+    and not writable by others. Otherwise anyone could plant scheduler output there, or a symlink to a file of the user.
+    """
+    try:
+        os.mkdir(snapshot_dir, 0o700)
+    except FileExistsError:
+        pass
+    else:
+        if gid is not None:
+            os.chown(snapshot_dir, -1, gid)
+        os.chmod(snapshot_dir, 0o2775 if gid is not None else 0o755)
+
+    st = os.lstat(snapshot_dir)
+    if not stat.S_ISDIR(st.st_mode):
+        raise UntrustedSnapshotDir(snapshot_dir, "not a directory")
+    if st.st_uid != os.geteuid() and (gid is None or st.st_gid != gid):
+        raise UntrustedSnapshotDir(snapshot_dir, "owned by someone else")
+    if st.st_mode & stat.S_IWOTH or (st.st_mode & stat.S_IWGRP and st.st_gid != gid):
+        raise UntrustedSnapshotDir(snapshot_dir, "writable by others")
+
+
+def fetch_shared_snapshot(args, config, INPUT_FNs_commands, ttl):
+    """
+    Same as get_input_filenames, but the batch commands are only run if the snapshot in the shared directory
+    (shared_snapshot_dir in QTOPCONF_YAML) is older than ttl seconds; otherwise the files of the snapshot are copied.
+    The snapshot is refreshed under an exclusive lock and copied under a shared one, so that
+    qtop instances running at the same time query the scheduler once per ttl between them,
+    and never get a half-written snapshot.
+    Only the user's own snapshot directory is used, unless shared_snapshot_group is set, in which case the group's one is used too.
+    If the shared directory can't be used, or can't be trusted, the batch commands are run privately.
+    """
+    shared_dir = os.path.realpath(os.path.expandvars(config["shared_snapshot_dir"]))
+    batch_system_commands = dict((_file, command) for _file, (path, command) in INPUT_FNs_commands.items())
+    snapshot_dir = get_shared_snapshot_dir(shared_dir, batch_system_commands)
+    shared_fns_commands = finalize_filepaths_schedulercommands(args, config, savepath=snapshot_dir, pid="")
+    shared_filenames = dict((_file, path) for _file, (path, command) in shared_fns_commands.items())
+    shared_commands = dict((_file, command) for _file, (path, command) in shared_fns_commands.items())
+    stamp = os.path.join(snapshot_dir, ".complete")
+
+    lock_fd = None
+    try:
+        group = config.get("shared_snapshot_group")
+        gid = grp.getgrnam(group).gr_gid if group else None
+        fileutils.mkdir_p(shared_dir)
+        make_shared_snapshot_dir(snapshot_dir, gid)
+        lock_fd = os.open(os.path.join(snapshot_dir, ".lock"), os.O_RDONLY | os.O_CREAT | os.O_NOFOLLOW, 0o664)
+
+        fcntl.flock(lock_fd, fcntl.LOCK_SH)
+        if not is_shared_snapshot_fresh(stamp, shared_filenames, ttl):
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            if not is_shared_snapshot_fresh(stamp, shared_filenames, ttl):  # unless another instance got there first
+                logging.debug("Refreshing shared snapshot in %s" % snapshot_dir)
+                refresh_shared_snapshot(shared_commands, shared_filenames, snapshot_dir, stamp, config)
+
+        filenames = dict()
+        for _file, (path, command) in INPUT_FNs_commands.items():
+            shutil.copyfile(shared_filenames[_file], path)
+            filenames[_file] = path
+        logging.debug("Using shared snapshot in %s" % snapshot_dir)
+        return filenames
+    except (IOError, OSError, KeyError, UntrustedSnapshotDir) as e:
+        logging.warning("Shared snapshot directory %s can't be used (%s). Running the batch commands privately." % (snapshot_dir, e))
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)  # releases the lock
+
+    return get_input_filenames(INPUT_FNs_commands, config)
+
+
 def decide_batch_system(cmdline_switch, env_var, config_file_batch_option, schedulers, available_batch_systems, config):
     """
     Qtop first checks in cmdline switches, environmental variables and the config files, in this order,
@@ -820,19 +990,15 @@ def decide_batch_system(cmdline_switch, env_var, config_file_batch_option, sched
         raise NoSchedulerFound
 
 
-def get_output_size(max_line_len, output_fp, max_height=0):
+def get_output_size(max_line_len, frame):
     """
-    Returns the char dimensions of the entirety of the qtop output file
+    Returns the char dimensions of the entirety of the qtop output, out of its Frame
     """
-    ansi_escape = re.compile(r"\x1b[^m]*m")  # matches ANSI escape characters
-
+    max_height = frame.height
     if not max_height:
-        with open(output_fp, "r") as f:
-            max_height = len(f.readlines())
-            if not max_height:
-                raise ValueError("There is no output from qtop *whatsoever*. Weird.")
+        raise ValueError("There is no output from qtop *whatsoever*. Weird.")
 
-    max_line_len = max(len(ansi_escape.sub("", line.strip())) for line in open(output_fp, "r")) if not max_line_len else max_line_len
+    max_line_len = frame.width if not max_line_len else max_line_len
 
     logging.debug("Total nr of lines: %s" % max_height)
     logging.debug("Max line length: %s" % max_line_len)
@@ -855,15 +1021,6 @@ def update_config_with_cmdline_vars(args, config):
     return config
 
 
-def attempt_faster_xml_parsing(config):
-    if config["faster_xml_parsing"]:
-        try:
-            from lxml import etree
-        except ImportError:
-            logging.warning('Module lxml is missing. Try issuing "pip install lxml". Reverting to xml module.')
-            from xml.etree import ElementTree as etree  # noqa: F401
-
-
 def init_dirs(args, _savepath):
     args.SOURCEDIR = realpath(args.SOURCEDIR) if args.SOURCEDIR else None
     logging.debug("User-defined source directory: %s" % args.SOURCEDIR)
@@ -873,6 +1030,18 @@ def init_dirs(args, _savepath):
     return args
 
 
+def render_frame(display, frame_buffer, stdout, fout):
+    """
+    Prints the selected sections of display, a TextDisplay, into frame_buffer, which sys.stdout points to until then,
+    and saves the rendered text to fout. Returns the text.
+    """
+    display.display_selected_sections(config["savepath"], SAMPLE_FILENAME, QTOP_LOGFILE)
+    sys.stdout = stdout  # sys.stdout is back to its normal function (i.e. prints to screen)
+    frame_text = frame_buffer.getvalue()
+    fout.write(frame_text)
+    return frame_text
+
+
 def wait_for_keypress_or_autorefresh(viewport, FALLBACK_TERMSIZE, KEYPRESS_TIMEOUT=1):
     """
     This will make qtop wait for user input for a while,
@@ -901,26 +1070,42 @@ def assign_color_to_each_qname(worker_nodes):
 
 
 def keep_queue_initials_only_and_colorize(worker_nodes, queue_to_color):
+    """
+    Returns copies of the worker nodes with their queues turned to ColorStr lists, one ColorStr being shared by all the nodes of a queue.
+    The worker nodes passed in are left untouched, so that the Document can be compared against the next one.
+    """
     # TODO remove monstrosity!
+    colored_worker_nodes = []
+    color_queues = dict()
     for worker_node in worker_nodes:
         color_q_list = []
         for queue in worker_node["qname"]:
-            color_q = utils.ColorStr(queue, color=queue_to_color.get(queue, ""))
+            try:
+                color_q = color_queues[queue]
+            except KeyError:
+                color_q = color_queues[queue] = utils.ColorStr(queue, color=queue_to_color.get(queue, ""))
             color_q_list.append(color_q)
-        worker_node["qname"] = color_q_list
-    return worker_nodes
+        colored_worker_nodes.append(dict(worker_node, qname=color_q_list))
+    return colored_worker_nodes
 
 
 def colorize_nodestate(worker_nodes, nodestate_to_color, ffunc):
+    """
+    Returns copies of the worker nodes with their state turned to a ColorStr list.
+    The list is made once per distinct node state and shared by the nodes in that state.
+    """
     # TODO remove monstrosity!
+    colored_worker_nodes = []
+    color_nodestates = dict()
     for worker_node in worker_nodes:
         full_nodestate = worker_node["state"]  # actual node state
-        total_color_nodestate = []
-        for nodestate in worker_node["state"]:  # split nodestate for displaying purposes
-            color_nodestate = utils.ColorStr(nodestate, color=nodestate_to_color.get(full_nodestate, ""))
-            total_color_nodestate.append(color_nodestate)
-        worker_node["state"] = total_color_nodestate
-    return worker_nodes
+        try:
+            total_color_nodestate = color_nodestates[full_nodestate]
+        except KeyError:
+            # split nodestate for displaying purposes
+            total_color_nodestate = color_nodestates[full_nodestate] = [utils.ColorStr(nodestate, color=nodestate_to_color.get(full_nodestate, "")) for nodestate in full_nodestate]
+        colored_worker_nodes.append(dict(worker_node, state=total_color_nodestate))
+    return colored_worker_nodes
 
 
 def discover_qtop_batch_systems():
@@ -956,26 +1141,125 @@ def process_args(args):
 #     logging.error("Uncaught exception", exc_info=(exc_type, exc_value, exc_traceback))
 
 
+class AccountPatternMatcher(object):
+    """
+    Matches unix accounts against the account patterns of a user_to_color mapping.
+    The patterns are compiled once, and the outcome for every account is remembered,
+    so that a matcher kept across refreshes only does work for accounts it hasn't met before.
+    """
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self._compiled_patterns = [(re.compile(re_account), re_account) for re_account in list(mapping.keys())[::-1]]
+        self._account_to_pattern = dict()
+
+    def get_pattern(self, user):
+        try:
+            return self._account_to_pattern[user]
+        except KeyError:
+            pass
+
+        account_letters = re.search("[A-Za-z]+", user).group(0)
+        for compiled_pattern, re_account in self._compiled_patterns:
+            if compiled_pattern.search(user) is not None:
+                account_letters = re_account  # colors the text according to the regex given by the user in qtopconf
+                break
+
+        pattern = self._account_to_pattern[user] = account_letters if account_letters in self.mapping else "NoPattern"
+        return pattern
+
+
+class HighlightMatcher(object):
+    """
+    The highlight rules of the core matrix (see "highlight" in QTOPCONF_YAML), with their patterns compiled once per refresh.
+    All the patterns of all the rules are combined by the and/or function of the last rule having any
+    ("include_" needs all of them to match, "or_include_" any of them). User patterns only depend on the user
+    and queue patterns only on the queue, so the outcome is remembered per user and per queue.
+    """
+
+    def __init__(self, highlight_rules, id_to_user):
+        self.active = bool(highlight_rules)
+        self.and_or_func = any
+        self.user_patterns = []
+        self.queue_patterns = []
+        self._user_matches = dict()
+        self._queue_matches = dict()
+
+        for user_queue_to_highlight, type, and_or_func in WNOccupancy.get_hl_q_or_users(highlight_rules):
+            self.and_or_func = and_or_func
+            if type == "user_pat":
+                self.user_patterns.append(re.compile(user_queue_to_highlight))
+            elif type == "user_id":
+                # the id stands for the (last) user having it, who is then used as a pattern
+                user = id_to_user.get(user_queue_to_highlight)
+                self.user_patterns.append(re.compile(user) if user is not None else None)
+            elif type == "queue":
+                self.queue_patterns.append(re.compile(user_queue_to_highlight))
+
+    def is_highlighted(self, user, queue):
+        if not self.active:
+            return True
+
+        try:
+            user_matches = self._user_matches[user]
+        except KeyError:
+            user_matches = self._user_matches[user] = self.and_or_func(self._matches(pattern, user) for pattern in self.user_patterns)
+        try:
+            queue_matches = self._queue_matches[queue]
+        except KeyError:
+            queue_matches = self._queue_matches[queue] = self.and_or_func(self._matches(pattern, queue) for pattern in self.queue_patterns)
+
+        return (user_matches and queue_matches) if self.and_or_func is all else (user_matches or queue_matches)
+
+    @staticmethod
+    def _matches(pattern, string):
+        """an empty match doesn't count"""
+        if pattern is None:
+            return False
+        match = pattern.match(string)
+        return match is not None and bool(match.group(0))
+
+
+# the jobs of each user in total, per (user, job state) and per (user, job queue)
+UserJobCounts = namedtuple("UserJobCounts", ["totals", "states", "queues"])
+
+# a worker node's column in the core grid (symbol and color codes), along with the users and (base) job ids found on it
+NodeColumn = namedtuple("NodeColumn", ["symbols", "colors", "users", "job_keys"])
+
+
 class WNOccupancy(object):
-    def __init__(self, cluster, config, document, user_to_color, job_ids):
+    def __init__(self, cluster, config, document, user_to_color, job_ids, account_matcher=None, previous=None, diff=None):
+        """
+        If previous (the WNOccupancy of the last refresh) and diff (the DocumentDiff from its document to this one) are given,
+        only the matrix columns, node user sets and account counts affected by the diff are recalculated.
+        """
+        self.account_matcher = account_matcher
+        self.previous = previous if diff is not None else None
+        self.diff = diff
         self.cluster = cluster
         self.config = config
         self.document = document
         self.account_jobs_table = list()
         self.user_to_id = dict()
-        self.jobid_to_user_to_queue = dict()
-        self.user_names, self.job_states, self.job_queues = self._get_usernames_states_queues(document.jobs_dict)
+        # the ids of the previous results are only comparable if the jobs are interned in the same symbol tables
+        self.jobs = JobTable.from_mapping(document.jobs_dict, self.previous.jobs.symbols if self.previous is not None else None)
         self.job_ids = job_ids
+        self.dirty_nodes = set()
+        self.node_order = list()
+        self.node_columns = dict()
+        self.job_to_nodes = dict()
+        self.node_user_sets = dict()
+        self.user_node_counts = Counter()
+        self.user_machine_use = Counter()
+        self.user_signatures = dict()
+        self.user_job_triplets = Counter()
+        self.user_job_counts = UserJobCounts(Counter(), Counter(), Counter())
+        self.user_alljobs_sorted_lot = list()
+        self.core_span = list()
+        self.core_cell_codes = dict()
 
         self.calculate(document, user_to_color)
-
-    def _get_usernames_states_queues(self, jobs_dict):
-        user_names, job_states, job_queues = list(), list(), list()
-        for key, value in jobs_dict.items():
-            user_names.append(value.user_name)
-            job_states.append(value.job_state)
-            job_queues.append(value.job_queue)
-        return user_names, job_states, job_queues
+        self.previous = self.diff = None  # no need to keep older snapshots alive
 
     def calculate(self, document, user_to_color):
         """
@@ -986,14 +1270,24 @@ class WNOccupancy(object):
         """
         if not self.cluster:
             return self  # TODO fix
-        # document.jobs_dict => job_id: job name/state/queue
-
-        self.jobid_to_user_to_queue = dict(zip(self.job_ids, zip(self.user_names, self.job_queues)))
-        self.user_machine_use = self.calculate_user_node_use(self.cluster, self.jobid_to_user_to_queue, self.job_ids, self.user_names, self.job_queues)
-
-        user_alljobs_sorted_lot = self._produce_user_lot(self.user_names)
+        self.user_to_color = user_to_color
+        # document.jobs_dict => JobTable of job_id: job name/state/queue
+
+        if self.previous is not None:
+            self.dirty_nodes = self._get_dirty_nodes(self.diff)
+        self.user_node_counts = self.calculate_user_node_use(self.cluster, self.jobs)
+        users = self.jobs.users
+        self.user_machine_use = Counter(dict((users[user_id], node_count) for user_id, node_count in self.user_node_counts.items()))
+
+        self.user_job_triplets = self._count_user_job_triplets()
+        self.user_job_counts = self._split_user_job_counts(self.user_job_triplets)
+        if self.previous is not None:
+            user_alljobs_sorted_lot = self._patch_user_lot(self.user_job_counts.totals)
+        else:
+            user_alljobs_sorted_lot = self._produce_user_lot(self.user_job_counts.totals)
+        self.user_alljobs_sorted_lot = user_alljobs_sorted_lot
         user_to_id = self._create_id_for_users(user_alljobs_sorted_lot)
-        user_job_per_state_counts = self._calculate_user_job_counts(self.user_names, self.job_states, user_alljobs_sorted_lot, user_to_id)
+        user_job_per_state_counts = self._calculate_user_job_counts(self.jobs.users.values, self.user_job_counts.states, user_to_id)
         _account_jobs_table = self._create_sort_acct_jobs_table(user_job_per_state_counts, user_alljobs_sorted_lot, user_to_id)
         self.account_jobs_table, self.user_to_id = self._create_account_jobs_table(user_to_id, _account_jobs_table)
         self.userid_to_userid_re_pat = self.make_pattern_out_of_mapping(mapping=user_to_color)
@@ -1007,7 +1301,7 @@ class WNOccupancy(object):
             if scheduler in systems:
                 self.__setattr__(part_name, self.calc_general_mult_attr_line(part_name, yaml_key, config))
 
-        self.core_user_map = self._calc_core_matrix(self.user_to_id, self.jobid_to_user_to_queue)
+        self.core_grid = self._calc_core_matrix(self.user_to_id, self.jobs)
 
     def _create_account_jobs_table(self, user_to_id, account_jobs_table):
         for quintuplet in account_jobs_table:
@@ -1038,49 +1332,95 @@ class WNOccupancy(object):
         """
         counting of e.g. R, Q, C, W, E attached to each user
         """
+        user_job_per_state_counts = self._create_user_job_counts_from_state_counts(Counter(zip(user_names, job_states)), state_abbrevs)
+
+        for user_name in user_job_per_state_counts["running_of_user"]:
+            for state_count_key in user_job_per_state_counts:
+                if state_count_key != "running_of_user":
+                    user_job_per_state_counts[state_count_key].setdefault(user_name, 0)
+
+        return user_job_per_state_counts
+
+    @staticmethod
+    def _create_user_job_counts_from_state_counts(user_state_counts, state_abbrevs):
+        """
+        counting of e.g. R, Q, C, W, E attached to each user, out of (user, job state) counts.
+        Users are only present for the states they have jobs in; the rest are filled in by _calculate_user_job_counts.
+        """
         user_job_per_state_counts = dict()
         for state_count_key in state_abbrevs.values():
             user_job_per_state_counts[state_count_key] = dict()
 
-        for user_name, job_state in zip(user_names, job_states):
+        for (user_name, job_state), count in user_state_counts.items():
             try:
                 state_count_key = state_abbrevs[job_state]
             except KeyError:
                 raise JobNotFound(job_state)
 
-            user_job_per_state_counts[state_count_key][user_name] = user_job_per_state_counts[state_count_key].get(user_name, 0) + 1
-
-        for user_name in user_job_per_state_counts["running_of_user"]:
-            for state_count_key in user_job_per_state_counts:
-                if state_count_key != "running_of_user":
-                    user_job_per_state_counts[state_count_key].setdefault(user_name, 0)
+            user_job_per_state_counts[state_count_key][user_name] = user_job_per_state_counts[state_count_key].get(user_name, 0) + count
 
         return user_job_per_state_counts
 
-    def _produce_user_lot(self, _user_names):
+    def _produce_user_lot(self, user_to_alljobs_count):
         """
         Produces a list of tuples (lot) of the form (user account, all jobs count) in descending order.
-        Used in the user accounts and poolmappings table
+        Users with the same amount of jobs are ordered like in the user accounts and poolmappings table, where the lot is used.
         """
-        user_to_alljobs_count = {}
-        for user_name in set(_user_names):
-            user_to_alljobs_count[user_name] = _user_names.count(user_name)
-
-        user_alljobs_sorted_lot = sorted(user_to_alljobs_count.items(), key=itemgetter(1), reverse=True)
+        user_alljobs_sorted_lot = sorted(user_to_alljobs_count.items(), key=itemgetter(1, 0), reverse=True)
         return user_alljobs_sorted_lot
 
-    def _calculate_user_job_counts(self, user_names, job_states, user_alljobs_sorted_lot, user_to_id):
+    def _count_user_job_triplets(self):
+        """
+        Counts the jobs of each (user, job state, job queue) triplet, in a single pass over the jobs.
+        When patching, the previous counts are corrected for the jobs that were added, removed or changed.
+        """
+        if self.previous is None:
+            return self.jobs.count_triplets()
+
+        user_job_triplets = self.previous.user_job_triplets.copy()
+        old_jobs_dict, new_jobs_dict = self.previous.document.jobs_dict, self.document.jobs_dict
+        for job_id in self.diff.removed_jobs | self.diff.changed_jobs:
+            job = old_jobs_dict[job_id]
+            user_job_triplets[(job.user_name, job.job_state, job.job_queue)] -= 1
+        for job_id in self.diff.added_jobs | self.diff.changed_jobs:
+            job = new_jobs_dict[job_id]
+            user_job_triplets[(job.user_name, job.job_state, job.job_queue)] += 1
+        return +user_job_triplets  # drops the triplets that have no jobs left
+
+    @staticmethod
+    def _split_user_job_counts(user_job_triplets):
+        """
+        Folds the (user, job state, job queue) counts into a UserJobCounts.
+        This only loops over the distinct triplets, not over the jobs.
+        """
+        totals, states, queues = Counter(), Counter(), Counter()
+        for (user_name, job_state, job_queue), count in user_job_triplets.items():
+            totals[user_name] += count
+            states[(user_name, job_state)] += count
+            queues[(user_name, job_queue)] += count
+        return UserJobCounts(totals, states, queues)
+
+    def _patch_user_lot(self, user_to_alljobs_count):
+        """
+        Same as _produce_user_lot, but users with the same amount of jobs keep their previous ranking,
+        so that their ids don't swap between refreshes.
+        """
+        previous_rank = dict((user_name, rank) for rank, (user_name, _) in enumerate(self.previous.user_alljobs_sorted_lot))
+        new_rank = len(previous_rank)
+        return sorted(user_to_alljobs_count.items(), key=lambda user_count: (-user_count[1], previous_rank.get(user_count[0], new_rank)))
+
+    def _calculate_user_job_counts(self, user_names, user_state_counts, user_to_id):
         """
         Calculates and prints what is actually below the id|  R + Q /all | unix account etc line
         :param user_names: list
-        :param job_states: list
-        :return: (list, list, dict)
+        :param user_state_counts: Counter of (user, job state) pairs
+        :return: dict
         """
         self.config = self._expand_useraccounts_symbols(self.config, user_names)
         state_abbrevs = self.config["state_abbreviations"][scheduler]
 
         try:
-            user_job_per_state_counts = self._create_user_job_counts(user_names, job_states, state_abbrevs)
+            user_job_per_state_counts = self._create_user_job_counts_from_state_counts(user_state_counts, state_abbrevs)
         except JobNotFound as e:
             logging.critical("Job state %s not found. You may wish to add that node state inside %s in state_abbreviations section.\n" % (e.job_state, QTOPCONF_YAML))
 
@@ -1121,17 +1461,14 @@ class WNOccupancy(object):
         The first matched regex holds (loops from bottom to top in the pattern list).
         If no matching was possible, there will be no coloring applied.
         """
+        matcher = getattr(self, "account_matcher", None)
+        if matcher is None or matcher.mapping is not mapping:
+            matcher = AccountPatternMatcher(mapping)
+
         pattern = {}
         for line in self.account_jobs_table:
             uid, user = line[0], line[4]
-            account_letters = re.search("[A-Za-z]+", user).group(0)
-            for re_account in list(mapping.keys())[::-1]:
-                match = re.search(re_account, user)
-                if match is not None:
-                    account_letters = re_account  # colors the text according to the regex given by the user in qtopconf
-                    break
-
-            pattern[str(uid)] = account_letters if account_letters in mapping else "NoPattern"
+            pattern[str(uid)] = matcher.get_pattern(user)
 
         # TODO: remove these from here
         pattern[self.config["non_existent_node_symbol"]] = "#"
@@ -1260,47 +1597,129 @@ class WNOccupancy(object):
                 break
         return multiline_map
 
-    def _calc_core_matrix(self, user_to_id, jobid_to_user_to_queue):
-        core_user_map = OrderedDict()
+    def _calc_core_matrix(self, user_to_id, jobs):
+        """
+        The matrix is a CoreGrid put together out of one column of cells per worker node, kept in node_columns by domainname.
+        When patching, columns are only recalculated for the dirty nodes and the nodes running jobs of users
+        whose id or color pattern changed; if the nodes are laid out as in the previous refresh,
+        only those columns are rewritten in the previous grid.
+        The palette is carried over along with the columns, so it keeps the symbols and colors of the whole session;
+        once it runs out of codes, all the columns are recalculated with a new one.
+        """
+        self.core_coloring = dynamic_config.get("core_coloring", self.config["core_coloring"])
+        self.core_pattern_to_color = {"user_to_color": self.user_to_color, "queue_to_color": queue_to_color}[self.core_coloring]
+        self.id_to_user = dict((str(id_), user) for user, id_ in user_to_id.items())
+        self.highlight_matcher = HighlightMatcher(dynamic_config.get("highlight", self.config["highlight"]), self.id_to_user)
+        workernode_dict = self.cluster.workernode_dict
+        self.core_span = list(self.cluster.core_span)
+        intern_user = jobs.users.intern
+        self.user_signatures = dict((intern_user(user), (str(id_), self.userid_to_userid_re_pat[str(id_)])) for user, id_ in user_to_id.items())
+        self.node_order = [workernode_dict[_node]["domainname"] for _node in workernode_dict]
+
+        previous = self.previous
+        if previous is not None and previous.core_span == self.core_span:
+            self.cell_palette = previous.cell_palette
+            stale_nodes = self.dirty_nodes | self._get_nodes_of_changed_users()
+            reusable_columns = previous.node_columns
+            self.job_to_nodes = previous.job_to_nodes
+            for domainname in set(reusable_columns).difference(self.node_order):  # removed or filtered out
+                self._unindex_node_jobs(domainname, reusable_columns[domainname])
+        else:
+            previous, stale_nodes, reusable_columns = None, set(), dict()
+            self.cell_palette = CellPalette()
 
-        core_coloring = dynamic_config.get("core_coloring", self.config["core_coloring"])
+        try:
+            return self._fill_core_matrix(user_to_id, jobs, previous, stale_nodes, reusable_columns)
+        except CellPaletteFull:
+            if previous is None:
+                raise
+            logging.debug("The core matrix palette is full; recalculating all the node columns with a new one.")
+            self.cell_palette = CellPalette()
+            self.node_columns = dict()
+            self.job_to_nodes = dict()
+            self.core_cell_codes = dict()
+            return self._fill_core_matrix(user_to_id, jobs, None, set(), dict())
+
+    def _fill_core_matrix(self, user_to_id, jobs, previous, stale_nodes, reusable_columns):
+        """Fills in node_columns, reusing the columns of reusable_columns that aren't stale, and returns the CoreGrid made out of them"""
+        recalculated_positions = []
+        for position, _node in enumerate(self.cluster.workernode_dict):
+            domainname = self.node_order[position]
+            if domainname in self.node_columns:  # e.g. N/A for non-existent nodes
+                continue
+            if domainname in reusable_columns and domainname not in stale_nodes:
+                self.node_columns[domainname] = reusable_columns[domainname]
+                continue
 
-        for core_nr in self.cluster.core_span:
-            core_user_map["Core%svector" % str(core_nr)] = []  # Cpu0vector, Cpu1vector, Cpu2vector, ... = [],[],[], ...
+            node_column = self._calc_node_column(_node, user_to_id, self.core_span, jobs)
+            self._unindex_node_jobs(domainname, reusable_columns.get(domainname))
+            for job_key in node_column.job_keys:
+                self.job_to_nodes.setdefault(job_key, set()).add(domainname)
+            self.node_columns[domainname] = node_column
+            recalculated_positions.append(position)
 
-        for _node in self.cluster.workernode_dict:
-            core_user_map = self._fill_node_cores_vector(_node, core_user_map, user_to_id, self.cluster.core_span, jobid_to_user_to_queue, core_coloring)
+        if previous is not None and previous.node_order == self.node_order:
+            core_grid = previous.core_grid
+            for position in recalculated_positions:
+                node_column = self.node_columns[self.node_order[position]]
+                core_grid.set_column(position, (node_column.symbols, node_column.colors))
+            return core_grid
 
-        return core_user_map
+        columns = [self.node_columns[domainname][:2] for domainname in self.node_order]
+        return CoreGrid.from_columns(len(self.core_span), self.cell_palette, columns)
 
-    def _fill_node_cores_vector(self, _node, core_user_map, user_to_id, _core_span, jobid_to_user_to_queue, core_coloring):
+    def _get_dirty_nodes(self, diff):
+        """
+        Nodes (domainnames) whose jobs or users may differ from the previous refresh:
+        the ones added or changed, and the ones running a job that was added, removed or changed.
+        """
+        dirty_nodes = diff.added_nodes | diff.changed_nodes
+        job_to_nodes = self.previous.job_to_nodes
+        for job_id in diff.touched_jobs():
+            dirty_nodes.update(job_to_nodes.get(job_id.partition("[")[0], ()))
+        return dirty_nodes
+
+    def _get_nodes_of_changed_users(self):
+        previous_signatures = self.previous.user_signatures
+        changed_users = set(user for user, signature in self.user_signatures.items() if previous_signatures.get(user) != signature)
+        changed_users.update(set(previous_signatures).difference(self.user_signatures))
+        if not changed_users:
+            return set()
+        return set(domainname for domainname, node_column in self.previous.node_columns.items() if not node_column.users.isdisjoint(changed_users))
+
+    def _unindex_node_jobs(self, domainname, node_column):
+        if node_column is None:
+            return
+        for job_key in node_column.job_keys:
+            nodes = self.job_to_nodes.get(job_key)
+            if nodes is not None:
+                nodes.discard(domainname)
+                if not nodes:
+                    del self.job_to_nodes[job_key]
+
+    def _calc_node_column(self, _node, user_to_id, _core_span, jobs):
         """
-        Calculates the actual contents of the map by filling in a status string for each CPU line
+        Calculates the actual contents of a node's column by filling in a status cell for each CPU line
         One of the two dimensions of the matrix is determined by the highest-core WN existing. If other WNs have less cores,
         these positions are filled with '#'s (or whatever is defined in config['non_existent_node_symbol']).
         """
-        state_np_corejob = cluster.workernode_dict[_node]
+        state_np_corejob = self.cluster.workernode_dict[_node]
         state = state_np_corejob["state"]
         np = state_np_corejob["np"]
         corejobs = state_np_corejob.get("core_job_map", dict())
-        non_existent_node_symbol = config["non_existent_node_symbol"]
-        gray_hash = utils.ColorStr(non_existent_node_symbol, color="Gray_D")
-        gray_underscore = utils.ColorStr("_", color="Gray_D")
+        non_existent_node_symbol = self.config["non_existent_node_symbol"]
+        job_keys = frozenset(str(job).partition("[")[0] for job in set(corejobs.values()))
 
+        palette = self.cell_palette
+        column = palette.new_column(len(_core_span), non_existent_node_symbol, "Gray_D")
         if state == "?":  # for non-existent machines
-            for core_line in core_user_map:
-                core_user_map[core_line].append(gray_hash)
-        else:
-            node_cores = [str(x) for x in range(int(np))]
-            core_user_map, node_free_cores = self.color_cores_and_return_unused(node_cores, core_user_map, corejobs, core_coloring, jobid_to_user_to_queue)
-            for core in node_free_cores:
-                core_user_map["Core" + str(core) + "vector"].append(gray_underscore)
+            return NodeColumn(column[0], column[1], frozenset(), job_keys)
 
-            non_existent_node_cores = [core for core in _core_span if core not in node_cores]
-            for core in non_existent_node_cores:
-                core_user_map["Core" + str(core) + "vector"].append(gray_hash)
+        column, node_free_cores, node_users = self.color_cores_and_return_unused(range(int(np)), column, corejobs, jobs)
+        for core in node_free_cores:
+            palette.set_cell(column, core, "_", "Gray_D")
 
-        return core_user_map
+        return NodeColumn(column[0], column[1], frozenset(node_users), job_keys)
 
     @staticmethod
     def get_hl_q_or_users(_highlighted_queues_or_users):
@@ -1313,58 +1732,52 @@ class WNOccupancy(object):
             for user_queue in users_queues:
                 yield user_queue, type, and_or_func
 
-    def color_cores_and_return_unused(self, node_cores, core_user_map, corejobs, _core_coloring, jobid_to_user_to_queue):
-        """
-        Adds color information to the core job, returns free cores.
-        locals()[queue_or_user] transforms either 'user'=> user or 'queue'=> queue
-        depending on qtopconf yaml's "core_coloring",
-        or on runtime in watch mode, if user presses appropriate keybinding
-        """
-        node_free_cores = node_cores[:]
-        queue_or_user_map = {"user_to_color": "user_pat", "queue_to_color": "queue"}
-        queue_or_user_str = queue_or_user_map[_core_coloring]
-
-        selected_pat_to_color_map = globals()[_core_coloring]
-        _highlighted_queues_or_users = dynamic_config.get("highlight", self.config["highlight"])
-
-        self.id_to_user = dict(zip((str(x) for x in self.user_to_id.values()), self.user_to_id.keys()))
-        for user, core, queue in self._valid_corejobs(corejobs, jobid_to_user_to_queue):
-            id_ = utils.ColorStr.from_other_color_str(self.user_to_id[user])
-            user_pat = self.userid_to_userid_re_pat[str(id_)]  # in case it is used in viewed_pattern
-            viewed_pattern = locals()[queue_or_user_str]  # either a queue or userid pattern
-            matches = []
-            and_or_func = any
-
-            for user_queue_to_highlight, type, and_or_func in WNOccupancy.get_hl_q_or_users(_highlighted_queues_or_users):
-                if type == "user_pat":
-                    actual_user_queue = user
-                elif type == "user_id":
-                    actual_user_queue = user
-                    user_queue_to_highlight = self.id_to_user[user_queue_to_highlight]
-                elif type == "queue":
-                    actual_user_queue = queue
-
-                matches.append(re.match(user_queue_to_highlight, actual_user_queue))
-
-            if not _highlighted_queues_or_users or and_or_func(match.group(0) if match is not None else None for match in matches):
-                id_.color = selected_pat_to_color_map.get(viewed_pattern, "White")  # queue or user decided on runtime
-            else:
-                id_.color = "Gray_D"
+    def color_cores_and_return_unused(self, node_cores, column, corejobs, jobs):
+        """
+        Puts the core jobs in the node's column (see CellPalette.new_column).
+        The cell of a job only depends on its user and queue, so the codes are looked up in core_cell_codes,
+        which is filled in as new (user, queue) pairs show up.
+        Returns the column, the free cores and the ids of the users running on the node.
+        """
+        symbols, colors = column
+        core_cell_codes = self.core_cell_codes
+        node_free_cores = set(node_cores)
+        node_users = set()
+        for user_id, core, queue_id in self._valid_corejobs(corejobs, jobs):
+            try:
+                symbol_code, color_code = core_cell_codes[(user_id, queue_id)]
+            except KeyError:
+                symbol_code, color_code = core_cell_codes[(user_id, queue_id)] = self._get_core_cell_codes(jobs.users[user_id], jobs.queues[queue_id])
 
-            id_.q = queue
-            core_user_map["Core" + str(core) + "vector"].append(id_)
-            node_free_cores.remove(core)  # this is an assigned core, hence it doesn't belong to the node's free cores
+            core = int(core)
+            symbols[core], colors[core] = symbol_code, color_code
+            node_users.add(user_id)
+            node_free_cores.discard(core)  # this is an assigned core, hence it doesn't belong to the node's free cores
 
-        return core_user_map, node_free_cores
+        return column, node_free_cores, node_users
 
-    def _valid_corejobs(self, corejobs, jobid_to_user_to_queue):
+    def _get_core_cell_codes(self, user, queue):
         """
-        Generator that yields only those core-job pairs that successfully match to a user
+        The user id, colored after either the user pattern or the queue, depending on qtopconf yaml's "core_coloring",
+        or on runtime in watch mode, if user presses appropriate keybinding. Grayed out if highlighting leaves it out.
+        """
+        id_ = str(self.user_to_id[user])
+        user_pat = self.userid_to_userid_re_pat[id_]
+        viewed_pattern = user_pat if self.core_coloring == "user_to_color" else queue
+        if self.highlight_matcher.is_highlighted(user, queue):
+            color = self.core_pattern_to_color.get(viewed_pattern, "White")
+        else:
+            color = "Gray_D"
+        return self.cell_palette.symbol_code(id_), self.cell_palette.color_code(color)
+
+    def _valid_corejobs(self, corejobs, jobs):
+        """
+        Generator that yields the (user id, core, queue id) of those core-job pairs that successfully match to a user
         """
         for core, _job in corejobs.items():
             job = re.sub(r"\[\d+\]", "[]", str(_job))  # also takes care of job arrays
             try:
-                user_queue = jobid_to_user_to_queue[job]
+                user_queue = jobs.user_queue_ids(job)
             except KeyError as KeyErrorValue:
                 logging.warning("There seems to be a problem with the qstat output. A Job (ID %s) has gone rogue. Please check with the SysAdmin." % (str(KeyErrorValue)))
                 continue
@@ -1377,71 +1790,165 @@ class WNOccupancy(object):
         # print_char_stop = self.print_char_stop
         non_existent_symbol = self.config["non_existent_node_symbol"]
         lines = 0
-        core_user_map = self.core_user_map
+        core_grid = self.core_grid
         remove_corelines = dynamic_config.get("rem_empty_corelines", config["rem_empty_corelines"]) + 1
 
-        for core_x_vector, ind, k, is_corevector_removable in gauge_core_vectors(
-            core_user_map, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
+        for ind, is_corevector_removable in gauge_core_vectors(
+            core_grid, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
         ):
             if is_corevector_removable:
                 lines += 1
-        return lines == len(core_user_map)
+        return lines == core_grid.core_count
 
     def strict_check_jobs(self, cluster):
-        counted_jobs = WNOccupancy._count_jobs_strict(self.core_user_map)
+        counted_jobs = WNOccupancy._count_jobs_strict(self.core_grid, self.config["non_existent_node_symbol"])
         if counted_jobs != cluster.total_running_jobs:
             print("Counted jobs (%s) -- Total running jobs reported (%s) MISMATCH!" % (counted_jobs, cluster.total_running_jobs))
 
     @staticmethod
-    def _count_jobs_strict(core_user_map):
-        count = 0
-        for k in core_user_map:
-            just_jobs = core_user_map[k].translate(None, "#_")
-            count += len(just_jobs)
-        return count
+    def _count_jobs_strict(core_grid, non_existent_symbol):
+        return core_grid.count_cells_except([non_existent_symbol, "_"])
 
-    def calculate_user_node_use(self, cluster, jobid_to_user_to_queue, job_ids, user_names, job_queues):
+    def calculate_user_node_use(self, cluster, jobs):
         """
-        This calculates the number of nodes each user has jobs in (shown in User accounts and pool mappings)
+        This calculates the number of nodes each user has jobs in (shown in User accounts and pool mappings), by user id.
+        When patching, the user sets of nodes that aren't dirty are carried over, and the previous counts
+        are corrected only for the dirty and the removed nodes.
         """
-        user_machines = []
-        jobid_to_user_to_queue = dict(zip(job_ids, zip(user_names, job_queues)))
-        # TODO why use variables from outer scope above?
+        previous_user_sets = self.previous.node_user_sets if self.previous is not None else dict()
+        node_user_sets = dict()
         for node in cluster.workernode_dict.keys():
-            cluster.workernode_dict[node]["node_user_set"] = set(
-                [jobid_to_user_to_queue[job][0] for job in cluster.workernode_dict[node]["node_job_set"] if jobid_to_user_to_queue.get(job)]
-            )
-            user_machines.extend(list(cluster.workernode_dict[node]["node_user_set"]))
-
-        return Counter(user_machines)
+            node_attrs = cluster.workernode_dict[node]
+            domainname = node_attrs["domainname"]
+            if domainname in previous_user_sets and domainname not in self.dirty_nodes:
+                node_user_set = previous_user_sets[domainname]
+            else:
+                node_user_set = jobs.user_ids_of(node_attrs["node_job_set"])
+            node_attrs["node_user_set"] = node_user_sets[domainname] = node_user_set
+        self.node_user_sets = node_user_sets
+
+        if self.previous is None:
+            user_machines = Counter()
+            for node_user_set in node_user_sets.values():
+                user_machines.update(node_user_set)
+            return user_machines
+
+        user_machines = self.previous.user_node_counts.copy()
+        for domainname in self.dirty_nodes.union(set(previous_user_sets).difference(node_user_sets)):
+            user_machines.subtract(previous_user_sets.get(domainname, ()))
+            user_machines.update(node_user_sets.get(domainname, ()))
+        return +user_machines
 
     @staticmethod
-    def coreline_not_there(symbol, switch, delta, core_x_str):
+    def coreline_not_there(switch, length, not_there):
         """
-        Checks if a line consists of only not-really-there cores, i.e. core 32 on a line of 24-core machines
+        Checks if a line of length cores consists of only not-really-there cores, i.e. core 32 on a line of 24-core machines
         (being there because there are other machines with 32 cores on an adjacent matrix)
         """
-        return switch == 2 and ((symbol * delta == core_x_str) or (symbol * len(core_x_str) == core_x_str))
+        return switch == 2 and not_there == length
 
     @staticmethod
-    def coreline_unused(symbol, switch, print_length, core_x_str):
+    def coreline_unused(switch, print_length, length, not_there_or_unused):
         """
-        Checks if a line consists of either not-really-there cores or unused cores
+        Checks if a line of length cores, as long as the matrix printed, consists of either not-really-there cores or unused cores
         """
-        all_symbols_in_line = set(core_x_str)
-        unused_symbols = set(["_", symbol])
-        only_unused_symbols_in_line = all_symbols_in_line.issubset(unused_symbols)
-        return switch == 3 and only_unused_symbols_in_line and (print_length == len(core_x_str))
+        return switch == 3 and not_there_or_unused == length and print_length == length
 
     @staticmethod
-    def coreline_notthere_or_unused(symbol, switch, delta, core_x_str):
-        return WNOccupancy.coreline_not_there(symbol, switch, delta, core_x_str) or WNOccupancy.coreline_unused(symbol, switch, delta, core_x_str)
+    def coreline_notthere_or_unused(switch, delta, length, not_there, not_there_or_unused):
+        return WNOccupancy.coreline_not_there(switch, length, not_there) or WNOccupancy.coreline_unused(switch, delta, length, not_there_or_unused)
+
+
+def mapping_to_json(obj):
+    """json.dump default: read-only mappings, such as the core_job_map views of the Slurm plugin, are saved as dicts"""
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    raise TypeError("Object of type %s is not JSON serializable" % obj.__class__.__name__)
+
+
+QDoc = namedtuple("QDoc", ["lm", "queued", "run", "state"])
 
 
 class Document(namedtuple("Document", ["worker_nodes", "jobs_dict", "queues_dict", "total_running_jobs", "total_queued_jobs"])):
     def save(self, filename):
         with open(filename, "w") as outfile:
-            json.dump(document, outfile)
+            json.dump(self, outfile, default=mapping_to_json)
+
+    @classmethod
+    def from_json(cls, payload, symbols=None):
+        """Rebuilds a Document out of the list it was saved as, interning its jobs in symbols if given"""
+        worker_nodes, jobs, queues, total_running_jobs, total_queued_jobs = payload
+        jobs_dict = JobTable.from_mapping(jobs, symbols)
+        queues_dict = OrderedDict((queue_name, QDoc(*values)) for queue_name, values in queues.items())
+        return cls(worker_nodes, jobs_dict, queues_dict, total_running_jobs, total_queued_jobs)
+
+
+def publish_snapshot(filepath, scheduler, job_ids, document):
+    """
+    Writes the parsed scheduler output to filepath (--collect), for qtop --attach instances to display.
+    The file is replaced atomically and made readable by everyone, so that viewers never read half of it.
+    JSON is used rather than pickle, as viewers may be other users, who shouldn't have to trust the file.
+    """
+    dirname = os.path.dirname(filepath)
+    fileutils.mkdir_p(dirname)
+    snapshot = {"version": __version__, "generated": time.time(), "scheduler": scheduler, "job_ids": list(job_ids), "document": document}
+    with tempfile.NamedTemporaryFile("w", dir=dirname, prefix=".qtop_collector_", suffix=".json", delete=False) as fout:
+        json.dump(snapshot, fout, default=mapping_to_json)
+    os.chmod(fout.name, 0o644)
+    os.rename(fout.name, filepath)
+    logging.debug("Snapshot of %s jobs published in %s" % (len(document.jobs_dict), filepath))
+
+
+def load_published_snapshot(filepath, symbols=None):
+    """Returns scheduler, job_ids, document out of a file written by publish_snapshot"""
+    try:
+        with open(filepath) as fin:
+            snapshot = json.load(fin)
+    except (IOError, OSError):
+        raise fileutils.FileNotFound(filepath)
+    return snapshot["scheduler"], snapshot["job_ids"], Document.from_json(snapshot["document"], symbols)
+
+
+class DocumentDiff(object):
+    """
+    What changed between two consecutive Document snapshots:
+    worker nodes are matched by domainname, jobs by job id and queues by queue name,
+    each of them ending up in one of the added_*, removed_* or changed_* sets.
+    If a domainname shows up more than once in a snapshot, worker nodes can't be matched
+    and nodes_comparable is False.
+    """
+
+    def __init__(self, old_document, new_document):
+        old_nodes = self.index_worker_nodes(old_document.worker_nodes)
+        new_nodes = self.index_worker_nodes(new_document.worker_nodes)
+        self.nodes_comparable = len(old_nodes) == len(old_document.worker_nodes) and len(new_nodes) == len(new_document.worker_nodes)
+
+        self.added_nodes, self.removed_nodes, self.changed_nodes = self._diff_mappings(old_nodes, new_nodes)
+        self.added_jobs, self.removed_jobs, self.changed_jobs = self._diff_jobs(old_document.jobs_dict, new_document.jobs_dict)
+        self.added_queues, self.removed_queues, self.changed_queues = self._diff_mappings(old_document.queues_dict, new_document.queues_dict)
+
+    @staticmethod
+    def index_worker_nodes(worker_nodes):
+        return dict((worker_node["domainname"], worker_node) for worker_node in worker_nodes)
+
+    @classmethod
+    def _diff_jobs(cls, old, new):
+        if isinstance(old, JobTable) and isinstance(new, JobTable):
+            return new.diff(old)
+        return cls._diff_mappings(old, new)
+
+    @staticmethod
+    def _diff_mappings(old, new):
+        added = set(new).difference(old)
+        removed = set(old).difference(new)
+        changed = set(key for key in new if key in old and new[key] != old[key])
+        return added, removed, changed
+
+    def touched_jobs(self):
+        return self.added_jobs | self.removed_jobs | self.changed_jobs
+
+    def touched_nodes(self):
+        return self.added_nodes | self.removed_nodes | self.changed_nodes
 
 
 # class Document(object):
@@ -1472,6 +1979,7 @@ class TextDisplay(object):
         self.config = config
         self.wns_occupancy = wns_occupancy
         self.args = args
+        self.cell_escapes = CellEscapes(color_escapes, user_to_color.get("NoPattern"), args.COLOR == "ON")
 
     def display_selected_sections(self, _savepath, SAMPLE_FILENAME, QTOP_LOGFILE):
         """
@@ -1493,9 +2001,6 @@ class TextDisplay(object):
             "user_accounts_pool_mappings": (self.display_user_accounts_pool_mappings, (self.wns_occupancy,)),
         }
 
-        if self.args.WATCH:
-            print("\033c", end=" ")  # comma is to avoid losing the whole first line. An empty char still remains, though.
-
         for idx, part in enumerate(config["user_display_parts"], 1):
             display_func, opts = display_parts[part][0], display_parts[part][1]
             display_func(*opts) if not sections_off[idx] else None
@@ -1677,7 +2182,7 @@ class TextDisplay(object):
             return
 
         wn_vert_labels = wns_occupancy.wn_vert_labels
-        core_user_map = wns_occupancy.core_user_map
+        core_grid = wns_occupancy.core_grid
         userid_to_userid_re_pat = wns_occupancy.userid_to_userid_re_pat
         mapping = config["core_coloring"]
 
@@ -1685,7 +2190,7 @@ class TextDisplay(object):
             "wn id lines": (self.display_wnid_lines, (print_char_start, print_char_stop, cluster.highest_wn, wn_vert_labels), {"inner_attrs": None}),
             "core_user_map": (
                 self.print_core_lines,
-                (core_user_map, print_char_start, print_char_stop, transposed_matrices, userid_to_userid_re_pat, mapping),
+                (core_grid, print_char_start, print_char_stop, transposed_matrices, userid_to_userid_re_pat, mapping),
                 {"attrs": None},
             ),
         }
@@ -1771,41 +2276,40 @@ class TextDisplay(object):
             joined_list.extend([utils.ColorStr(string=char) if isinstance(char, str) and len(char) == 1 else char for char in d])
             joined_list.append(utils.ColorStr(string=kwargs["sep"]))
         # display the full output if nocutoff is True
-        if kwargs.get("nocutoff", False):
-            s = "".join([colorize(char.initial, color_func=char.color) if isinstance(char, utils.ColorStr) else char for char in joined_list])
-        else:
-            s = "".join(
-                [colorize(char.initial, color_func=char.color) if isinstance(char, utils.ColorStr) else char for char in joined_list[self.viewport.h_start : self.viewport.h_stop]]
-            )
-        print(compress_colored_line(s))
+        escapes = self.cell_escapes
+        shown_list = joined_list if kwargs.get("nocutoff", False) else joined_list[self.viewport.h_start : self.viewport.h_stop]
+        print(join_runs([(char.initial, escapes[char.color]) if isinstance(char, utils.ColorStr) else (char, "") for char in shown_list]))
         return joined_list
 
-    def print_core_lines(self, core_user_map, print_char_start, print_char_stop, transposed_matrices, userid_to_userid_re_pat, mapping, attrs, options1, options2):
+    def print_core_lines(self, core_grid, print_char_start, print_char_stop, transposed_matrices, userid_to_userid_re_pat, mapping, attrs, options1, options2):
         reset_sigpipe()
         remove_corelines = dynamic_config.get("rem_empty_corelines", config["rem_empty_corelines"]) + 1
 
         # if corelines vertical (transposed matrix)
         if dynamic_config.get("transpose_wn_matrices", config["transpose_wn_matrices"]):
+            # the grid is read node by node, which is already the transposed layout
             non_existent_symbol = config["non_existent_node_symbol"]
-            for core_x_vector, ind, k, is_corevector_removable in gauge_core_vectors(
-                core_user_map, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
-            ):
-                if is_corevector_removable:
-                    del core_user_map[k]
+            visible_cores = [
+                ind
+                for ind, is_corevector_removable in gauge_core_vectors(
+                    core_grid, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
+                )
+                if not is_corevector_removable
+            ]
+            node_rows = (core_grid.get_node_cells(node, visible_cores) for node in range(core_grid.node_count if visible_cores else 0))
 
-            tuple_ = [None, "core_map", self.transpose_matrix(core_user_map, colored=False, coloring_pat=userid_to_userid_re_pat)]
+            tuple_ = [None, "core_map", node_rows]
             transposed_matrices.append(tuple_)
             return
         else:
             # if corelines horizontal (non-transposed matrix)
-            for core_line in self.get_core_lines(core_user_map, print_char_start, print_char_stop, userid_to_userid_re_pat, mapping, attrs):
-                core_line_zipped = compress_colored_line(core_line)
+            for core_line in self.get_core_lines(core_grid, print_char_start, print_char_stop, userid_to_userid_re_pat, mapping, attrs):
                 try:
-                    print(core_line_zipped)
+                    print(core_line)
                 except IOError:
                     try:
                         reset_sigpipe()
-                        print(core_line_zipped)
+                        print(core_line)
                         sys.stdout.close()
                     except IOError:
                         pass
@@ -1860,28 +2364,20 @@ class TextDisplay(object):
             return
 
         separators = config["vertical_separator_every_X_columns"]
+        escapes = self.cell_escapes
         for line_nr, end_label in zip(d, end_labels):
             colors = color_func(*args)
             wn_id_str = self._insert_separators(d[line_nr][start:stop], config["SEPARATOR"], separators)
-            wn_id_str = "".join([colorize(elem, next(colors)) for elem in wn_id_str])
+            wn_id_str = join_runs([(elem, escapes[next(colors)]) for elem in wn_id_str])
             print(wn_id_str + end_label)
 
-    def show_part_view(self, _timestr, file, x, y):
+    def record_part_view(self, _timestr, part_view):
         """
-        Prints part of the qtop output to the terminal (as fast as possible!)
-        Justification for implementation:
-        http://unix.stackexchange.com/questions/47407/cat-line-x-to-line-y-on-a-huge-file
+        Saves the part of the qtop output shown on the terminal in savepath, where qtop -R picks the frames to replay from.
         """
-        temp_f = tempfile.NamedTemporaryFile(delete=False, suffix=".out", prefix="qtop_partview_%s_" % _timestr, dir=config["savepath"])
-        tail_command = ["tail", "-n+" + str(x), file]
-        head_command = ["head", "-n" + str(y - 1)]
-        f = open(temp_f.name, "w")
-        process_tail = subprocess.Popen(tail_command, stdout=subprocess.PIPE)
-        process_head = subprocess.Popen(head_command, stdin=process_tail.stdout, stdout=f)
-        process_tail.stdout.close()
-        _ = process_head.communicate()
-        f.close()
-        return temp_f.name
+        with tempfile.NamedTemporaryFile("w", delete=False, suffix=".out", prefix="qtop_partview_%s_" % _timestr, dir=config["savepath"]) as fout:
+            fout.write(part_view)
+        return fout.name
 
     def print_mult_attr_line(self, print_char_start, print_char_stop, transposed_matrices, attr_lines, label, color_func=None, **kwargs):
         """
@@ -1897,26 +2393,28 @@ class TextDisplay(object):
             line = attr_lines[_line][print_char_start:print_char_stop]
             # TODO: maybe put attr_line and label as kwd arguments? collect them as **kwargs
             attr_line = self._insert_separators(line, config["SEPARATOR"], config["vertical_separator_every_X_columns"])
-            attr_line = "".join([colorize(char.initial, color_func=char.color) for char in attr_line])
+            attr_line = join_runs([(char.initial, self.cell_escapes[char.color]) for char in attr_line])
             print(attr_line + "=" + label)
 
-    def get_core_lines(self, core_user_map, print_char_start, print_char_stop, coloring_pattern, mapping, attrs):
+    def get_core_lines(self, core_grid, print_char_start, print_char_stop, coloring_pattern, mapping, attrs):
         """
         yields all coreX lines, except cores that don't show up
-        anywhere in the given matrix
+        anywhere in the given matrix, each one colored run by run (see join_runs)
         """
+        escapes = self.cell_escapes
         non_existent_symbol = config["non_existent_node_symbol"]
         remove_corelines = dynamic_config.get("rem_empty_corelines", config["rem_empty_corelines"]) + 1
-        for core_x_vector, ind, k, is_corevector_removable in gauge_core_vectors(
-            core_user_map, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
+        for ind, is_corevector_removable in gauge_core_vectors(
+            core_grid, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, non_existent_symbol, remove_corelines
         ):
             if is_corevector_removable:
                 continue
 
+            core_x_vector = core_grid.get_line_cells(ind, print_char_start, print_char_stop)
             core_x_vector = self._insert_separators(core_x_vector, config["SEPARATOR"], config["vertical_separator_every_X_columns"])
-            colored_core_x = [colorize(elem, color_func=elem.color) for elem in core_x_vector]
-            core_x_vector = "".join([str(item) for item in colored_core_x])
-            yield core_x_vector + colorize("=Core" + str(ind), pattern="account_not_colored")
+            cells = [(elem.str, escapes[elem.color]) for elem in core_x_vector]
+            cells.append(("=Core" + str(ind), ""))  # the label is left uncolored, as colorize leaves account_not_colored
+            yield join_runs(cells)
 
     def transpose_matrix(self, d, colored=False, reverse=False, coloring_pat=None):
         """
@@ -2232,14 +2730,12 @@ def colorize(text, color_func=None, pattern="NoPattern", mapping=None, bg_color=
     if not mapping:
         mapping = user_to_color
     try:
-        ansi_color = color_to_code[color_func] if color_func else color_to_code[mapping[pattern]]
+        escape = color_escapes.get(color_func if color_func else mapping[pattern], bg_color, bold)
     except KeyError:
         return text
     else:
-        if bold and ansi_color[0] in "01":
-            ansi_color = "1" + ansi_color[1:]
         if args.COLOR == "ON" and pattern != "account_not_colored":
-            text = "\033[%(fg_color)s%(bg_color)sm%(text)s\033[0;m" % {"fg_color": ansi_color, "bg_color": color_to_code[bg_color], "text": text}
+            text = escape + str(text) + RESET
 
         return text
 
@@ -2388,6 +2884,209 @@ class InvalidScheduler(Exception):
     pass
 
 
+class UntrustedSnapshotDir(Exception):
+    def __init__(self, snapshot_dir, reason):
+        Exception.__init__(self, "%s is %s" % (snapshot_dir, reason))
+        self.snapshot_dir = snapshot_dir
+
+
+class RefreshEngine(object):
+    """
+    Keeps qtop's state alive across --watch refreshes.
+    The merged configuration, colour maps and account patterns are only rebuilt when a configuration file changes on disk.
+    The Document, Cluster and WNOccupancy are only rebuilt when the scheduler output, the configuration,
+    the runtime (keypress) options or the terminal size change; otherwise the previous ones are displayed again.
+    Key presses don't gather data: update_context tells whether the current Document has to be analysed again.
+    """
+
+    def __init__(self, args, available_batch_systems):
+        self.args = args
+        self.available_batch_systems = available_batch_systems
+        self.config = None
+        self.user_to_color = None
+        self.nodestate_to_color = None
+        self.account_matcher = None
+        self.document = None
+        self.cluster = None
+        self.wns_occupancy = None
+        self.job_ids = None
+        self.symbols = Symbols()
+        self.scheduler = None
+        self.context = None
+        self.diff = None
+        self.model_changed = False
+        self._config_fingerprint = None
+        self._input_fingerprints = dict()
+        self._model_key = None
+
+    def get_config_filepaths(self):
+        filepaths = [os.path.join(realpath(QTOPPATH), QTOPCONF_YAML), os.path.join(SYSTEMCONFDIR, QTOPCONF_YAML), os.path.join(USERPATH, QTOPCONF_YAML)]
+        if self.args.CONFFILE:
+            filepaths.extend([os.path.join(USERPATH, self.args.CONFFILE), os.path.join(CURPATH, self.args.CONFFILE)])
+        return filepaths
+
+    def load_config(self):
+        """
+        Returns config, user_to_color, nodestate_to_color, re-reading the conf files only if any of them changed.
+        The cmdline overrides are applied once per load, as update_config_with_cmdline_vars is not idempotent.
+        """
+        config_fingerprint = tuple(fileutils.get_stat_fingerprint(filepath) for filepath in self.get_config_filepaths())
+        if config_fingerprint != self._config_fingerprint:
+            config, self.user_to_color, self.nodestate_to_color = load_yaml_config()
+            self.config = update_config_with_cmdline_vars(self.args, config)
+            self.account_matcher = AccountPatternMatcher(self.user_to_color)
+            self._config_fingerprint = config_fingerprint
+            self._model_key = None
+            logging.info("Configuration (re)loaded.")
+        return self.config, self.user_to_color, self.nodestate_to_color
+
+    def get_model_key(self, scheduler, scheduler_output_filenames, viewport):
+        """
+        Everything the cluster model depends on, apart from the configuration, as a (context, scheduler output digests) pair.
+        Returns None for batch systems whose output doesn't come from the scheduler output files (e.g. demo),
+        meaning that the model has to be rebuilt on every refresh.
+        """
+        if not self.available_batch_systems[scheduler].snapshot_from_output_files:
+            return None
+
+        return self._get_context(scheduler, viewport), self._get_digests(scheduler_output_filenames)
+
+    def _get_digests(self, filenames):
+        input_fingerprints = dict()
+        for name, filepath in sorted(filenames.items()):
+            input_fingerprints[filepath] = fileutils.get_content_fingerprint(filepath, self._input_fingerprints.get(filepath))
+        self._input_fingerprints = input_fingerprints
+        return tuple((name, input_fingerprints[filepath][1]) for name, filepath in sorted(filenames.items()))
+
+    @staticmethod
+    def _get_context(scheduler, viewport):
+        runtime_options = tuple(sorted((key, repr(value)) for key, value in dynamic_config.items() if key != "output_fp"))
+        return scheduler, runtime_options, viewport.get_term_size()
+
+    def refresh(self, scheduler, scheduler_output_filenames, viewport):
+        """
+        Returns the Document to be displayed in this refresh, parsing the scheduler output only if needed.
+        model_changed tells whether the document was rebuilt or carried over from the previous refresh.
+        If only the scheduler output changed, diff holds the DocumentDiff against the previous document,
+        so that analyse can patch the previous results instead of starting over.
+        """
+        self.scheduler, self.context = scheduler, self._get_context(scheduler, viewport)
+        model_key = self.get_model_key(scheduler, scheduler_output_filenames, viewport)
+        if model_key is not None and model_key == self._model_key:
+            logging.debug("Scheduler output and options unchanged since the last refresh, reusing previous results.")
+            self.model_changed = False
+            return self.document
+
+        scheduling_system = self.available_batch_systems[scheduler](scheduler_output_filenames, self.config, self.args)
+
+        jobs = scheduling_system.get_job_table(self.symbols)
+        total_running_jobs, total_queued_jobs, qstatq_lod = scheduling_system.get_queues_info()
+        worker_nodes = self.symbols.intern_worker_nodes(scheduling_system.get_worker_nodes(jobs.job_ids, jobs.job_queues(), self.args))
+
+        queues_dict = OrderedDict((qstatq["queue_name"], (QDoc(str(qstatq["lm"]), qstatq["queued"], qstatq["run"], qstatq["state"]))) for qstatq in qstatq_lod)
+
+        document = Document(worker_nodes, jobs, queues_dict, total_running_jobs, total_queued_jobs)
+        return self._set_document(document, jobs.job_ids, model_key)
+
+    def attach(self, collector_file, viewport):
+        """
+        Same as refresh, for qtop --attach: the Document comes ready-made from the file published by qtop --collect,
+        so no batch commands are run and no scheduler output is parsed. Returns scheduler, document.
+        """
+        digests = self._get_digests({"collector_file": collector_file})
+        if digests[0][1] is None:
+            raise fileutils.FileNotFound(collector_file)
+        if self.scheduler is not None:
+            self.context = self._get_context(self.scheduler, viewport)
+            model_key = self.context, digests
+            if model_key == self._model_key:
+                logging.debug("Published snapshot and options unchanged since the last refresh, reusing previous results.")
+                self.model_changed = False
+                return self.scheduler, self.document
+
+        self.scheduler, job_ids, document = load_published_snapshot(collector_file, self.symbols)
+        self.symbols.intern_worker_nodes(document.worker_nodes)
+        self.context = self._get_context(self.scheduler, viewport)
+        model_key = self.context, digests
+        return self.scheduler, self._set_document(document, job_ids, model_key)
+
+    def update_context(self, viewport):
+        """
+        Called after a key press, which doesn't gather data: returns whether the runtime (keypress) options or the terminal size
+        changed since the current document was analysed, in which case analyse will build the Cluster and WNOccupancy again out of it.
+        The next refresh then only reparses the scheduler output if that changed.
+        """
+        context = self._get_context(self.scheduler, viewport)
+        if context == self.context:
+            return False
+        self.context = context
+        if self._model_key is not None:
+            self._model_key = context, self._model_key[1]
+        self.model_changed = True
+        self.diff = None
+        return True
+
+    def _set_document(self, document, job_ids, model_key):
+        previous_document = self.document
+        self.document = document
+        self.job_ids = job_ids
+        self.model_changed = True
+
+        self.diff = None
+        if model_key is not None and self._model_key is not None and model_key[0] == self._model_key[0] and self.wns_occupancy is not None:
+            diff = DocumentDiff(previous_document, self.document)
+            self.diff = diff if diff.nodes_comparable else None
+        self._model_key = model_key
+        return self.document
+
+    def analyse(self):
+        """
+        Colorizes the worker nodes of a freshly built document and calculates the Cluster and WNOccupancy out of it.
+        The WNOccupancy is patched from the previous one if refresh came up with a diff.
+        """
+        global cluster
+
+        if self.model_changed:
+            worker_nodes = keep_queue_initials_only_and_colorize(self.document.worker_nodes, queue_to_color)
+            worker_nodes = colorize_nodestate(worker_nodes, self.nodestate_to_color, colorize)
+            cluster = self.cluster = Cluster(self.document, worker_nodes, WNFilter, self.config, self.args)
+            previous = self.wns_occupancy if self.diff is not None else None
+            if previous is not None:
+                logging.debug("Patching previous results: %s nodes and %s jobs added, removed or changed." % (len(self.diff.touched_nodes()), len(self.diff.touched_jobs())))
+            self.wns_occupancy = WNOccupancy(
+                cluster, self.config, self.document, self.user_to_color, self.job_ids, account_matcher=self.account_matcher, previous=previous, diff=self.diff
+            )
+        else:
+            cluster = self.cluster
+        return self.cluster, self.wns_occupancy
+
+
+def get_collector_file(path, config):
+    """The file qtop --collect publishes to and qtop --attach reads from: path if given in the cmdline, else collector_file of QTOPCONF_YAML"""
+    return os.path.join(CURPATH, os.path.expandvars(os.path.expanduser(path or config["collector_file"])))
+
+
+def collect(engine):
+    """
+    qtop --collect: queries the scheduler and publishes the parsed results for qtop --attach instances,
+    once, or every args.WATCH seconds. The results are only published again if they changed.
+    """
+    global scheduler, config
+
+    while True:
+        config, _, _ = engine.load_config()
+        init_dirs(args, config["savepath"])
+        scheduler = decide_batch_system(args.BATCH_SYSTEM, os.environ.get("QTOP_SCHEDULER"), config["scheduler"], config["schedulers"], engine.available_batch_systems, config)
+        scheduler_output_filenames = fetch_scheduler_files(args, config)
+        document = engine.refresh(scheduler, scheduler_output_filenames, viewport)
+        if engine.model_changed:
+            publish_snapshot(get_collector_file(args.COLLECT, config), scheduler, engine.job_ids, document)
+        fileutils.deprecate_old_output_files(config)
+        if not args.WATCH:
+            break
+        time.sleep(args.WATCH)
+
+
 def cli_error_message(error):
     if isinstance(error, SchedulerNotSpecified):
         return "No scheduler could be auto-detected. Select one with -b/--batchSystem, QTOP_SCHEDULER, or qtopconf.yaml."
@@ -2455,6 +3154,7 @@ def main():
     h_counter = cycle([0, 1])
 
     viewport = Viewport()  # controls the part of the qtop matrix shown on screen
+    screen = Screen()  # what is on the terminal in --watch mode, so that only the lines that change are repainted
     max_line_len = 0
 
     check_python_version()
@@ -2478,18 +3178,24 @@ def main():
     if args.WEB:
         web.start()
 
+    engine = RefreshEngine(args, available_batch_systems)  # keeps config and parsed results between refreshes
+    if args.COLLECT is not None:
+        try:
+            collect(engine)
+        except KeyboardInterrupt:
+            pass
+        return
+
     with raw_mode(sys.stdin):  # key listener implementation
         try:
             while True:
-                config, user_to_color, nodestate_to_color = load_yaml_config()  # TODO account_to_color is updated here !!
-                config = update_config_with_cmdline_vars(args, config)
+                config, user_to_color, nodestate_to_color = engine.load_config()
                 savepath = config["savepath"]
                 timestr = time.strftime("%Y%m%dT%H%M%S")
                 # qtop output is saved here
                 handle, output_fp = fileutils.get_new_temp_file(savepath, prefix="qtop_fullview_%s_" % timestr, suffix=".out")
                 help_main_switch.append(output_fp)
 
-                attempt_faster_xml_parsing(config)
                 args = init_dirs(args, savepath)
 
                 transposed_matrices = []
@@ -2497,35 +3203,27 @@ def main():
                     viewport.set_term_size(500, 9999)
                 else:
                     viewport.set_term_size(*calculate_term_size(config, FALLBACK_TERMSIZE, viewport))
-                sys.stdout = os.fdopen(handle, "w")  # redirect everything to file, creates file object out of handle
-                scheduler = decide_batch_system(args.BATCH_SYSTEM, os.environ.get("QTOP_SCHEDULER"), config["scheduler"], config["schedulers"], available_batch_systems, config)
-                scheduler_output_filenames = fetch_scheduler_files(args, config)
+                frame_buffer = io.StringIO()
+                sys.stdout = frame_buffer  # everything is rendered in memory, then saved to output_fp and shown at once
+                if args.ATTACH is not None:  # the scheduler is queried by a qtop --collect instance instead
+                    scheduler_output_filenames = dict()
+                else:
+                    scheduler = decide_batch_system(args.BATCH_SYSTEM, os.environ.get("QTOP_SCHEDULER"), config["scheduler"], config["schedulers"], available_batch_systems, config)
+                    scheduler_output_filenames = fetch_scheduler_files(args, config)
                 SAMPLE_FILENAME = fileutils.get_sample_filename(SAMPLE_FILENAME, config)
                 if args.SAMPLE:
                     fileutils.tar_out = fileutils.init_sample_file(args, savepath, SAMPLE_FILENAME, scheduler_output_filenames, QTOPCONF_YAML, QTOPPATH)
 
                 ###### Gather data ###############
                 #
-                scheduling_system = available_batch_systems[scheduler](scheduler_output_filenames, config, args)
-
-                job_ids, user_names, job_states, job_queues = scheduling_system.get_jobs_info()
-                total_running_jobs, total_queued_jobs, qstatq_lod = scheduling_system.get_queues_info()
-                worker_nodes = scheduling_system.get_worker_nodes(job_ids, job_queues, args)
-
-                JobDoc = namedtuple("JobDoc", ["user_name", "job_state", "job_queue"])
-                jobs_dict = dict(
-                    (re.sub(r"\[\]$", "", job_id), JobDoc(user_name, job_state, job_queue))
-                    for job_id, user_name, job_state, job_queue in zip(job_ids, user_names, job_states, job_queues)
-                )
-
-                QDoc = namedtuple("QDoc", ["lm", "queued", "run", "state"])
-                queues_dict = OrderedDict((qstatq["queue_name"], (QDoc(str(qstatq["lm"]), qstatq["queued"], qstatq["run"], qstatq["state"]))) for qstatq in qstatq_lod)
-
-                document = Document(worker_nodes, jobs_dict, queues_dict, total_running_jobs, total_queued_jobs)
+                if args.ATTACH is not None:
+                    scheduler, document = engine.attach(get_collector_file(args.ATTACH, config), viewport)
+                else:
+                    document = engine.refresh(scheduler, scheduler_output_filenames, viewport)
 
                 ###### Export data ###############
                 #
-                if args.EXPORT or args.WEB:
+                if (args.EXPORT or args.WEB) and engine.model_changed:
                     json_file = tempfile.NamedTemporaryFile(delete=False, prefix="qtop_json_%s_" % timestr, suffix=".json", dir=savepath)
                     document.save(json_file.name)
                 if args.WEB:
@@ -2533,45 +3231,63 @@ def main():
 
                 ###### Process data ###############
                 #
-                worker_nodes = keep_queue_initials_only_and_colorize(document.worker_nodes, queue_to_color)
-                worker_nodes = colorize_nodestate(document.worker_nodes, nodestate_to_color, colorize)
-                cluster = Cluster(document, worker_nodes, WNFilter, config, args)
-                wns_occupancy = WNOccupancy(cluster, config, document, user_to_color, job_ids)
+                cluster, wns_occupancy = engine.analyse()
 
                 ###### Display data ###############
                 #
                 display = TextDisplay(document, config, viewport, wns_occupancy, cluster, args)
-                display.display_selected_sections(savepath, SAMPLE_FILENAME, QTOP_LOGFILE)
-
-                sys.stdout.flush()
-                sys.stdout.close()
-                sys.stdout = stdout  # sys.stdout is back to its normal function (i.e. prints to screen)
+                with os.fdopen(handle, "w") as fout:
+                    frame_text = render_frame(display, frame_buffer, stdout, fout)
+                frame = Frame.from_text(frame_text)
 
-                viewport.max_height, max_line_len = get_output_size(max_line_len, output_fp)
+                viewport.max_height, max_line_len = get_output_size(max_line_len, frame)
 
                 if args.ONLYSAVETOFILE:  # no display of qtop output, will exit
                     break
                 elif not args.WATCH:  # one-off display of qtop output, will exit afterwards (no --watch cmdline switch)
-                    cat_command = ["/bin/cat", output_fp]  # not clearing the screen beforehand is the intended behaviour here
-                    _ = subprocess.call(cat_command, stdout=stdout, stderr=stdout)
+                    write_frame(stdout, frame_text)  # not clearing the screen beforehand is the intended behaviour here
                     break
                 else:  # --watch
                     if args.REPLAY:
                         try:
-                            output_partview_fp = next(useful_frames)
+                            with open(next(useful_frames)) as fin:
+                                write_frame(stdout, fin.read(), clear_screen=True)
                         except StopIteration:
                             logging.critical("No (more) recorded instances available to show! Exiting...")
                             break
+                        read_char = wait_for_keypress_or_autorefresh(viewport, FALLBACK_TERMSIZE, int(args.WATCH) or KEYPRESS_TIMEOUT)
+                        control_qtop(viewport, read_char, cluster, old_attrs, new_attrs)
                     else:
-                        output_partview_fp = display.show_part_view(timestr, file=dynamic_config.get("output_fp", output_fp), x=viewport.v_start, y=viewport.v_term_size)
-                        logging.debug("dynamic_config filename in main loop: %s" % dynamic_config.get("output_fp", output_fp))
-                    clear_command = ["/usr/bin/clear"]
-                    cat_command = ["/bin/cat", output_partview_fp]
-                    _ = subprocess.call(clear_command, stdout=stdout, stderr=stdout)
-                    _ = subprocess.call(cat_command, stdout=stdout, stderr=stdout)
-
-                    read_char = wait_for_keypress_or_autorefresh(viewport, FALLBACK_TERMSIZE, int(args.WATCH) or KEYPRESS_TIMEOUT)
-                    control_qtop(viewport, read_char, cluster, old_attrs, new_attrs)
+                        # key presses are served out of the frame and model of this refresh; only the timer (or <Enter>) gathers data again
+                        refresh_at = time.time() + (int(args.WATCH) or KEYPRESS_TIMEOUT)
+                        while True:
+                            shown_frame = Frame.from_file(dynamic_config["output_fp"]) if "output_fp" in dynamic_config else frame
+                            part_view = viewport.get_view(shown_frame)
+                            display.record_part_view(time.strftime("%Y%m%dT%H%M%S"), part_view.get_text())
+                            logging.debug("dynamic_config filename in main loop: %s" % dynamic_config.get("output_fp", output_fp))
+                            repainted = screen.paint(stdout, part_view, viewport.get_term_size())
+                            logging.debug("Lines repainted: %s out of %s" % (repainted, part_view.height))
+
+                            read_char = wait_for_keypress_or_autorefresh(viewport, FALLBACK_TERMSIZE, max(refresh_at - time.time(), 0))
+                            if read_char == "\n" or time.time() >= refresh_at:
+                                control_qtop(viewport, read_char, cluster, old_attrs, new_attrs)
+                                break
+
+                            screen.invalidate()  # the key pressed gets a message under the view, which may also scroll the terminal
+                            h_start = viewport.h_start
+                            control_qtop(viewport, read_char, cluster, old_attrs, new_attrs)
+                            reanalyse = engine.update_context(viewport)
+                            if reanalyse or viewport.h_start != h_start:  # the matrices are cut horizontally while printed, so panning prints them again
+                                frame_buffer = io.StringIO()
+                                sys.stdout = frame_buffer
+                                if reanalyse:
+                                    logging.debug("Runtime options or terminal size changed, analysing the current document again.")
+                                    cluster, wns_occupancy = engine.analyse()
+                                transposed_matrices = []
+                                display = TextDisplay(document, config, viewport, wns_occupancy, cluster, args)
+                                with open(output_fp, "w") as fout:
+                                    frame = Frame.from_text(render_frame(display, frame_buffer, stdout, fout))
+                                viewport.max_height, max_line_len = get_output_size(max_line_len, frame)
 
                 help_main_switch.pop()
                 os.chdir(QTOPPATH)
@@ -12,7 +12,14 @@ import re
 
 ##import sys
 from itertools import count
+from json import JSONDecoder
 import logging
+from qtop_py.jobtable import JobTable
+
+ARRAY_JOB_INDEX_RE = re.compile(r"\[\d+\]")
+JSON_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+JSON_NUMBER_CHARS = frozenset(".eE+-0123456789")
+JSON_CHUNK_SIZE = 1 << 20  # characters read at a time by JSONStreamReader
 
 
 class StatExtractor(object):
@@ -93,6 +100,10 @@ class StatExtractor(object):
 
 
 class GenericBatchSystem(object):
+    # True if everything the batch system reports is read from its scheduler output files,
+    # so that unchanged files mean unchanged results (see RefreshEngine in qtop.py)
+    snapshot_from_output_files = True
+
     def __init__(self):
         pass
 
@@ -105,6 +116,14 @@ class GenericBatchSystem(object):
     def get_jobs_info(self, qstats):
         raise NotImplementedError
 
+    def get_job_table(self, symbols=None):
+        """
+        The jobs of get_jobs_info as a JobTable interned in symbols, which is what the Document holds.
+        Plugins that read their jobs column by column may override this and fill the table directly.
+        """
+        job_ids, user_names, job_states, job_queues = self.get_jobs_info()
+        return JobTable.from_columns(job_ids, user_names, job_states, job_queues, symbols)
+
     @staticmethod
     def get_mnemonic():
         raise NotImplementedError
@@ -120,6 +139,127 @@ class GenericBatchSystem(object):
         job_ids_queues = dict(zip(job_ids, job_queues))
         for worker_node in _worker_nodes:
             my_jobs = worker_node["core_job_map"].values()
-            my_queues = set(job_ids_queues.get(re.sub(r"\[\d+\]", r"[]", job_id)) for job_id in my_jobs)  # also for job arrays
+            # also for job arrays
+            my_queues = set(job_ids_queues.get(ARRAY_JOB_INDEX_RE.sub("[]", job_id) if "[" in job_id else job_id) for job_id in my_jobs)
             worker_node["qname"] = list(my_queues)
         return _worker_nodes
+
+
+class JSONStreamReader(object):
+    """
+    Reads a JSON document off a file object, a chunk at a time, one value or punctuation character after the other.
+    Values are decoded with the (C-accelerated) JSONDecoder.raw_decode, so only the current chunk is ever held in memory,
+    along with the value being decoded.
+    """
+
+    def __init__(self, fin, chunk_size=None):
+        self.fin = fin
+        self.chunk_size = chunk_size or JSON_CHUNK_SIZE
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fin.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, which is not consumed"""
+        while True:
+            self.pos = JSON_WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, chars):
+        """Consumes the next non-whitespace character, which has to be one of chars"""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expecting one of %r instead of %r in JSON input" % (chars, char))
+        self.pos += 1
+        return char
+
+    def decode(self, decoder):
+        """Consumes and returns the next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # a number cut by the end of the chunk, e.g. 1.5 read as 1 followed by ".", goes on in the next one
+            if (end == len(self.buf) or self.buf[end] in JSON_NUMBER_CHARS) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_members(fin, key, keep=None, chunk_size=None):
+    """
+    Generator of the (name, value) members of the object found under key at the top level of a JSON document,
+    e.g. the jobs under "Jobs" in qstat -f -F json, which are decoded one at a time instead of the whole document at once.
+    If key is None, the members of the top-level object itself are generated, e.g. the jobs of oarstat -J.
+    If keep is given, only the attributes in keep are kept in each value; nested objects are emptied.
+    Yields nothing if the document has no such key.
+    """
+    plain_decoder = JSONDecoder()
+    decoder = JSONDecoder(object_pairs_hook=lambda pairs: {name: value for name, value in pairs if name in keep}) if keep else plain_decoder
+    reader = JSONStreamReader(fin, chunk_size)
+    if key is not None and not seek_json_key(reader, key, plain_decoder):
+        return
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        member_name = reader.decode(plain_decoder)
+        reader.expect(":")
+        yield member_name, reader.decode(decoder)
+        if reader.expect(",}") == "}":
+            return
+
+
+def iter_json_items(fin, key, chunk_size=None):
+    """
+    Generator of the items of the array found under key at the top level of a JSON document,
+    e.g. the jobs under "jobs" in squeue --json, which are decoded one at a time instead of the whole document at once.
+    Yields nothing if the document has no such key.
+    """
+    decoder = JSONDecoder()
+    reader = JSONStreamReader(fin, chunk_size)
+    if not seek_json_key(reader, key, decoder):
+        return
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode(decoder)
+        if reader.expect(",]") == "]":
+            return
+
+
+def seek_json_key(reader, key, decoder):
+    """
+    Consumes the top-level object of the JSON document in reader up to the value under key, skipping the members before it.
+    Returns False if the document has no such key.
+    """
+    reader.expect("{")
+    if reader.peek() == "}":
+        return False
+    while True:
+        name = reader.decode(decoder)
+        reader.expect(":")
+        if name == key:
+            return True
+        reader.decode(decoder)
+        if reader.expect(",}") == "}":
+            return False
@@ -0,0 +1,76 @@
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+RESET = "\033[0;m"
+
+
+class EscapeTable(object):
+    """
+    The ANSI escape sequence opening text of each (fg, bg, bold) color triplet, color names being the keys of color_to_code.
+    Each sequence is made once, when first asked for, and kept. Colors missing from color_to_code raise KeyError.
+    """
+
+    def __init__(self, color_to_code):
+        self.color_to_code = color_to_code
+        self._escapes = dict()
+
+    def get(self, fg, bg="NOBG", bold=False):
+        key = (fg, bg, bold)
+        try:
+            return self._escapes[key]
+        except KeyError:
+            code = self.color_to_code[fg]
+            if bold and code[0] in "01":
+                code = "1" + code[1:]
+            escape = self._escapes[key] = "\033[%s%sm" % (code, self.color_to_code[bg])
+            return escape
+
+
+class CellEscapes(dict):
+    """
+    The escape sequence of each cell color of a frame, as colorize(text, color_func=color) would color the cell:
+    no color falls back to default_color, and an unknown color, or any color when coloring is off, gets "" (the cell is left uncolored).
+    """
+
+    def __init__(self, escape_table, default_color, enabled=True):
+        super(CellEscapes, self).__init__()
+        self.escape_table = escape_table
+        self.default_color = default_color
+        self.enabled = enabled
+
+    def __missing__(self, color):
+        escape = ""
+        if self.enabled:
+            try:
+                escape = self.escape_table.get(color or self.default_color)
+            except KeyError:
+                pass
+        self[color] = escape
+        return escape
+
+
+def join_runs(cells):
+    """
+    Joins cells, (text, escape sequence) pairs, into a line, writing a single escape sequence for each run of cells of the same color,
+    each run being closed by RESET. Uncolored cells, with an empty escape sequence, are written as they are.
+    """
+    parts = []
+    run_escape = ""
+    run = []
+    for text, escape in cells:
+        if escape != run_escape:
+            if run_escape:
+                parts.append(run_escape + "".join(run) + RESET)
+            else:
+                parts.extend(run)
+            run_escape, run = escape, []
+        run.append(text)
+
+    if run_escape:
+        parts.append(run_escape + "".join(run) + RESET)
+    else:
+        parts.extend(run)
+    return "".join(parts)
@@ -0,0 +1,105 @@
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+import re
+
+ANSI_ESCAPE_RE = re.compile(r"\x1b[^m]*m")  # matches ANSI color sequences
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"  # what clear(1) writes on xterm-like terminals
+MOVE_CURSOR = "\033[%d;1H"  # to the first column of a row, counting from 1
+CLEAR_LINE_END = "\033[0m\033[K"  # without the last color filling the rest of the line
+
+
+class Frame(object):
+    """
+    A rendered qtop output, kept in memory: its lines, color sequences included, and the visible width of each line,
+    so that the part shown on screen can be sliced out of it (see Viewport.get_view) instead of going through files.
+    """
+
+    def __init__(self, lines, widths=None):
+        self.lines = lines
+        self.widths = widths if widths is not None else [len(ANSI_ESCAPE_RE.sub("", line)) for line in lines]
+
+    @classmethod
+    def from_text(cls, text):
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()  # the newline ending the last line doesn't start another one
+        return cls(lines)
+
+    @classmethod
+    def from_file(cls, filepath):
+        with open(filepath, "r") as fin:
+            return cls.from_text(fin.read())
+
+    @property
+    def height(self):
+        return len(self.lines)
+
+    @property
+    def width(self):
+        """The widest line, leading and trailing whitespace aside, as qtop has always measured its output"""
+        return max(len(ANSI_ESCAPE_RE.sub("", line.strip())) for line in self.lines) if self.lines else 0
+
+    def get_part(self, start=0, stop=None):
+        """Lines start up to stop, as a Frame of their own"""
+        return Frame(self.lines[start:stop], self.widths[start:stop])
+
+    def get_text(self):
+        """The lines, each one ending in a newline, as a single string"""
+        return "".join(line + "\n" for line in self.lines)
+
+
+def write_frame(fout, text, clear_screen=False):
+    """Writes text to fout in a single write, after clearing the screen if asked to"""
+    fout.write(CLEAR_SCREEN + text if clear_screen else text)
+    fout.flush()
+
+
+class Screen(object):
+    """
+    What was last painted on the terminal, so that the next Frame only rewrites the lines that changed,
+    each one with a cursor-addressed update, instead of clearing the screen and repainting all of it.
+    Lines wider than the terminal wrap to several rows; as long as every line takes up the same rows as before, and the whole frame fits
+    without scrolling the terminal, lines are addressed by row. Otherwise, or after invalidate(), the next paint clears the screen.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.term_size = None
+        self.line_rows = None
+
+    def invalidate(self):
+        """To be called when something else was written to the terminal, e.g. the message of a key press"""
+        self.frame = None
+
+    @staticmethod
+    def get_line_rows(frame, term_columns):
+        return [max(-(-width // term_columns), 1) for width in frame.widths] if term_columns > 0 else [1] * frame.height
+
+    def paint(self, fout, frame, term_size):
+        """
+        Writes frame to fout in a single write, leaving the cursor on the row below it, as a full repaint would.
+        Returns the number of lines written.
+        """
+        term_height, term_columns = term_size
+        line_rows = self.get_line_rows(frame, term_columns)
+        fits = sum(line_rows) < term_height
+        if self.frame is None or term_size != self.term_size or line_rows != self.line_rows or not fits:
+            write_frame(fout, frame.get_text(), clear_screen=True)
+            changed_lines = frame.height
+        else:
+            updates = []
+            row = 1
+            for line, old_line, rows in zip(frame.lines, self.frame.lines, line_rows):
+                if line != old_line:
+                    updates.append(MOVE_CURSOR % row + line + CLEAR_LINE_END)
+                row += rows
+            updates.append(MOVE_CURSOR % row)
+            write_frame(fout, "".join(updates))
+            changed_lines = len(updates) - 1
+
+        self.frame, self.term_size, self.line_rows = (frame, term_size, line_rows) if fits else (None, None, None)
+        return changed_lines
@@ -88,6 +88,14 @@ class Viewport(BaseViewport):
     def get_term_size(self):
         return self.v_term_size, self.h_term_size
 
+    def get_view(self, frame):
+        """
+        The part of frame (see qtop_py.ui.frame) shown on screen, as a Frame, cut the way tail -n+v_start | head -n(v_term_size - 1) used to:
+        the last line of the terminal is left for the messages of the keys pressed.
+        """
+        start = max(self.v_start, 1) - 1
+        return frame.get_part(start, start + max(self.v_term_size - 1, 0))
+
     def scroll_down(self):
         success = False
         if self.v_stop < self.max_height:
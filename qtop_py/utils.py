@@ -92,6 +92,23 @@ def parse_qtop_cmdline_args():
         choices=["ON", "OFF", "AUTO"],
         help="Enable/Disable color in qtop output. AUTO detects tty (for watch -d)",
     )
+    parser.add_argument(
+        "--collect",
+        dest="COLLECT",
+        nargs="?",
+        const="",
+        default=None,
+        help="Only query the scheduler and publish the parsed results in a file (collector_file in QTOPCONF_YAML, unless given), "
+        "every WATCH seconds if combined with -w. Nothing is displayed.",
+    )
+    parser.add_argument(
+        "--attach",
+        dest="ATTACH",
+        nargs="?",
+        const="",
+        default=None,
+        help="Display the results published by a qtop --collect instance (collector_file in QTOPCONF_YAML, unless given), instead of querying the scheduler.",
+    )
     parser.add_argument("-C", "--classic", action="store_true", dest="CLASSIC", default=False, help="tries to mimic legacy qtop display as much as possible")
     parser.add_argument("-d", "--debug", action="store_true", dest="DEBUG", default=False, help="print debugging messages in stdout, not just in the log file.")
     parser.add_argument("-E", "--export", action="store_true", dest="EXPORT", default=False, help="export cluster data to json")
@@ -16,10 +16,15 @@ therefore be parsed as if it held data. ``extract_qstat`` now mirrors the PBS
 behaviour: log the empty file and return no records.
 """
 
+import json
 import logging
+from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
+from qtop_py import serialiser
+from qtop_py.plugins import oar
 from qtop_py.plugins.oar import OarStatExtractor
 
 
@@ -67,3 +72,181 @@ def test_extract_qstat_missing_file_still_raises(tmp_path):
     missing = tmp_path / "does_not_exist.txt"
     with pytest.raises((OSError, IOError)):
         _make_extractor().extract_qstat(str(missing))
+
+
+OARNODES_S_Y = """---
+node-1:
+    1: Alive
+    10: Alive
+    2: Alive
+node-2:
+    3: Dead
+    4: Suspected
+"""
+
+OARNODES_Y = """---
+1:
+  host: node-1
+  jobs: 101
+  suspended_jobs: NO
+10:
+  host: node-1
+  suspended_jobs: NO
+2:
+  host: node-1
+  jobs: 102
+3:
+  host: node-2
+4:
+  host: node-2
+  jobs: 999
+"""
+
+
+def test_scan_oarnodes_s_keeps_resources_as_columns_in_file_order():
+    resources = oar.scan_oarnodes_s(OARNODES_S_Y, oar.OarResources())
+
+    assert resources.node_names == ["node-1", "node-2"]
+    assert resources.node_starts == [0, 3]
+    assert resources.resource_ids == [1, 10, 2, 3, 4]
+    assert resources.states == ["Alive", "Alive", "Alive", "Dead", "Suspected"]
+
+
+def test_scan_oarnodes_y_keeps_only_the_jobs_of_busy_resources():
+    assert oar.scan_oarnodes_y(OARNODES_Y) == {1: "101", 2: "102", 4: "999"}
+    assert oar.scan_oarnodes_y(OARNODES_Y[len("---\n") :]) == {1: "101", 2: "102", 4: "999"}
+
+
+def test_get_worker_nodes_reads_the_scanned_columns(tmp_path, caplog):
+    for name, content in (("oarnodes_s_Y.txt", OARNODES_S_Y), ("oarnodes_Y.txt", OARNODES_Y)):
+        (tmp_path / name).write_text(content)
+    filenames = {"oarnodes_s_file": str(tmp_path / "oarnodes_s_Y.txt"), "oarnodes_y_file": str(tmp_path / "oarnodes_Y.txt")}
+    options = SimpleNamespace(ANONYMIZE=False, SOURCEDIR=str(tmp_path))
+    batch_system = oar.OARBatchSystem(filenames, {}, options)
+
+    with caplog.at_level(logging.ERROR):
+        worker_nodes = batch_system.get_worker_nodes(["101", "102"], ["default", "besteffort"], options)
+
+    assert [(node["domainname"], node["np"], node["state"], node["core_job_map"], sorted(node["qname"])) for node in worker_nodes] == [
+        ("node-1", 3, "-", {0: "101", 2: "102"}, ["besteffort", "default"]),
+        ("node-2", 2, "%", {}, []),  # job 999 is unknown to oarstat
+    ]
+    assert any("999" in record.message for record in caplog.records)
+
+
+def test_oar_sample_is_read_in_full():
+    contrib = Path(oar.__file__).resolve().parents[1] / "contrib"
+    filenames = {"oarnodes_s_file": str(contrib / "oarnodes_s_Y.txt"), "oarnodes_y_file": str(contrib / "oarnodes_Y.txt")}
+    batch_system = oar.OARBatchSystem(filenames, {}, SimpleNamespace(ANONYMIZE=False, SOURCEDIR=str(contrib)))
+
+    resources = batch_system._read_oarnodes()
+
+    assert len(resources) == 2520 and len(resources.node_names) == 183
+    assert resources.jobs[resources.resource_ids.index(1)] == "3512241"
+
+
+OAR_JSON_SAMPLE = Path(__file__).resolve().parent / "oar_samples" / "json"
+
+
+def make_batch_system(sourcedir, streaming_json_parsing=False):
+    filenames = dict(
+        (key, str(Path(sourcedir) / name)) for key, name in (("oarnodes_s_file", "oarnodes_s_Y.txt"), ("oarnodes_y_file", "oarnodes_Y.txt"), ("oarstat_file", "oarstat.txt"))
+    )
+    options = SimpleNamespace(ANONYMIZE=False, SOURCEDIR=str(sourcedir))
+    return oar.OARBatchSystem(filenames, {"streaming_json_parsing": streaming_json_parsing}, options), options
+
+
+def read_oar_files(sourcedir, streaming_json_parsing=False):
+    batch_system, options = make_batch_system(sourcedir, streaming_json_parsing)
+    jobs = batch_system.get_jobs_info()
+    queues = batch_system.get_queues_info()
+    worker_nodes = batch_system.get_worker_nodes(jobs[0], jobs[3], options)
+    for worker_node in worker_nodes:
+        worker_node["qname"] = sorted(worker_node["qname"])
+    return jobs, queues, worker_nodes
+
+
+def test_extract_qstat_reads_any_queue_and_state(tmp_path):
+    oarstat = tmp_path / "oarstat.txt"
+    oarstat.write_text(
+        "Job id     Name           User           Submission Date     S Queue\n"
+        "---------- -------------- -------------- ------------------- - ----------\n"
+        "201                       alice          2026-06-17 10:00:00 H admin\n"
+        "202        sim            bob            2026-06-17 10:00:00 L gpu-long\n"
+    )
+
+    assert [(values["JobId"], values["S"], values["Queue"]) for values in _make_extractor().extract_qstat(str(oarstat))] == [("201", "H", "admin"), ("202", "L", "gpu-long")]
+
+
+@pytest.mark.parametrize("streaming_json_parsing, chunk_size", [(False, None), (True, None), (True, 3)])
+def test_extract_qstat_reads_oarstat_json(tmp_path, monkeypatch, streaming_json_parsing, chunk_size):
+    if chunk_size:
+        monkeypatch.setattr(serialiser, "JSON_CHUNK_SIZE", chunk_size)
+    oarstat = tmp_path / "oarstat.txt"
+    oarstat.write_text(
+        json.dumps(
+            {
+                "301": {"id": 301, "owner": "alice", "state": "Running", "queue": "default", "assigned_resources": [1, 2], "types": {"a": 1}},
+                "302": {"id": 302, "owner": "bob", "state": "toLaunch", "queue": "besteffort"},
+                "303": {"id": 303, "owner": "carol", "state": "Waiting", "queue": "default"},
+            }
+        )
+    )
+
+    assert OarStatExtractor({"streaming_json_parsing": streaming_json_parsing}, _Opts()).extract_qstat(str(oarstat)) == [
+        {"JobId": "301", "UnixAccount": "alice", "S": "R", "Queue": "default"},
+        {"JobId": "302", "UnixAccount": "bob", "S": "L", "Queue": "besteffort"},
+        {"JobId": "303", "UnixAccount": "carol", "S": "W", "Queue": "default"},
+    ]
+
+
+def test_get_queues_info_counts_running_and_queued_jobs_per_queue():
+    assert read_oar_files(OAR_JSON_SAMPLE)[1] == (
+        3,
+        1,
+        [
+            {"queue_name": "default", "run": "2", "queued": "1", "lm": "--", "state": "?"},
+            {"queue_name": "besteffort", "run": "1", "queued": "0", "lm": "--", "state": "?"},
+        ],
+    )
+
+
+@pytest.mark.parametrize("streaming_json_parsing, chunk_size", [(False, None), (True, None), (True, 3)])
+def test_json_sample_is_read_into_worker_nodes(monkeypatch, streaming_json_parsing, chunk_size):
+    if chunk_size:
+        monkeypatch.setattr(serialiser, "JSON_CHUNK_SIZE", chunk_size)
+    jobs, _, worker_nodes = read_oar_files(OAR_JSON_SAMPLE, streaming_json_parsing)
+
+    assert jobs == (
+        ["101", "102", "103", "104", "105"],
+        ["alice", "bob", "alice", "carol", "bob"],
+        ["R", "R", "R", "W", "H"],
+        ["default", "besteffort", "default", "default", "default"],
+    )
+    assert [(node["domainname"], node["np"], node["state"], node["core_job_map"], node["qname"]) for node in worker_nodes] == [
+        ("node-1", 4, "-", {0: "101", 1: "101", 2: "101", 3: "101"}, ["default"]),
+        ("node-2", 4, "-", {0: "102", 1: "102", 3: "103"}, ["besteffort", "default"]),
+        ("node-3", 4, "d", {}, []),
+    ]
+
+
+@pytest.mark.parametrize("streaming_json_parsing, chunk_size", [(False, None), (True, None), (True, 3)])
+def test_json_output_reads_like_the_text_output(tmp_path, monkeypatch, streaming_json_parsing, chunk_size):
+    if chunk_size:
+        monkeypatch.setattr(serialiser, "JSON_CHUNK_SIZE", chunk_size)
+    contrib = Path(oar.__file__).resolve().parents[1] / "contrib"
+    batch_system, _ = make_batch_system(contrib)
+    resources = batch_system._read_oarnodes()
+    oarnodes_s = dict()
+    for node, start, end in zip(resources.node_names, resources.node_starts, resources.node_starts[1:] + [len(resources)]):
+        oarnodes_s[node] = dict((str(resource_id), state) for resource_id, state in zip(resources.resource_ids[start:end], resources.states[start:end]))
+    oarnodes = dict(
+        (str(resource_id), {"resource_id": resource_id, "jobs": [int(job)]} if job else {"resource_id": resource_id})
+        for resource_id, job in zip(resources.resource_ids, resources.jobs)
+    )
+    states = dict((code, state) for state, code in oar.OARSTAT_STATE_CODES.items())
+    oarstat = dict((qstat["JobId"], {"owner": qstat["UnixAccount"], "state": states[qstat["S"]], "queue": qstat["Queue"]}) for qstat in batch_system._get_qstats())
+    for name, document in (("oarnodes_s_Y.txt", oarnodes_s), ("oarnodes_Y.txt", oarnodes), ("oarstat.txt", oarstat)):
+        (tmp_path / name).write_text(json.dumps(document, indent=3))
+
+    assert read_oar_files(tmp_path, streaming_json_parsing) == read_oar_files(contrib)
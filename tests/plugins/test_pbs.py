@@ -8,6 +8,11 @@
 ## SPDX-License-Identifier: MIT
 ##
 
+import io
+import json
+from types import SimpleNamespace
+
+from qtop_py import serialiser
 from qtop_py.plugins import pbs
 import pytest
 
@@ -41,3 +46,94 @@ def test_get_jobs_cores(jobs, result):
     result = iter(result)
     for job, core in pbs.PBSBatchSystem._get_jobs_cores(jobs):
         assert (job, core) == next(result)
+
+
+def test_get_jobs_cores_strips_array_indices():
+    jobs = ["0/123[4].pbs.example.org", "1/123[].pbs.example.org", "2/124.pbs.example.org"]
+    assert list(pbs.PBSBatchSystem._get_jobs_cores(jobs)) == [("123", "0"), ("123", "1"), ("124", "2")]
+
+
+def test_iter_worker_nodes_streams_the_blocks_of_pbsnodes():
+    pbsnodes = io.StringIO(
+        "wn01.example.org\n"
+        "     state = free\n"
+        "     np = 4\n"
+        "     jobs = 0/101.pbs.example.org, 1/102[3].pbs.example.org\n"
+        "\n"
+        "wn02.example.org\n"
+        "     state = down,offline\n"
+        "     pcpus = 2\n"
+        "     jobs =\n"  # no jobs, no trailing empty line either
+    )
+    batch_system = pbs.PBSBatchSystem({}, {}, SimpleNamespace(ANONYMIZE=False))
+    worker_nodes = batch_system._iter_worker_nodes(pbsnodes)
+
+    assert next(worker_nodes) == {"domainname": "wn01.example.org", "state": "-", "np": "4", "core_job_map": {"0": "101", "1": "102"}}
+    assert next(worker_nodes) == {"domainname": "wn02.example.org", "state": "d", "np": "2", "core_job_map": {}}
+    assert list(worker_nodes) == []
+
+
+QSTAT_F_JSON = """
+{
+    "timestamp": 1749549600,
+    "pbs_version": "19.1.3",
+    "Jobs": {
+        "101.pbs.example.org": {"Job_Name": "sim", "Job_Owner": "alice@login1", "Resource_List": {"ncpus": 4}, "job_state": "R", "queue": "workq"},
+        "102[].pbs.example.org": {"Job_Name": "array", "Job_Owner": "bob@login2", "job_state": "Q", "queue": "long", "Priority": 10}
+    },
+    "pbs_server": "pbs"
+}
+"""
+
+QSTAT_Q_JSON = '{"Queue": {"workq": {"enabled": "True", "state_count": "Transit:0 Queued:3 Held:0 Waiting:0 Running:5 Exiting:0 Begun:0"}}}'
+
+
+@pytest.mark.parametrize("streaming, chunk_size", ((False, None), (True, None), (True, 3)))
+def test_extract_qstat_parses_json_once(tmp_path, monkeypatch, streaming, chunk_size):
+    if chunk_size:
+        monkeypatch.setattr(serialiser, "JSON_CHUNK_SIZE", chunk_size)
+    qstat_file = tmp_path / "qstat.txt"
+    qstat_file.write_text(QSTAT_F_JSON)
+    extractor = pbs.PBSStatExtractor({"streaming_json_parsing": streaming}, SimpleNamespace(ANONYMIZE=False))
+    loads = []
+    json_load = pbs.json.load
+    monkeypatch.setattr(pbs.json, "load", lambda fin: loads.append(fin) or json_load(fin))
+
+    assert extractor.extract_qstat(str(qstat_file)) == [
+        {"JobId": "101", "Queue": "workq", "JobName": "sim", "UnixAccount": "alice", "S": "R"},
+        {"JobId": "102[]", "Queue": "long", "JobName": "array", "UnixAccount": "bob", "S": "Q"},
+    ]
+    assert len(loads) == (0 if streaming else 1)
+
+
+def test_extract_qstatq_parses_json(tmp_path):
+    qstatq_file = tmp_path / "qstat_q.txt"
+    qstatq_file.write_text(QSTAT_Q_JSON)
+    extractor = pbs.PBSStatExtractor({}, SimpleNamespace(ANONYMIZE=False))
+
+    assert extractor.extract_qstatq(str(qstatq_file)) == [{"queue_name": "workq", "run": "5", "queued": "3", "lm": "--", "state": "E"}, {"Total_running": 5, "Total_queued": 3}]
+
+
+@pytest.mark.parametrize("chunk_size", (1, 7, 1 << 20))
+def test_iter_json_members_decodes_one_member_at_a_time(chunk_size):
+    members = serialiser.iter_json_members(io.StringIO(QSTAT_F_JSON), "Jobs", keep=pbs.QSTAT_JSON_ATTRIBUTES, chunk_size=chunk_size)
+
+    job_id, job = next(members)
+    assert (job_id, job) == ("101.pbs.example.org", {"Job_Name": "sim", "Job_Owner": "alice@login1", "job_state": "R", "queue": "workq"})
+    assert [job_id for job_id, job in members] == ["102[].pbs.example.org"]
+    assert list(serialiser.iter_json_members(io.StringIO('{"timestamp": 12345, "Jobs": {}}'), "Jobs", chunk_size=chunk_size)) == []
+    assert list(serialiser.iter_json_members(io.StringIO('{"timestamp": 12345}'), "Jobs", chunk_size=chunk_size)) == []
+    with pytest.raises(ValueError):
+        list(serialiser.iter_json_members(io.StringIO('{"Jobs": {"1": {"queue": "q'), "Jobs", chunk_size=chunk_size))
+
+
+NUMBERS_JSON = '{"load": 1.5, "scale": 1e5, "eps": 1.0e-7, "drift": -0.25, "uptime": 123456.5, "jobs": [1.5, 2, -3E+2, 0.125e1, 42]}'
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(NUMBERS_JSON) + 1))
+def test_numbers_cut_by_a_chunk_are_decoded_whole(chunk_size):
+    members = list(serialiser.iter_json_members(io.StringIO(NUMBERS_JSON), None, chunk_size=chunk_size))
+    items = list(serialiser.iter_json_items(io.StringIO(NUMBERS_JSON), "jobs", chunk_size=chunk_size))
+
+    assert members == list(json.loads(NUMBERS_JSON).items())
+    assert items == [1.5, 2, -300.0, 1.25, 42]
@@ -0,0 +1,103 @@
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+from pathlib import Path
+from types import SimpleNamespace
+from xml.etree import ElementTree
+
+import pytest
+
+from qtop_py.plugins import sge
+
+SGE_SAMPLE = str(Path(__file__).resolve().parents[2] / "qtop_py" / "contrib" / "qstat.F.xml.stdout")
+
+QSTAT_F_XML = """<?xml version='1.0'?>
+<job_info>
+  <queue_info>
+    <Queue-List>
+      <name>short@wn01</name>
+      <slots_used>2</slots_used>
+      <resource name="num_proc" type="hl">4</resource>
+      <resource name="qname" type="qf">short</resource>
+      <resource name="hostname" type="qf">wn01</resource>
+      <job_list state="running"><JB_job_number>11</JB_job_number><JB_name>a</JB_name><JB_owner>alice</JB_owner><state>r</state><JAT_start_time>t</JAT_start_time></job_list>
+      <job_list state="running"><JB_job_number>12</JB_job_number><JB_name>b</JB_name><JB_owner>bob</JB_owner><state>r</state><JAT_start_time>t</JAT_start_time></job_list>
+    </Queue-List>
+    <Queue-List>
+      <name>long@wn01</name>
+      <slots_used>1</slots_used>
+      <state>d</state>
+      <resource name="num_proc" type="hl">4</resource>
+      <resource name="qname" type="qf">long</resource>
+      <resource name="hostname" type="qf">wn01</resource>
+      <job_list state="running"><JB_job_number>13</JB_job_number><JB_name>c</JB_name><JB_owner>alice</JB_owner><state>r</state><JAT_start_time>t</JAT_start_time></job_list>
+    </Queue-List>
+  </queue_info>
+  <job_info>
+    <job_list state="pending"><JB_job_number>14</JB_job_number><JB_name>d</JB_name><JB_owner>carol</JB_owner><state>qw</state></job_list>
+  </job_info>
+</job_info>
+"""
+
+
+def read_sge_file(sge_file, one_pass, faster_xml_parsing=False):
+    options = SimpleNamespace(ANONYMIZE=False, SAMPLE=False)
+    batch_system = sge.SGEBatchSystem({"sge_file": sge_file}, {"faster_xml_parsing": faster_xml_parsing}, options)
+    batch_system.one_pass = one_pass
+    jobs = batch_system.get_jobs_info()
+    queues = batch_system.get_queues_info()
+    worker_nodes = batch_system.get_worker_nodes(jobs[0], jobs[3], options)
+    for worker_node in worker_nodes:
+        worker_node["qname"] = sorted(worker_node["qname"])
+    return jobs, queues, worker_nodes
+
+
+def test_one_pass_reads_jobs_queues_and_worker_nodes(tmp_path):
+    sge_file = tmp_path / "qstat.F.xml.stdout"
+    sge_file.write_text(QSTAT_F_XML)
+
+    jobs, queues, worker_nodes = read_sge_file(str(sge_file), one_pass=True)
+
+    assert jobs == (["11", "12", "13", "14"], ["alice", "bob", "alice", "carol"], ["r", "r", "r", "qw"], ["short", "short", "long", "Pending"])
+    assert queues == (
+        3,
+        1,
+        [
+            {"queue_name": "short", "state": "?", "run": "2", "lm": 0, "queued": "0"},
+            {"queue_name": "long", "state": "d", "run": "1", "lm": 0, "queued": "0"},
+            {"run": "0", "queued": "1", "queue_name": "Pending", "state": "Q", "lm": "0"},
+        ],
+    )
+    assert worker_nodes == [{"domainname": "wn01", "qname": ["long", "short"], "np": 4, "state": "d", "core_job_map": {0: "11", 1: "12", 2: "13"}, "existing_busy_cores": 3}]
+
+
+def test_one_pass_matches_the_whole_tree():
+    assert read_sge_file(SGE_SAMPLE, one_pass=True) == read_sge_file(SGE_SAMPLE, one_pass=False)
+
+
+def test_whole_tree_is_kept_for_samples_and_anonymization():
+    for options in (SimpleNamespace(ANONYMIZE=False, SAMPLE=1), SimpleNamespace(ANONYMIZE=True, SAMPLE=0)):
+        assert not sge.SGEBatchSystem({"sge_file": SGE_SAMPLE}, {}, options).one_pass
+
+
+def test_elementtree_is_the_default_xml_backend():
+    assert sge.get_xml_backend(False).etree is ElementTree
+    assert sge.get_xml_backend(None) is sge.get_xml_backend(False)
+
+
+def test_faster_xml_parsing_falls_back_to_elementtree_without_lxml(monkeypatch):
+    monkeypatch.setattr(sge, "lxml_etree", None)
+    monkeypatch.setattr(sge, "_xml_backends", dict())
+
+    assert sge.get_xml_backend(True).etree is ElementTree
+
+
+@pytest.mark.parametrize("one_pass", [True, False])
+def test_lxml_backend_matches_elementtree(one_pass):
+    pytest.importorskip("lxml")
+
+    assert sge.get_xml_backend(True).name == "lxml.etree"
+    assert read_sge_file(SGE_SAMPLE, one_pass, faster_xml_parsing=True) == read_sge_file(SGE_SAMPLE, one_pass)
@@ -6,11 +6,15 @@
 ## SPDX-License-Identifier: MIT
 ##
 
+import io
+import json
 import os
 
 import pytest
 
-from qtop_py.plugins.slurm import SlurmBatchSystem, SlurmStatExtractor
+from qtop_py import serialiser
+from qtop_py.plugins.slurm import CoreAllocation, SlurmBatchSystem, SlurmStatExtractor, expand_hostlist
+from qtop_py.qtop import mapping_to_json
 
 
 class Options(object):
@@ -56,6 +60,23 @@ def scheduler_files(sample_name):
                 "shared002": ("-", ["compute"], {0: "303"}),
             },
         ),
+        (
+            "json",
+            (
+                ["601", "602+0", "602+1", "604_3", "606", "607_[1-4]", "608"],
+                ["alice", "bob", "bob", "carol", "dave", "erin", "frank"],
+                ["R", "R", "R", "R", "R", "PD", "CD"],
+                ["compute", "compute", "gpu", "compute", "gpu", "compute", "compute"],
+            ),
+            (5, 1, {"compute": ("3", "1"), "gpu": ("2", "0")}),
+            {
+                "cn01": ("b", ["compute"], dict([(core, "601") for core in range(12)] + [(14, "604_3"), (15, "604_3")])),
+                "cn02": ("b", ["compute"], dict([(core, "602+0") for core in range(4)] + [(core, "601") for core in range(12, 16)])),
+                "cn03": ("b", ["compute", "gpu"], dict([(core, "606") for core in range(4)] + [(core, "602+1") for core in (4, 5, 6, 7, 12, 13, 14, 15)])),
+                "cn04": ("d", ["compute"], {}),
+                "cn05": ("-", ["compute"], {}),
+            },
+        ),
     ),
 )
 def test_slurm_command_traces(sample_name, expected_jobs, expected_queues, expected_nodes):
@@ -77,6 +98,20 @@ def test_slurm_command_traces(sample_name, expected_jobs, expected_queues, expec
         assert worker_nodes[node_name]["core_job_map"] == expected_core_map
 
 
+def read_slurm_files(sample_name):
+    slurm = SlurmBatchSystem(scheduler_files(sample_name), {}, Options())
+    jobs = slurm.get_jobs_info()
+    return jobs, slurm.get_queues_info(), slurm.get_worker_nodes(jobs[0], jobs[3], Options())
+
+
+@pytest.mark.parametrize("chunk_size", (1, 2, 3, 5, 64))
+def test_json_sample_reads_the_same_in_tiny_chunks(monkeypatch, chunk_size):
+    expected = read_slurm_files("json")
+    monkeypatch.setattr(serialiser, "JSON_CHUNK_SIZE", chunk_size)
+
+    assert read_slurm_files("json") == expected
+
+
 @pytest.mark.parametrize(
     "sample_name, expected_nodes, expected_cores",
     (
@@ -107,6 +142,9 @@ def test_large_slurm_cluster_samples_exceed_256_cores(sample_name, expected_node
         ("node[001-003]", ["node001", "node002", "node003"]),
         ("gpu[01-02,04]", ["gpu01", "gpu02", "gpu04"]),
         ("rack[01-02]node[001-002]", ["rack01node001", "rack01node002", "rack02node001", "rack02node002"]),
+        ("cn[08-10],gpu07,login", ["cn08", "cn09", "cn10", "gpu07", "login"]),
+        ("gpu[1-2]-ib[0,3],cn[9-10]", ["gpu1-ib0", "gpu1-ib3", "gpu2-ib0", "gpu2-ib3", "cn9", "cn10"]),
+        ("cn[01", ["cn[01"]),
         ("(Priority)", []),
         ("", []),
     ),
@@ -115,6 +153,88 @@ def test_expand_nodelist(nodelist, expected):
     assert SlurmBatchSystem.expand_nodelist(nodelist) == expected
 
 
+def test_expand_hostlist_is_cached():
+    assert expand_hostlist("cn[0001-6000]") is expand_hostlist("cn[0001-6000]")
+    assert len(expand_hostlist("cn[0001-6000]")) == 6000
+
+
+def test_core_job_map_is_a_view_over_job_runs():
+    allocation = CoreAllocation()
+    allocation.allocate("7", 3)
+    allocation.allocate("7", 1)
+    allocation.allocate("8", 2)
+    core_job_map = allocation.core_job_map()
+
+    assert allocation.runs == [["7", 4], ["8", 2]]
+    assert core_job_map == {0: "7", 1: "7", 2: "7", 3: "7", 4: "8", 5: "8"}
+    assert len(core_job_map) == 6 and core_job_map[4] == "8" and 6 not in core_job_map
+    assert list(core_job_map.values()) == ["7"] * 4 + ["8"] * 2
+    assert list(core_job_map.items())[3:5] == [(3, "7"), (4, "8")]
+    assert json.loads(json.dumps({"core_job_map": core_job_map}, default=mapping_to_json)) == {"core_job_map": {"0": "7", "1": "7", "2": "7", "3": "7", "4": "8", "5": "8"}}
+
+
+def test_wide_jobs_take_one_run_per_node():
+    worker_nodes_by_name = dict(("cn%03d" % idx, {"np": "128"}) for idx in range(1, 65))
+    jobs = [("9", 64 * 128, "cn[001-064]", None), ("10", 4, "cn001", None)]
+
+    node_cores = SlurmBatchSystem._map_jobs_to_nodes(jobs, worker_nodes_by_name)
+
+    assert all(allocation.runs == [["9", 128]] for allocation in node_cores.values())
+
+
+def test_squeue_is_parsed_once_into_columns_with_partition_counters(tmp_path):
+    squeue_file = tmp_path / "squeue.txt"
+    squeue_file.write_text("1|alice|R|short*|2|cn01\n\n2|bob|PD|long|4|(Priority)\nbroken line\n3|bob|PD|short|x|(Resources)\n")
+    snapshot = SlurmStatExtractor({}, Options()).extract_squeue(str(squeue_file))
+
+    assert (snapshot.job_ids, snapshot.users, snapshot.partitions, snapshot.cpus) == (["1", "2", "3"], ["alice", "bob", "bob"], ["short", "long", "short"], [2, 4, 1])
+    assert snapshot.state_counts() == {"short": {"R": 1, "PD": 1}, "long": {"PD": 1}}
+    assert list(snapshot.state_counts()) == ["short", "long"]
+    assert list(snapshot.iter_jobs(SlurmBatchSystem.ACTIVE_STATES)) == [("1", 2, "cn01", None)]
+
+
+def test_json_allocation_of_older_and_newer_slurm_releases():
+    slurm_21_08 = {"allocated_nodes": {"1": {"nodename": "cn02", "cpus": 2, "sockets": {"0": {"cores": {"1": "allocated"}}}}, "0": {"nodename": "cn01", "cpus": 1}}}
+    slurm_24_05 = {
+        "nodes": {
+            "count": 1,
+            "list": "cn03",
+            "allocation": [
+                {
+                    "index": 0,
+                    "name": "cn03",
+                    "cpus": {"count": 4, "used": 0},
+                    "sockets": [{"index": 1, "cores": [{"index": 0, "status": ["ALLOCATED"]}, {"index": 1, "status": ["UNALLOCATED"]}]}],
+                }
+            ],
+        }
+    }
+
+    assert SlurmStatExtractor._get_json_allocation(slurm_21_08) == [("cn01", 1, []), ("cn02", 2, [(0, 1)])]
+    assert SlurmStatExtractor._get_json_allocation(slurm_24_05) == [("cn03", 4, [(1, 0)])]
+    assert SlurmStatExtractor._get_json_allocation(None) == []
+
+
+def test_exact_allocations_go_to_their_cores_and_the_others_fill_the_gaps():
+    worker_nodes_by_name = {"cn01": {"np": "16"}}
+    jobs = [("1", 4, "cn01", [("cn01", 4, [(1, 0), (1, 1)])]), ("2", 3, "cn01", None)]
+
+    node_cores = SlurmBatchSystem._map_jobs_to_nodes(jobs, worker_nodes_by_name, {"cn01": (2, 4, 2)})
+
+    assert node_cores["cn01"].used == 7
+    assert node_cores["cn01"].core_job_map() == {0: "2", 1: "2", 2: "2", 8: "1", 9: "1", 10: "1", 11: "1"}
+    assert list(node_cores["cn01"].core_job_map()) == [0, 1, 2, 8, 9, 10, 11]
+    assert 5 not in node_cores["cn01"].core_job_map()
+
+
+def test_iter_json_items_streams_the_array_under_a_key():
+    document = '{"meta": {"plugin": [1, 2]}, "jobs": [{"job_id": 1}, {"job_id": 2}], "errors": []}'
+
+    assert list(serialiser.iter_json_items(io.StringIO(document), "jobs", chunk_size=7)) == [{"job_id": 1}, {"job_id": 2}]
+    assert list(serialiser.iter_json_items(io.StringIO('{"jobs": []}'), "jobs")) == []
+    assert list(serialiser.iter_json_items(io.StringIO('{"nodes": [1]}'), "jobs")) == []
+
+
 @pytest.mark.parametrize(
     "raw_state, mapped",
     (
@@ -0,0 +1,25 @@
+import io
+
+from tools import bench_oar
+
+
+def test_synthetic_cluster_is_read_in_full(tmp_path):
+    bench_oar.write_oar_sourcedir(str(tmp_path), 40, cores=4)
+
+    worker_nodes = bench_oar.read_worker_nodes(str(tmp_path))
+
+    assert [worker_node["domainname"] for worker_node in worker_nodes] == ["bench-%d" % nr for nr in range(1, 41)]
+    assert all(worker_node["np"] == 4 for worker_node in worker_nodes)
+    assert set(worker_nodes[0]["core_job_map"].values()) == {"1000001"}  # a whole-node job
+    assert worker_nodes[7]["state"] == "d" and worker_nodes[7]["core_job_map"] == {}
+    assert worker_nodes[3]["state"] == "%"
+
+
+def test_benchmark_runs_on_small_sizes(tmp_path):
+    out = io.StringIO()
+
+    scan_seconds, read_seconds = bench_oar.run(50, cores=8, repeat=1, out=out, tmpdir=str(tmp_path))
+
+    assert 0 < scan_seconds and 0 < read_seconds
+    assert "resources=400 " in out.getvalue()
+    assert list(tmp_path.iterdir()) == []
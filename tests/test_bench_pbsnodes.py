@@ -0,0 +1,26 @@
+import io
+
+from tools import bench_pbsnodes
+
+
+def test_synthetic_pbsnodes_file_is_parsed_in_full(tmp_path):
+    pbsnodes_file = tmp_path / "pbsnodes.txt"
+    with open(str(pbsnodes_file), "w") as fout:
+        bench_pbsnodes.write_pbsnodes_file(fout, 200, jobs_per_node=8)
+
+    worker_nodes = bench_pbsnodes.parse_worker_nodes(bench_pbsnodes.make_batch_system(str(pbsnodes_file)), str(pbsnodes_file))
+
+    assert len(worker_nodes) == 200
+    assert sum(len(worker_node["core_job_map"]) for worker_node in worker_nodes) == 198 * 8  # two nodes are offline
+    assert set(worker_nodes[9]["core_job_map"].values()) == {"1000072"}  # the array job of node 9
+
+
+def test_benchmark_runs_on_small_sizes(tmp_path):
+    out = io.StringIO()
+
+    results = bench_pbsnodes.run(400, jobs_per_node=4, steps=2, repeat=1, out=out, tmpdir=str(tmp_path))
+
+    assert [nodes for nodes, seconds, peak in results] == [200, 400]
+    assert out.getvalue().count("jobs_per_sec=") == 2
+    assert bench_pbsnodes.peak_ratio(results) > 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,38 @@
+import io
+
+from tools import bench_sge
+
+
+def test_synthetic_sge_file_is_read_in_full(tmp_path):
+    sge_file = tmp_path / "qstat.F.xml.stdout"
+    with open(str(sge_file), "w") as fout:
+        bench_sge.write_sge_file(fout, 60, queues_per_node=2, slots=4, pending=10)
+
+    jobs, queues, worker_nodes = bench_sge.read_sge_file(str(sge_file), "ElementTree")
+
+    assert len(worker_nodes) == 60
+    assert set(qname for worker_node in worker_nodes for qname in worker_node["qname"]) == {"q0", "q1"}
+    assert jobs[3].count("Pending") == 10
+    assert sum(worker_node["existing_busy_cores"] for worker_node in worker_nodes) == len(jobs[0]) - 10
+
+
+def test_benchmark_backends_agree_on_small_sizes(tmp_path):
+    out = io.StringIO()
+
+    timings, consistent = bench_sge.run(40, queues_per_node=2, slots=4, pending=10, repeat=1, out=out, tmpdir=str(tmp_path))
+
+    assert consistent
+    assert sorted(timings) == sorted((backend, mode) for backend in bench_sge.available_backends() for mode in ("one-pass", "tree"))
+    assert out.getvalue().count("seconds=") == len(timings)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_merge_scaling_runs_on_small_sizes(tmp_path):
+    out = io.StringIO()
+
+    results = bench_sge.run_scaling(40, queues_per_node=3, slots=4, steps=2, repeat=1, out=out, tmpdir=str(tmp_path))
+
+    assert [queue_instances for queue_instances, seconds in results] == [60, 120]
+    assert out.getvalue().count("merge_seconds=") == 2
+    assert bench_sge.scaling_ratio(results) > 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,26 @@
+import io
+
+from tools import bench_slurm
+
+
+def test_synthetic_partition_is_mapped_in_full(tmp_path):
+    sinfo_file, squeue_file = tmp_path / "sinfo.txt", tmp_path / "squeue.txt"
+    with open(str(sinfo_file), "w") as sinfo_fout, open(str(squeue_file), "w") as squeue_fout:
+        bench_slurm.write_slurm_files(sinfo_fout, squeue_fout, 40, cpus=16, mpi_nodes=8)
+
+    worker_nodes = bench_slurm.map_worker_nodes(str(squeue_file), str(sinfo_file))
+
+    assert len(worker_nodes) == 40
+    assert all(len(worker_node["core_job_map"]) == 16 for worker_node in worker_nodes)
+    assert set(worker_nodes[0]["core_job_map"].values()) == set(worker_nodes[7]["core_job_map"].values()) == {"100001"}  # the first MPI job
+    assert len(set(worker_nodes[-1]["core_job_map"].values())) == 8  # the small jobs of a shared node
+
+
+def test_benchmark_runs_on_small_sizes(tmp_path):
+    out = io.StringIO()
+
+    map_seconds, read_seconds = bench_slurm.run(80, cpus=8, mpi_nodes=4, repeat=1, out=out, tmpdir=str(tmp_path), pending=50)
+
+    assert 0 < map_seconds and 0 < read_seconds
+    assert "pending=50 " in out.getvalue() and "busy_cores=640 " in out.getvalue()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,28 @@
+import io
+
+from tools import bench_user_job_counts
+
+
+def test_counts_match_a_naive_count_of_the_synthetic_jobs():
+    jobs_dict = bench_user_job_counts.make_jobs_dict(500, users=7, queues=3)
+    jobs = list(jobs_dict.values())
+
+    user_job_counts, user_alljobs_sorted_lot, user_job_per_state_counts = bench_user_job_counts.count_user_jobs(jobs_dict)
+
+    user_names = [job.user_name for job in jobs]
+    assert dict(user_alljobs_sorted_lot) == dict((user, user_names.count(user)) for user in set(user_names))
+    assert [count for user, count in user_alljobs_sorted_lot] == sorted(dict(user_alljobs_sorted_lot).values(), reverse=True)
+    assert sum(user_job_counts.queues.values()) == 500
+    for user, state in set((job.user_name, job.job_state) for job in jobs):
+        expected = sum(1 for job in jobs if (job.user_name, job.job_state) == (user, state))
+        assert user_job_per_state_counts[bench_user_job_counts.STATE_ABBREVS[state]][user] == expected
+
+
+def test_benchmark_runs_on_small_sizes():
+    out = io.StringIO()
+
+    results = bench_user_job_counts.run(2000, users=10, queues=2, steps=3, repeat=1, out=out)
+
+    assert [jobs for jobs, seconds in results] == [500, 1000, 2000]
+    assert out.getvalue().count("ns_per_job=") == 3
+    assert bench_user_job_counts.scaling_ratio(results) > 0
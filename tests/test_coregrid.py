@@ -0,0 +1,61 @@
+import pytest
+
+from qtop_py.coregrid import CoreGrid, CellPalette, CellPaletteFull
+
+
+def make_grid():
+    palette = CellPalette()
+    columns = []
+    for symbols in ("A_#", "BB_", "##_"):
+        column = palette.new_column(3, "#", "Gray_D")
+        for core, symbol in enumerate(symbols):
+            palette.set_cell(column, core, symbol, "Red_L" if symbol.isalpha() else "Gray_D")
+        columns.append(column)
+    return CoreGrid.from_columns(3, palette, columns)
+
+
+def test_core_lines_and_node_columns_read_the_same_cells():
+    grid = make_grid()
+
+    assert [grid.get_line_symbols(core) for core in range(grid.core_count)] == ["AB#", "_B#", "#__"]
+    assert grid.get_line_symbols(1, 1, 10) == "B#"
+    assert [str(cell) for cell in grid.get_node_cells(1, [0, 2])] == ["B", "_"]
+    assert [(str(cell), cell.color) for cell in grid.get_line_cells(0, 0, 2)] == [("A", "Red_L"), ("B", "Red_L")]
+
+
+def test_cells_are_shared_per_symbol_and_color():
+    grid = make_grid()
+
+    assert grid.get_line_cells(1)[1] is grid.get_line_cells(0)[1]
+
+
+def test_set_column_and_count_cells():
+    grid = make_grid()
+    assert grid.count_cells_except(["#", "_"]) == 3
+
+    grid.set_column(2, grid.palette.new_column(3, "C", "Blue"))
+
+    assert grid.get_line_symbols(2) == "#_C"
+    assert grid.count_cells_except(["#", "_"]) == 6
+
+
+def test_palette_runs_out_of_one_byte_codes():
+    palette = CellPalette()
+    for nr in range(CellPalette.MAX_CODES):
+        palette.symbol_code(chr(nr + 0x100))
+
+    with pytest.raises(CellPaletteFull):
+        palette.symbol_code("x")
+
+
+def test_core_line_cells_are_counted_for_any_window():
+    grid = make_grid()
+
+    assert grid.count_line_cells(2, ["#"]) == 1
+    assert grid.count_line_cells(2, ["#", "_"], 1, 10) == 2
+    assert grid.count_line_cells(1, ["_", "?"], 2, 1) == 0
+    assert grid.get_line_length(1, 10) == 2
+
+    grid.set_column(0, grid.palette.new_column(3, "_", "Gray_D"))
+
+    assert grid.count_line_cells(2, ["#"]) == 0
@@ -0,0 +1,81 @@
+import json
+from collections import Counter
+
+from qtop_py.jobtable import JobDoc, JobTable, Symbols
+from qtop_py.qtop import Document, DocumentDiff, mapping_to_json
+
+
+def make_table():
+    return JobTable.from_columns(["1", "2[]", "3"], ["alice", "bob", "alice"], ["R", "Q", "R"], ["q1", "q2", "q1"])
+
+
+def test_table_reads_as_a_mapping_of_job_docs():
+    table = make_table()
+
+    assert list(table) == ["1", "2", "3"]
+    assert table["2"] == JobDoc("bob", "Q", "q2")
+    assert "2[]" not in table
+    assert table == {"1": ("alice", "R", "q1"), "2": ("bob", "Q", "q2"), "3": ("alice", "R", "q1")}
+    assert table.users.values == ["alice", "bob"]
+    assert list(table.user_codes) == [0, 1, 0]
+
+
+def test_job_reported_twice_keeps_its_row_with_the_last_values():
+    table = JobTable.from_columns(["1", "2", "1"], ["alice", "bob", "carol"], ["R", "Q", "Q"], ["q1", "q2", "q1"])
+
+    assert list(table) == ["1", "2"]
+    assert table["1"] == JobDoc("carol", "Q", "q1")
+    assert table.user_names() == ["carol", "bob"]
+
+
+def test_lookups_accept_job_array_ids():
+    table = make_table()
+
+    assert table.user_queue_ids("2[]") == (1, 1)
+    assert table.user_ids_of(["2[]", "3", "9999"]) == set([1, 0])
+
+
+def test_tables_sharing_symbols_share_ids():
+    symbols = Symbols()
+    old = JobTable.from_columns(["1"], ["bob"], ["R"], ["q1"], symbols)
+    new = JobTable.from_mapping(make_table(), symbols)
+
+    assert new.symbols is symbols
+    assert new.user_queue_ids("2")[0] == old.user_queue_ids("1")[0] == symbols.users.intern("bob")
+    assert JobTable.from_mapping(new, symbols) is new
+    assert new.diff(old) == (set(["2", "3"]), set(), set(["1"]))
+
+
+def test_worker_node_names_are_interned():
+    symbols = Symbols()
+    old_nodes = symbols.intern_worker_nodes([{"domainname": "".join(["wn", "01"])}])
+    new_nodes = symbols.intern_worker_nodes([{"domainname": "".join(["wn", "01"])}, {"domainname": "wn02"}])
+
+    assert new_nodes[0]["domainname"] is old_nodes[0]["domainname"]
+    assert symbols.hosts.values == ["wn01", "wn02"]
+
+
+def test_triplets_are_counted_on_the_codes():
+    table = make_table()
+
+    assert table.count_triplets() == Counter(zip(table.user_names(), table.job_states(), table.job_queues()))
+    assert list(table.count_triplets()) == [("alice", "R", "q1"), ("bob", "Q", "q2")]
+
+
+def test_diff_matches_the_one_of_plain_mappings():
+    old = make_table()
+    new = JobTable.from_columns(["4", "3", "2[]"], ["dan", "alice", "bob"], ["R", "R", "R"], ["q1", "q1", "q2"])
+
+    assert new.diff(old) == DocumentDiff._diff_mappings(dict(old.items()), dict(new.items())) == (set(["4"]), set(["1"]), set(["2"]))
+
+
+def test_saved_document_comes_back_as_a_job_table(tmp_path):
+    document = Document([], make_table(), {}, 2, 1)
+    saved = tmp_path / "document.json"
+    document.save(str(saved))
+
+    loaded = Document.from_json(json.loads(saved.read_text()))
+
+    assert isinstance(loaded.jobs_dict, JobTable)
+    assert loaded.jobs_dict == document.jobs_dict
+    assert json.loads(json.dumps(loaded, default=mapping_to_json)) == json.loads(saved.read_text())
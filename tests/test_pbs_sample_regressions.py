@@ -55,7 +55,7 @@ def test_decide_remapping_handles_mixed_numeric_and_named_nodes():
 def test_valid_corejobs_skips_jobs_missing_from_qstat():
     occupancy = qtop.WNOccupancy.__new__(qtop.WNOccupancy)
 
-    assert list(occupancy._valid_corejobs({"0": "9999"}, {})) == []
+    assert list(occupancy._valid_corejobs({"0": "9999"}, qtop.JobTable())) == []
 
 
 def test_worker_node_name_regex_accepts_underscores():
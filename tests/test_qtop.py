@@ -13,11 +13,14 @@ import pytest
 import re
 import datetime
 import sys
+import threading
 from pathlib import Path
 from types import SimpleNamespace
 from qtop_py import qtop as qtop_module
 from qtop_py import utils as qtop_utils
 from qtop_py.constants import SYMBOL_LONG_TAIL_USER, SYMBOL_UNKNOWN_NODE_STATE
+from qtop_py.coregrid import CellPalette, CoreGrid
+from qtop_py.serialiser import GenericBatchSystem
 from qtop_py.qtop import (
     WNOccupancy,
     decide_batch_system,
@@ -234,6 +237,23 @@ def test_create_user_job_counts_raises_jobnotfound():  # user_names, job_states,
         }
 
 
+def test_user_job_counts_come_out_of_a_single_aggregation():
+    user_job_counts = WNOccupancy._split_user_job_counts(qtop_module.Counter([("ann", "R", "q1"), ("ann", "Q", "q1"), ("bob", "R", "q2"), ("ann", "R", "q2")]))
+
+    assert user_job_counts.totals == {"ann": 3, "bob": 1}
+    assert user_job_counts.states == {("ann", "R"): 2, ("ann", "Q"): 1, ("bob", "R"): 1}
+    assert user_job_counts.queues == {("ann", "q1"): 2, ("ann", "q2"): 1, ("bob", "q2"): 1}
+
+
+def test_user_lot_orders_ties_like_the_accounts_table():
+    class Document(object):
+        jobs_dict = {}
+
+    wns_occupancy = WNOccupancy(None, None, Document(), None, None)
+
+    assert wns_occupancy._produce_user_lot({"ann": 2, "bob": 5, "cid": 2, "dan": 1}) == [("bob", 5), ("cid", 2), ("ann", 2), ("dan", 1)]
+
+
 @pytest.mark.parametrize("switch", ("-4", "--accounttotals"))
 def test_account_totals_cli_switch(monkeypatch, switch):
     monkeypatch.setattr(sys, "argv", ["qtop", switch])
@@ -401,6 +421,503 @@ def test_long_tail_symbol_is_not_colored_like_a_single_user():
     assert pattern[SYMBOL_SEPARATOR] == "account_not_colored"
 
 
+def test_account_pattern_matcher_remembers_accounts(monkeypatch):
+    matcher = qtop_module.AccountPatternMatcher({"alice": "Red_L", "^bo": "Blue"})
+    assert matcher.get_pattern("alice01") == "alice"
+    assert matcher.get_pattern("bob") == "^bo"
+    assert matcher.get_pattern("carol") == "NoPattern"
+
+    monkeypatch.setattr(matcher, "_compiled_patterns", [])
+    assert matcher.get_pattern("bob") == "^bo"
+
+
+def refresh_engine_args(**kwargs):
+    options = dict(CONFFILE=None, OPTION=[], TRANSPOSE=False, REM_EMPTY_CORELINES=1)
+    options.update(kwargs)
+    return SimpleNamespace(**options)
+
+
+def test_refresh_engine_reloads_config_only_when_conf_files_change(monkeypatch, tmp_path):
+    user_conf = tmp_path / "user" / qtop_module.QTOPCONF_YAML
+    user_conf.parent.mkdir()
+    user_conf.write_text("rem_empty_corelines: 0\n")
+    monkeypatch.setattr(qtop_module, "QTOPPATH", str(tmp_path), raising=False)
+    monkeypatch.setattr(qtop_module, "SYSTEMCONFDIR", str(tmp_path / "etc"))
+    monkeypatch.setattr(qtop_module, "USERPATH", str(user_conf.parent))
+    loads = []
+
+    def fake_load_yaml_config():
+        loads.append(1)
+        return {"rem_empty_corelines": "0"}, {"alice": "Red_L"}, {}
+
+    monkeypatch.setattr(qtop_module, "load_yaml_config", fake_load_yaml_config)
+    engine = qtop_module.RefreshEngine(refresh_engine_args(), {})
+
+    config, _, _ = engine.load_config()
+    assert engine.load_config()[0] is config
+    assert config["rem_empty_corelines"] == 1
+    assert len(loads) == 1
+
+    user_conf.write_text("rem_empty_corelines: 1\n")
+    engine.load_config()
+    assert len(loads) == 2
+
+
+def test_refresh_engine_reparses_only_changed_scheduler_output(monkeypatch, tmp_path):
+    qstat = tmp_path / "qstat.txt"
+    qstat.write_text("1 alice R q1\n")
+    parses = []
+
+    class FakeBatchSystem(GenericBatchSystem):
+        snapshot_from_output_files = True
+
+        def __init__(self, scheduler_output_filenames, config, options):
+            parses.append(scheduler_output_filenames)
+
+        def get_jobs_info(self):
+            return ["1"], ["alice"], ["R"], ["q1"]
+
+        def get_queues_info(self):
+            return 1, 0, [{"queue_name": "q1", "lm": 0, "queued": 0, "run": 1, "state": "Q"}]
+
+        def get_worker_nodes(self, job_ids, job_queues, options):
+            return []
+
+    monkeypatch.setattr(qtop_module, "dynamic_config", {"force_names": 0}, raising=False)
+    viewport = SimpleNamespace(get_term_size=lambda: (40, 80))
+    engine = qtop_module.RefreshEngine(refresh_engine_args(), {"fake": FakeBatchSystem})
+    filenames = {"qstat_file": str(qstat)}
+
+    document = engine.refresh("fake", filenames, viewport)
+    assert engine.model_changed
+    assert document.jobs_dict["1"].user_name == "alice"
+
+    qstat.write_text("1 alice R q1\n")  # rewritten with identical contents, as a new scheduler run would do
+    assert engine.refresh("fake", filenames, viewport) is document
+    assert not engine.model_changed
+
+    qtop_module.dynamic_config["transpose_wn_matrices"] = False
+    engine.refresh("fake", filenames, viewport)
+    assert engine.model_changed
+
+    qstat.write_text("1 alice R q1\n2 bob Q q1\n")
+    assert engine.refresh("fake", filenames, viewport).jobs_dict.symbols is document.jobs_dict.symbols is engine.symbols
+    assert engine.model_changed
+    assert len(parses) == 3
+
+    FakeBatchSystem.snapshot_from_output_files = False
+    engine.refresh("fake", filenames, viewport)
+    assert engine.model_changed
+
+
+def test_key_presses_only_reanalyse_when_runtime_options_change(monkeypatch, tmp_path):
+    qstat = tmp_path / "qstat.txt"
+    qstat.write_text("1 alice R q1\n")
+    parses = []
+
+    class FakeBatchSystem(GenericBatchSystem):
+        snapshot_from_output_files = True
+
+        def __init__(self, scheduler_output_filenames, config, options):
+            parses.append(scheduler_output_filenames)
+
+        def get_jobs_info(self):
+            return ["1"], ["alice"], ["R"], ["q1"]
+
+        def get_queues_info(self):
+            return 1, 0, []
+
+        def get_worker_nodes(self, job_ids, job_queues, options):
+            return []
+
+    monkeypatch.setattr(qtop_module, "dynamic_config", {"force_names": 0}, raising=False)
+    term_size = [40, 80]
+    viewport = SimpleNamespace(get_term_size=lambda: tuple(term_size))
+    engine = qtop_module.RefreshEngine(refresh_engine_args(), {"fake": FakeBatchSystem})
+    filenames = {"qstat_file": str(qstat)}
+    document = engine.refresh("fake", filenames, viewport)
+
+    assert not engine.update_context(viewport)
+
+    qtop_module.dynamic_config["core_coloring"] = "user_to_color"
+    assert engine.update_context(viewport)
+    assert engine.model_changed and engine.diff is None
+    assert not engine.update_context(viewport)
+
+    term_size[1] = 120
+    assert engine.update_context(viewport)
+
+    assert engine.refresh("fake", filenames, viewport) is document  # the next refresh doesn't reparse for the options already analysed
+    assert len(parses) == 1
+
+
+def test_attach_displays_the_published_snapshot(monkeypatch, tmp_path):
+    JobDoc = qtop_module.JobDoc
+    worker_nodes = [{"domainname": "wn01", "np": "2", "state": "-", "qname": ["q1"], "core_job_map": {"0": "1"}}]
+    document = qtop_module.Document(worker_nodes, {"1": JobDoc("alice", "R", "q1")}, {"q1": qtop_module.QDoc("0", 0, 1, "Q")}, 1, 0)
+    collector_file = tmp_path / "shared" / "qtop_collector.json"
+    qtop_module.publish_snapshot(str(collector_file), "pbs", ["1"], document)
+
+    assert oct(collector_file.stat().st_mode & 0o777) == oct(0o644)
+    assert qtop_module.load_published_snapshot(str(collector_file)) == ("pbs", ["1"], document)
+
+    monkeypatch.setattr(qtop_module, "dynamic_config", {"force_names": 0}, raising=False)
+    viewport = SimpleNamespace(get_term_size=lambda: (40, 80))
+    engine = qtop_module.RefreshEngine(refresh_engine_args(), {})
+    scheduler, attached = engine.attach(str(collector_file), viewport)
+    assert (scheduler, attached, engine.job_ids) == ("pbs", document, ["1"])
+    assert engine.model_changed
+
+    assert engine.attach(str(collector_file), viewport)[1] is attached
+    assert not engine.model_changed
+
+    engine.wns_occupancy = object()  # as analysed after the first attach
+    qtop_module.publish_snapshot(str(collector_file), "pbs", ["1", "2"], document._replace(jobs_dict=dict(document.jobs_dict, **{"2": JobDoc("bob", "Q", "q1")})))
+    engine.attach(str(collector_file), viewport)
+    assert engine.model_changed
+    assert engine.diff.added_jobs == {"2"}
+
+    with pytest.raises(qtop_module.fileutils.FileNotFound):
+        engine.attach(str(tmp_path / "missing.json"), viewport)
+
+
+def test_content_fingerprint_skips_hashing_untouched_files(tmp_path, monkeypatch):
+    path = tmp_path / "pbsnodes.txt"
+    path.write_text("node1\n")
+    fingerprint = qtop_module.fileutils.get_content_fingerprint(str(path))
+
+    monkeypatch.setattr(qtop_module.fileutils.hashlib, "sha1", None)
+    assert qtop_module.fileutils.get_content_fingerprint(str(path), fingerprint) is fingerprint
+    assert qtop_module.fileutils.get_content_fingerprint(str(tmp_path / "missing.txt")) == (None, None)
+
+
+def test_document_diff_reports_added_removed_and_changed_entries():
+    JobDoc = qtop_module.namedtuple("JobDoc", ["user_name", "job_state", "job_queue"])
+    old = qtop_module.Document(
+        [{"domainname": "wn01", "state": "-"}, {"domainname": "wn02", "state": "-"}],
+        {"1": JobDoc("alice", "R", "q1"), "2": JobDoc("bob", "Q", "q1")},
+        {"q1": ("0", 1, 1, "E")},
+        1,
+        1,
+    )
+    new = qtop_module.Document(
+        [{"domainname": "wn02", "state": "d"}, {"domainname": "wn03", "state": "-"}],
+        {"1": JobDoc("alice", "R", "q1"), "2": JobDoc("bob", "R", "q1"), "3": JobDoc("carol", "Q", "q2")},
+        {"q1": ("0", 0, 2, "E"), "q2": ("0", 1, 0, "E")},
+        2,
+        1,
+    )
+
+    diff = qtop_module.DocumentDiff(old, new)
+
+    assert diff.nodes_comparable
+    assert (diff.added_nodes, diff.removed_nodes, diff.changed_nodes) == ({"wn03"}, {"wn01"}, {"wn02"})
+    assert (diff.added_jobs, diff.removed_jobs, diff.changed_jobs) == ({"3"}, set(), {"2"})
+    assert (diff.added_queues, diff.changed_queues) == ({"q2"}, {"q1"})
+    assert not qtop_module.DocumentDiff(old, new._replace(worker_nodes=new.worker_nodes * 2)).nodes_comparable
+
+
+@pytest.fixture
+def occupancy_globals(monkeypatch, tmp_path):
+    monkeypatch.setattr(qtop_module, "QTOPPATH", str(Path(__file__).resolve().parents[1]), raising=False)
+    monkeypatch.setattr(qtop_module, "SYSTEMCONFDIR", str(tmp_path / "etc"))
+    monkeypatch.setattr(qtop_module, "USERPATH", str(tmp_path / "user"))
+    monkeypatch.setattr(qtop_module, "CURPATH", str(tmp_path), raising=False)
+    args = SimpleNamespace(CONFFILE=None, OPTION=[], TRANSPOSE=False, REM_EMPTY_CORELINES=0, ANONYMIZE=False, BLINDREMAP=False, REMAP=False, NOMASKING=False)
+    monkeypatch.setattr(qtop_module, "args", args, raising=False)
+    monkeypatch.setattr(qtop_module.fileutils, "mkdir_p", lambda path: None)
+    config, user_to_color, nodestate_to_color = qtop_module.load_yaml_config()
+    viewport = qtop_module.Viewport()
+    viewport.set_term_size(40, 120)
+    for name, value in (("config", config), ("user_to_color", user_to_color), ("dynamic_config", {"force_names": 0}), ("scheduler", "pbs"), ("viewport", viewport)):
+        monkeypatch.setattr(qtop_module, name, value, raising=False)
+    return args, config, user_to_color, nodestate_to_color
+
+
+def build_occupancy(occupancy_globals, document, previous=None, diff=None):
+    args, config, user_to_color, nodestate_to_color = occupancy_globals
+    worker_nodes = qtop_module.keep_queue_initials_only_and_colorize(document.worker_nodes, qtop_module.queue_to_color)
+    worker_nodes = qtop_module.colorize_nodestate(worker_nodes, nodestate_to_color, qtop_module.colorize)
+    qtop_module.cluster = cluster = qtop_module.Cluster(document, worker_nodes, qtop_module.WNFilter, config, args)
+    return WNOccupancy(cluster, config, document, user_to_color, list(document.jobs_dict), previous=previous, diff=diff)
+
+
+def occupancy_snapshot(wns_occupancy):
+    core_grid = wns_occupancy.core_grid
+    core_lines = [[(str(cell), cell.color) for cell in core_grid.get_line_cells(core)] for core in range(core_grid.core_count)]
+    account_rows = [[str(item) for item in row] for row in wns_occupancy.account_jobs_table]
+    return core_lines, account_rows, dict(wns_occupancy.user_machine_use)
+
+
+def test_patched_occupancy_matches_full_recalculation(monkeypatch, occupancy_globals):
+    JobDoc = qtop_module.namedtuple("JobDoc", ["user_name", "job_state", "job_queue"])
+
+    def node(nr, state, core_job_map):
+        return {"domainname": "wn%02d.example.org" % nr, "np": "4", "state": state, "qname": ["q1"], "core_job_map": core_job_map}
+
+    job_tuples = [("1", "alice", "R"), ("2", "bob", "R"), ("3", "bob", "R"), ("4", "carol", "Q"), ("5", "carol", "Q"), ("6", "carol", "Q")]
+    jobs = dict((job_id, JobDoc(user, state, "q1")) for job_id, user, state in job_tuples)
+    old = qtop_module.Document([node(1, "-", {"0": "1", "1": "2"}), node(2, "-", {"0": "3"}), node(3, "-", {})], jobs, {}, 3, 3)
+    new_jobs = dict(jobs, **{"4": JobDoc("carol", "R", "q1")})
+    new = qtop_module.Document([node(1, "-", {"0": "1", "1": "2"}), node(2, "-", {"0": "3"}), node(3, "b", {"2": "4"})], new_jobs, {}, 4, 2)
+
+    previous = build_occupancy(occupancy_globals, old)
+    calculated_columns = []
+    calc_node_column = WNOccupancy._calc_node_column
+    monkeypatch.setattr(WNOccupancy, "_calc_node_column", lambda self, *args: calculated_columns.append(args[0]) or calc_node_column(self, *args))
+
+    patched = build_occupancy(occupancy_globals, new, previous=previous, diff=qtop_module.DocumentDiff(old, new))
+    patched_columns = len(calculated_columns)
+    full = build_occupancy(occupancy_globals, new)
+
+    assert occupancy_snapshot(patched) == occupancy_snapshot(full)
+    assert patched.user_machine_use == {"alice": 1, "bob": 2, "carol": 1}
+    assert patched_columns == 1
+    assert patched.core_grid is previous.core_grid
+
+
+def test_full_cell_palette_is_replaced_instead_of_carried_over(occupancy_globals):
+    JobDoc = qtop_module.JobDoc
+
+    def node(nr, core_job_map):
+        return {"domainname": "wn%02d.example.org" % nr, "np": "4", "state": "-", "qname": ["q1"], "core_job_map": core_job_map}
+
+    jobs = dict((job_id, JobDoc(user, "R", "q1")) for job_id, user in (("1", "alice"), ("2", "alice"), ("3", "alice"), ("4", "bob"), ("5", "bob")))
+    old = qtop_module.Document([node(1, {"0": "1", "1": "2", "2": "3"}), node(2, {"0": "4", "1": "5"})], jobs, {}, 5, 0)
+    new_jobs = dict(jobs, **{"6": JobDoc("carol", "R", "q1")})  # whose id was never used before
+    new = qtop_module.Document([node(1, {"0": "1", "1": "2", "2": "3"}), node(2, {"0": "4", "1": "5", "2": "6"})], new_jobs, {}, 6, 0)
+
+    previous = build_occupancy(occupancy_globals, old)
+    palette = previous.cell_palette
+    for nr in range(CellPalette.MAX_CODES - len(palette.symbols)):  # the symbols gathered over a long session
+        palette.symbol_code(chr(0x100 + nr))
+
+    patched = build_occupancy(occupancy_globals, new, previous=previous, diff=qtop_module.DocumentDiff(old, new))
+
+    assert patched.cell_palette is not palette
+    assert len(patched.cell_palette.symbols) < CellPalette.MAX_CODES
+    assert occupancy_snapshot(patched) == occupancy_snapshot(build_occupancy(occupancy_globals, new))
+
+
+@pytest.mark.parametrize(
+    "highlight_rules, expected",
+    (
+        ([], [True, True, True, True]),
+        ([{"or_include_user_pat": ["^al"]}, {"or_include_queue": ["^long"]}], [True, True, True, False]),
+        ([{"include_user_pat": ["^al"]}, {"include_queue": ["^long"]}], [True, False, False, False]),
+        ([{"or_include_user_id": ["1"]}], [False, False, True, True]),
+        ([{"or_include_user_pat": ["x*"]}], [False, False, False, False]),  # empty matches don't count
+        ([{"or_include_user_id": ["9"]}, {"or_include_user_pat": []}], [False, False, False, False]),
+    ),
+)
+def test_highlight_matcher_decides_per_user_and_queue(highlight_rules, expected):
+    matcher = qtop_module.HighlightMatcher(highlight_rules, {"0": "alice", "1": "bob"})
+
+    user_queues = [("alice", "long"), ("alice", "short"), ("bob", "long"), ("bob", "short")]
+    assert [matcher.is_highlighted(user, queue) for user, queue in user_queues] == expected
+
+
+@pytest.fixture
+def batch_command_globals(monkeypatch):
+    stopped = []
+    monkeypatch.setattr(qtop_module, "web", SimpleNamespace(stop=lambda: stopped.append(True)), raising=False)
+    monkeypatch.setattr(qtop_module, "scheduler", "pbs", raising=False)
+    return stopped
+
+
+def test_batch_commands_run_concurrently(tmp_path, batch_command_globals):
+    commands = dict(("file%s" % nr, "sleep 0.5") for nr in range(3))
+    commands["echo_file"] = "echo hello"
+    filenames = dict((_file, str(tmp_path / ("%s.txt" % _file))) for _file in commands)
+
+    start = qtop_module.time.time()
+    saved = qtop_module.execute_shell_batch_commands(commands, dict(filenames), str(tmp_path), timeout=10)
+
+    assert qtop_module.time.time() - start < 1.4
+    assert saved == filenames
+    assert (tmp_path / "echo_file.txt").read_text() == "hello\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted("%s.txt" % _file for _file in commands)
+
+
+def test_batch_commands_are_cancelled_on_timeout(tmp_path, batch_command_globals):
+    commands = {"slow_file": "sleep 30", "fast_file": "echo hello"}
+    filenames = dict((_file, str(tmp_path / ("%s.txt" % _file))) for _file in commands)
+
+    start = qtop_module.time.time()
+    with pytest.raises(SystemExit):
+        qtop_module.execute_shell_batch_commands(commands, filenames, str(tmp_path), timeout=0.3)
+
+    assert qtop_module.time.time() - start < 5
+    assert batch_command_globals == [True]
+    assert list(tmp_path.iterdir()) == []  # neither the temporary files nor a partial snapshot are left behind
+
+
+def shared_snapshot_setup(monkeypatch, tmp_path, ttl):
+    script = tmp_path / "nodes.sh"
+    script.write_text("echo run >> %s\necho nodes\n" % (tmp_path / "runs.txt"))
+    config = {
+        "schedulers": {"pbs": {"pbsnodes_file": "%%(savepath)s/pbsnodes_a%%(pid)s.txt, sh %s" % script}},
+        "savepath": str(tmp_path),
+        "shared_snapshot_dir": str(tmp_path / "shared"),
+        "shared_snapshot_ttl": str(ttl),
+    }
+    monkeypatch.setattr(qtop_module, "args", SimpleNamespace(SOURCEDIR=None, workdir=str(tmp_path / "private")), raising=False)
+    (tmp_path / "private").mkdir()
+    (tmp_path / "shared").mkdir()
+    return qtop_module.args, config
+
+
+def test_shared_snapshot_is_reused_within_its_ttl(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+
+    first = qtop_module.fetch_scheduler_files(args, config)
+    second = qtop_module.fetch_scheduler_files(args, config)
+
+    assert first == second == {"pbsnodes_file": str(tmp_path / "private" / ("pbsnodes_a_%s.txt" % qtop_module.os.getpid()))}
+    assert open(first["pbsnodes_file"]).read() == "nodes\n"
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+
+def test_concurrent_instances_query_the_scheduler_once(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    (tmp_path / "nodes.sh").write_text("sleep 0.3\necho run >> %s\necho nodes\n" % (tmp_path / "runs.txt"))
+
+    instances = [threading.Thread(target=qtop_module.fetch_scheduler_files, args=(args, config)) for _ in range(4)]
+    for instance in instances:
+        instance.start()
+    for instance in instances:
+        instance.join()
+
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+
+def test_shared_snapshot_is_refreshed_once_stale(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=0.01)
+
+    qtop_module.fetch_scheduler_files(args, config)
+    qtop_module.time.sleep(0.05)
+    qtop_module.fetch_scheduler_files(args, config)
+
+    assert (tmp_path / "runs.txt").read_text() == "run\nrun\n"
+
+
+def test_unusable_shared_snapshot_dir_falls_back_to_private_commands(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    config["shared_snapshot_dir"] = str(tmp_path / "runs.txt")  # a file
+    (tmp_path / "runs.txt").write_text("")
+
+    filenames = qtop_module.fetch_scheduler_files(args, config)
+
+    assert open(filenames["pbsnodes_file"]).read() == "nodes\n"
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+
+def make_writable_by_all(snapshot_dir):
+    snapshot_dir.chmod(0o777)
+
+
+def replace_with_symlink(snapshot_dir):
+    snapshot_dir.rename(snapshot_dir.with_name("elsewhere"))
+    snapshot_dir.symlink_to(snapshot_dir.with_name("elsewhere"))
+
+
+def give_to_someone_else(snapshot_dir):
+    qtop_module.os.chown(str(snapshot_dir), qtop_module.os.geteuid() + 1, -1)
+
+
+@pytest.mark.parametrize("plant", [make_writable_by_all, replace_with_symlink, give_to_someone_else])
+def test_untrusted_shared_snapshot_dir_falls_back_to_private_commands(monkeypatch, tmp_path, batch_command_globals, plant):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    qtop_module.fetch_scheduler_files(args, config)
+    (snapshot_dir,) = (tmp_path / "shared").iterdir()
+    (snapshot_dir / "pbsnodes_a.txt").write_text("planted\n")
+    try:
+        plant(snapshot_dir)
+    except PermissionError:
+        pytest.skip("only root can give a directory away")
+
+    filenames = qtop_module.fetch_scheduler_files(args, config)
+
+    assert open(filenames["pbsnodes_file"]).read() == "nodes\n"
+    assert (tmp_path / "runs.txt").read_text() == "run\nrun\n"
+
+
+def test_shared_snapshot_lock_symlink_is_not_followed(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    qtop_module.fetch_scheduler_files(args, config)
+    (snapshot_dir,) = (tmp_path / "shared").iterdir()
+    (snapshot_dir / ".lock").unlink()
+    (snapshot_dir / ".lock").symlink_to(tmp_path / "victim.txt")
+
+    filenames = qtop_module.fetch_scheduler_files(args, config)
+
+    assert open(filenames["pbsnodes_file"]).read() == "nodes\n"
+    assert not (tmp_path / "victim.txt").exists()
+
+
+def test_new_shared_snapshot_dir_is_only_writable_by_its_owner(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    (tmp_path / "shared").chmod(0o1777)
+
+    qtop_module.fetch_scheduler_files(args, config)
+
+    (snapshot_dir,) = (tmp_path / "shared").iterdir()
+    assert snapshot_dir.stat().st_mode & 0o7777 == 0o755
+
+
+def test_shared_snapshot_dir_of_a_group_is_group_writable(monkeypatch, tmp_path, batch_command_globals):
+    args, config = shared_snapshot_setup(monkeypatch, tmp_path, ttl=60)
+    config["shared_snapshot_group"] = qtop_module.grp.getgrgid(qtop_module.os.getegid()).gr_name
+
+    qtop_module.fetch_scheduler_files(args, config)
+    qtop_module.fetch_scheduler_files(args, config)
+
+    (snapshot_dir,) = (tmp_path / "shared").iterdir()
+    assert snapshot_dir.stat().st_mode & 0o7777 == 0o2775
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+
+def test_colorizing_worker_nodes_leaves_the_document_untouched():
+    worker_nodes = [{"domainname": "wn01", "state": "-", "qname": ["q1"]}]
+
+    colored = qtop_module.colorize_nodestate(qtop_module.keep_queue_initials_only_and_colorize(worker_nodes, {}), {}, qtop_module.colorize)
+
+    assert worker_nodes == [{"domainname": "wn01", "state": "-", "qname": ["q1"]}]
+    assert [str(queue) for queue in colored[0]["qname"]] == ["q1"]
+
+
+def test_colorized_queues_and_states_are_shared_between_nodes():
+    worker_nodes = [{"domainname": "wn%02d" % nr, "state": "-", "qname": ["q1", "q2"]} for nr in range(3)]
+
+    colored = qtop_module.colorize_nodestate(qtop_module.keep_queue_initials_only_and_colorize(worker_nodes, {}), {}, qtop_module.colorize)
+
+    assert colored[0]["qname"][1] is colored[2]["qname"][1]
+    assert colored[0]["state"] is colored[1]["state"]
+
+
+@pytest.mark.parametrize("remove_corelines", (1, 2, 3))
+@pytest.mark.parametrize("print_char_start, print_char_stop", ((0, 4), (1, 3), (2, 6), (4, 4), (5, 9)))
+def test_corelines_are_removed_on_their_cell_counts(remove_corelines, print_char_start, print_char_stop):
+    palette = CellPalette()
+    columns = []
+    for symbols in ("A_##", "__##", "_B_#", "___#"):
+        column = palette.new_column(4, "#", "Gray_D")
+        for core, symbol in enumerate(symbols):
+            palette.set_cell(column, core, symbol, "Gray_D")
+        columns.append(column)
+    grid = CoreGrid.from_columns(4, palette, columns)
+
+    def is_removable(core_x_str):  # the string checks the counts replace
+        delta = print_char_stop - print_char_start
+        not_there = remove_corelines == 2 and "#" * len(core_x_str) == core_x_str
+        unused = remove_corelines == 3 and set(core_x_str) <= set("_#") and delta == len(core_x_str)
+        return not_there or unused
+
+    gauged = qtop_module.gauge_core_vectors(grid, print_char_start, print_char_stop, WNOccupancy.coreline_notthere_or_unused, "#", remove_corelines)
+
+    assert [removable for ind, removable in gauged] == [is_removable(grid.get_line_symbols(core, print_char_start, print_char_stop)) for core in range(4)]
+
+
 @pytest.mark.parametrize(
     "cmdline_switch, env_var, config_file_batch_option, returned_scheduler",
     (
@@ -0,0 +1,28 @@
+from qtop_py.colormap import color_to_code
+from qtop_py.ui.ansi import RESET, CellEscapes, EscapeTable, join_runs
+
+
+def test_escape_sequences_are_made_once_per_color_triplet():
+    escapes = EscapeTable(color_to_code)
+
+    assert escapes.get("Red_L") == "\033[1;31m"
+    assert escapes.get("Red", "BlueBG", bold=True) == "\033[1;31;44m"
+    assert escapes.get("Red_L") is escapes.get("Red_L")
+
+
+def test_cell_colors_fall_back_like_colorize():
+    escapes = CellEscapes(EscapeTable(color_to_code), "White")
+
+    assert escapes["Red_L"] == "\033[1;31m"
+    assert escapes[""] == escapes["White"] == "\033[1;37m"
+    assert escapes["NoSuchColor"] == ""
+    assert CellEscapes(EscapeTable(color_to_code), "White", enabled=False)["Red_L"] == ""
+
+
+def test_runs_of_the_same_color_share_one_escape_sequence():
+    red, white = "\033[1;31m", "\033[1;37m"
+    cells = [("_", white), ("_", white), ("3", red), ("3", red), ("_", white), ("=Core0", "")]
+
+    assert join_runs(cells) == white + "__" + RESET + red + "33" + RESET + white + "_" + RESET + "=Core0"
+    assert join_runs([("a", ""), ("b", "")]) == "ab"
+    assert join_runs([]) == ""
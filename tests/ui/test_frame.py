@@ -0,0 +1,98 @@
+import shutil
+import subprocess
+
+import pytest
+
+from qtop_py.ui.frame import CLEAR_SCREEN, Frame, Screen, write_frame
+from qtop_py.ui.viewport import Viewport
+
+TEXT = "".join("\x1b[1;37m%04d|\x1b[0;m%s\n" % (nr, "_" * (nr % 7)) for nr in range(1, 31))
+
+
+def test_frame_keeps_lines_and_visible_widths():
+    frame = Frame.from_text(TEXT)
+
+    assert frame.height == 30
+    assert frame.lines[2] == "\x1b[1;37m0003|\x1b[0;m___"
+    assert frame.widths[2] == 8
+    assert frame.width == 11
+    assert frame.get_text() == TEXT
+    assert Frame.from_text("no newline at the end").height == 1
+    assert Frame([" padded "]).widths == [8]
+    assert Frame([" padded "]).width == 6
+
+
+@pytest.mark.skipif(not (shutil.which("tail") and shutil.which("head")), reason="needs tail and head")
+@pytest.mark.parametrize("v_start", (0, 1, 5, 28))
+def test_view_is_cut_like_tail_and_head(tmp_path, v_start):
+    output = tmp_path / "qtop_fullview.out"
+    output.write_text(TEXT)
+    viewport = Viewport()
+    viewport.set_term_size(10, 80)
+    viewport.max_height = 30
+    viewport.v_start = v_start
+    tail = subprocess.Popen(["tail", "-n+%d" % viewport.v_start, str(output)], stdout=subprocess.PIPE)
+    head = subprocess.check_output(["head", "-n%d" % (viewport.v_term_size - 1)], stdin=tail.stdout)
+    tail.wait()
+
+    assert viewport.get_view(Frame.from_text(TEXT)).get_text() == head.decode()
+
+
+class Terminal(object):
+    def __init__(self):
+        self.writes = []
+        self.flushed = False
+
+    def write(self, text):
+        self.writes.append(text)
+
+    def flush(self):
+        self.flushed = True
+
+
+def test_frame_is_written_at_once():
+    terminal = Terminal()
+    write_frame(terminal, "frame\n", clear_screen=True)
+
+    assert terminal.writes == [CLEAR_SCREEN + "frame\n"]
+    assert terminal.flushed
+
+
+def test_screen_repaints_only_the_lines_that_changed():
+    terminal = Terminal()
+    screen = Screen()
+
+    assert screen.paint(terminal, Frame(["header", "wn01 __", "wn02 __"]), (24, 80)) == 3
+    assert screen.paint(terminal, Frame(["header", "wn01 _A", "wn02 __"]), (24, 80)) == 1
+    assert screen.paint(terminal, Frame(["header", "wn01 _A", "wn02 __"]), (24, 80)) == 0
+    assert terminal.writes == [CLEAR_SCREEN + "header\nwn01 __\nwn02 __\n", "\033[2;1Hwn01 _A\033[0m\033[K\033[4;1H", "\033[4;1H"]
+
+
+def test_screen_rows_follow_wrapped_lines():
+    terminal = Terminal()
+    screen = Screen()
+    screen.paint(terminal, Frame(["x" * 15, "a", "b"]), (24, 10))
+    screen.paint(terminal, Frame(["y" * 15, "a", "c"]), (24, 10))
+
+    assert terminal.writes[-1] == "\033[1;1H" + "y" * 15 + "\033[0m\033[K\033[4;1Hc\033[0m\033[K\033[5;1H"
+
+
+@pytest.mark.parametrize(
+    "second_frame, second_term_size, invalidate",
+    [
+        (["a", "b"], (24, 80), True),  # something else was written on the terminal
+        (["a", "b"], (30, 80), False),  # the terminal was resized
+        (["a", "b", "c"], (24, 80), False),  # the frame grew a line
+        (["a", "b" * 90], (24, 80), False),  # a line now wraps
+        (["a"] * 30, (24, 80), False),  # the frame doesn't fit, the terminal scrolls
+    ],
+)
+def test_screen_is_cleared_when_its_rows_cannot_be_trusted(second_frame, second_term_size, invalidate):
+    terminal = Terminal()
+    screen = Screen()
+    screen.paint(terminal, Frame(["a", "b"]), (24, 80))
+    if invalidate:
+        screen.invalidate()
+    screen.paint(terminal, Frame(second_frame), second_term_size)
+
+    assert terminal.writes[-1].startswith(CLEAR_SCREEN)
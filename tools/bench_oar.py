@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+"""Benchmark the OAR worker node read on synthetic oarnodes -s -Y, oarnodes -Y and oarstat files of a large cluster."""
+
+import argparse
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from qtop_py.plugins import oar  # noqa: E402
+
+# the attributes oarnodes -Y lists for every resource, before and after its jobs
+BEFORE_JOBS = """\
+  available_upto: 0
+  besteffort: YES
+  bigmem: NO
+  bigsmp: NO
+  board: 1
+  cluster: bench
+  core: %(core)d
+  cpu: 2
+  cpuarch: x86_64
+  cpucore: 6
+  cpufreq: 2.26
+  cpuset: %(cpuset)d
+  cputype: xeon-gulftown
+  dedicated: NO
+  deploy: NO
+  desktop_computing: NO
+  disktype: ssd
+  enclosure: 1
+  expiry_date: 0
+  finaud_decision: NO
+  gpu: NO
+  gpuecc: NO
+  gputype: none
+  host: %(node)s.bench-cluster.example.org
+  ibpool: 1
+  ip: 10.0.%(node_nr)d.1
+"""
+AFTER_JOBS = """\
+  last_available_upto: 2147483647
+  last_job_date: 1441207291
+  maintenance: off
+  mem: 48
+  memcore: 4
+  memcpu: 24
+  memnode: 48
+  network_address: %(node)s
+  next_finaud_decision: NO
+  next_state: UnChanged
+  nodemodel: Bull_B500
+  os: debian7
+  resource_id: %(resid)d
+  scheduler_priority: 0
+  state: %(state)s
+  state_num: 1
+  suspended_jobs: NO
+  thread: ~
+  type: default
+  visu: NO
+"""
+
+
+def write_oar_files(oarnodes_s_fout, oarnodes_y_fout, oarstat_fout, nodes, cores, seed=0):
+    """
+    Writes the oarnodes -s -Y, oarnodes -Y and oarstat outputs of a cluster of nodes nodes with cores resources each.
+    One node in twenty-five is dead, one in forty has some suspected resources; most of the other resources run a job,
+    whole-node jobs and single-core jobs alternating, and a few jobs wait.
+    """
+    rng = random.Random(seed)
+    oarnodes_s_fout.write("---\n")
+    oarnodes_y_fout.write("---\n")
+    oarstat_fout.write("Job id     Name           User           Submission Date     S Queue\n")
+    oarstat_fout.write("---------- -------------- -------------- ------------------- - ----------\n")
+
+    job_id, resid = 1000000, 0
+    running = []
+    for node_nr in range(nodes):
+        node = "bench-%d" % (node_nr + 1)
+        oarnodes_s_fout.write("%s:\n" % node)
+        whole_node_job = node_nr % 2 == 0
+        if whole_node_job:
+            job_id += 1
+            running.append(job_id)
+        for core in range(cores):
+            resid += 1
+            if node_nr % 25 == 7:
+                state = "Dead"
+            elif node_nr % 40 == 3 and core % 3 == 0:
+                state = "Suspected"
+            else:
+                state = "Alive"
+            oarnodes_s_fout.write("    %d: %s\n" % (resid, state))
+
+            values = {"core": resid, "cpuset": core, "node": node, "node_nr": node_nr % 250, "resid": resid, "state": state}
+            oarnodes_y_fout.write("%d:\n" % resid)
+            oarnodes_y_fout.write(BEFORE_JOBS % values)
+            if state == "Alive" and whole_node_job:
+                oarnodes_y_fout.write("  jobs: %d\n" % job_id)
+            elif state == "Alive" and rng.random() < 0.8:
+                job_id += 1
+                running.append(job_id)
+                oarnodes_y_fout.write("  jobs: %d\n" % job_id)
+            oarnodes_y_fout.write(AFTER_JOBS % values)
+
+    for running_job_id in running:
+        oarstat_fout.write("%-10d %-14s user_%-9d 2015-08-28 08:37:03 R default\n" % (running_job_id, "", running_job_id % 300))
+    for _ in range(max(nodes // 10, 1)):
+        job_id += 1
+        oarstat_fout.write("%-10d %-14s user_%-9d 2015-08-28 08:37:03 W besteffort\n" % (job_id, "", job_id % 300))
+
+
+def write_oar_sourcedir(sourcedir, nodes, cores):
+    """Writes the files of write_oar_files in sourcedir, under the names qtop looks for"""
+    with open(os.path.join(sourcedir, "oarnodes_s_Y.txt"), "w") as oarnodes_s_fout, open(os.path.join(sourcedir, "oarnodes_Y.txt"), "w") as oarnodes_y_fout:
+        with open(os.path.join(sourcedir, "oarstat.txt"), "w") as oarstat_fout:
+            write_oar_files(oarnodes_s_fout, oarnodes_y_fout, oarstat_fout, nodes, cores)
+
+
+def make_batch_system(sourcedir):
+    options = SimpleNamespace(ANONYMIZE=False, SOURCEDIR=sourcedir)
+    filenames = {
+        "oarnodes_s_file": os.path.join(sourcedir, "oarnodes_s_Y.txt"),
+        "oarnodes_y_file": os.path.join(sourcedir, "oarnodes_Y.txt"),
+        "oarstat_file": os.path.join(sourcedir, "oarstat.txt"),
+    }
+    return oar.OARBatchSystem(filenames, {}, options), options
+
+
+def read_worker_nodes(sourcedir):
+    """The worker nodes of the files in sourcedir, going through the jobs first, as a refresh does"""
+    batch_system, options = make_batch_system(sourcedir)
+    job_ids, _, _, job_queues = batch_system.get_jobs_info()
+    return batch_system.get_worker_nodes(job_ids, job_queues, options)
+
+
+def time_read(sourcedir, repeat):
+    """Fastest of repeat timings of the oarnodes scan alone and of the whole worker node read, with the garbage collector off as in timeit"""
+    scan_timings, read_timings = [], []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            batch_system, _ = make_batch_system(sourcedir)
+            start = time.perf_counter()
+            resources = batch_system._read_oarnodes()
+            scan_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            worker_nodes = read_worker_nodes(sourcedir)
+            read_timings.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(scan_timings), min(read_timings), len(resources), worker_nodes
+
+
+def run(nodes, cores, repeat, out=sys.stdout, tmpdir=None):
+    """Returns the scan and the whole worker node read times in seconds"""
+    sourcedir = tempfile.mkdtemp(prefix="oar_bench_", dir=tmpdir)
+    try:
+        write_oar_sourcedir(sourcedir, nodes, cores)
+        oarnodes_y_size = os.path.getsize(os.path.join(sourcedir, "oarnodes_Y.txt"))
+        scan_seconds, read_seconds, resources, worker_nodes = time_read(sourcedir, repeat)
+    finally:
+        shutil.rmtree(sourcedir)
+    busy_cores = sum(len(worker_node["core_job_map"]) for worker_node in worker_nodes)
+    out.write(
+        "nodes=%-6d resources=%-7d busy_cores=%-7d oarnodes_y_mib=%.1f scan_ms=%.1f read_ms=%.1f\n"
+        % (len(worker_nodes), resources, busy_cores, oarnodes_y_size / 1048576.0, scan_seconds * 1e3, read_seconds * 1e3)
+    )
+    return scan_seconds, read_seconds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=1000, help="Number of nodes in the synthetic cluster")
+    parser.add_argument("--cores", type=int, default=20, help="Resources (cores) per node")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings of the read; the fastest one is kept")
+    parser.add_argument("--max-read-ms", type=float, default=350.0, help="Fail if reading the worker nodes takes longer than this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _, read_seconds = run(args.nodes, args.cores, args.repeat)
+    print("worker node read: %.1f ms (max %.1f ms)" % (read_seconds * 1e3, args.max_read_ms))
+    return 0 if read_seconds * 1e3 <= args.max_read_ms else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
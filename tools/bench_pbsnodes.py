@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+"""Benchmark the PBS worker node parsing on synthetic pbsnodes -a files of growing size."""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from qtop_py.plugins.pbs import PBSBatchSystem  # noqa: E402
+
+
+def write_pbsnodes_file(fout, nodes, jobs_per_node, seed=0):
+    """
+    Writes a Torque pbsnodes -a output of nodes worker nodes with jobs_per_node cores each, all of them busy.
+    One node in ten runs an array job, one in a hundred is offline with no jobs at all.
+    """
+    rng = random.Random(seed)
+    job_id = 1000000
+    for node in range(nodes):
+        fout.write("wn%05d.example.org\n" % node)
+        if node % 100 == 99:
+            fout.write("     state = offline\n     np = %d\n     ntype = cluster\n\n" % jobs_per_node)
+            continue
+        fout.write("     state = %s\n     np = %d\n     properties = lcgpro\n     ntype = cluster\n" % (rng.choice(("job-exclusive", "free")), jobs_per_node))
+        if node % 10 == 9:
+            entries = ("%d/%d[%d].pbs.example.org" % (core, job_id, core) for core in range(jobs_per_node))
+        else:
+            entries = ("%d/%d.pbs.example.org" % (core, job_id + core) for core in range(jobs_per_node))
+        fout.write("     jobs = %s\n" % ", ".join(entries))
+        fout.write("     status = opsys=linux,uname=Linux wn%05d 2.6.32 x86_64,sessions=? 0,nsessions=? 0,nusers=0,idletime=1133\n\n" % node)
+        job_id += jobs_per_node
+
+
+def make_batch_system(pbsnodes_file):
+    options = SimpleNamespace(ANONYMIZE=False)
+    return PBSBatchSystem({"pbsnodes_file": pbsnodes_file}, {}, options)
+
+
+def parse_worker_nodes(batch_system, pbsnodes_file):
+    """The worker nodes of the file, without the queue names, which need the jobs of qstat"""
+    with open(pbsnodes_file) as fin:
+        return list(batch_system._iter_worker_nodes(fin))
+
+
+def time_parse(pbsnodes_file, repeat):
+    """Fastest of repeat timings, with the garbage collector off as in timeit"""
+    batch_system = make_batch_system(pbsnodes_file)
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            worker_nodes = parse_worker_nodes(batch_system, pbsnodes_file)
+            timings.append(time.perf_counter() - start)
+            del worker_nodes
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings)
+
+
+def stream_peak_memory(pbsnodes_file):
+    """Peak traced memory in bytes while streaming through the worker nodes of the file, keeping none of them"""
+    batch_system = make_batch_system(pbsnodes_file)
+    tracemalloc.start()
+    try:
+        with open(pbsnodes_file) as fin:
+            for worker_node in batch_system._iter_worker_nodes(fin):
+                pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(max_nodes, jobs_per_node, steps, repeat, out=sys.stdout, tmpdir=None):
+    """Returns a list of (nodes, seconds, peak bytes) triplets, halving the number of nodes at each step"""
+    results = []
+    for step in reversed(range(steps)):
+        nodes = max(max_nodes >> step, 1)
+        fd, pbsnodes_file = tempfile.mkstemp(prefix="pbsnodes_bench_", suffix=".txt", dir=tmpdir)
+        try:
+            with os.fdopen(fd, "w") as fout:
+                write_pbsnodes_file(fout, nodes, jobs_per_node)
+            seconds = time_parse(pbsnodes_file, repeat)
+            peak = stream_peak_memory(pbsnodes_file)
+        finally:
+            os.unlink(pbsnodes_file)
+        jobs = nodes * jobs_per_node
+        results.append((nodes, seconds, peak))
+        out.write("nodes=%-6d jobs=%-8d seconds=%.3f jobs_per_sec=%-9d stream_peak_kib=%.0f\n" % (nodes, jobs, seconds, jobs / seconds if seconds else 0, peak / 1024.0))
+    return results
+
+
+def peak_ratio(results):
+    """How many times more memory streaming the largest file takes than streaming the smallest one; about 1 if it stays flat"""
+    return results[-1][2] / float(results[0][2]) if results[0][2] else 0.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=10000, help="Number of worker nodes in the largest synthetic pbsnodes -a file")
+    parser.add_argument("--jobs-per-node", type=int, default=100, help="Busy cores per worker node, i.e. jobs in its jobs attribute")
+    parser.add_argument("--steps", type=int, default=3, help="Number of sizes to time, halving the nodes each time")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings per size; the fastest one is kept")
+    parser.add_argument("--max-peak-ratio", type=float, default=1.5, help="Fail if streaming the largest file takes more than this times the memory of the smallest one")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args.nodes, args.jobs_per_node, args.steps, args.repeat)
+    ratio = peak_ratio(results)
+    print("memory: streaming %d nodes peaks at %.2fx the memory of %d nodes (max %.2fx)" % (results[-1][0], ratio, results[0][0], args.max_peak_ratio))
+    return 0 if ratio <= args.max_peak_ratio else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+"""
+Benchmark the SGE plugin on synthetic qstat -F -xml files: check that merging hosts listed in several queues scales linearly,
+and time the ElementTree and the lxml XML backends.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from qtop_py.plugins import sge  # noqa: E402
+
+BACKENDS = ("ElementTree", "lxml")
+
+
+def write_sge_file(fout, nodes, queues_per_node, slots, pending, seed=0):
+    """
+    Writes a qstat -F -xml output where each of nodes hosts is listed in queues_per_node queues, each with slots slots.
+    The first queue of a host runs most of its jobs; one host in fifty is disabled. pending jobs wait in job_info.
+    """
+    rng = random.Random(seed)
+    write = fout.write
+    write("<?xml version='1.0'?>\n<job_info>\n  <queue_info>\n")
+    job_id = 1000
+    for queue in range(queues_per_node):
+        for node in range(nodes):
+            slots_used = rng.randrange(slots + 1) if queue == 0 else rng.randrange(2)
+            write("    <Queue-List>\n      <name>q%d@wn%05d.example.org</name>\n      <qtype>BIP</qtype>\n" % (queue, node))
+            write("      <slots_used>%d</slots_used>\n      <slots_total>%d</slots_total>\n" % (slots_used, slots))
+            if node % 50 == 7:
+                write("      <state>d</state>\n")
+            write('      <resource name="num_proc" type="hl">%d</resource>\n' % slots)
+            for nr in range(20):
+                write('      <resource name="load_%d" type="hl">0.%d</resource>\n' % (nr, nr))
+            write('      <resource name="qname" type="qf">q%d</resource>\n' % queue)
+            write('      <resource name="hostname" type="qf">wn%05d.example.org</resource>\n' % node)
+            for _ in range(slots_used):
+                job_id += 1
+                write('      <job_list state="running">\n        <JB_job_number>%d</JB_job_number>\n        <JB_name>job%d</JB_name>\n' % (job_id, job_id))
+                write("        <JB_owner>user%03d</JB_owner>\n        <state>r</state>\n" % rng.randrange(400))
+                write("        <JAT_start_time>2015-02-12T13:50:48</JAT_start_time>\n        <slots>1</slots>\n      </job_list>\n")
+            write("    </Queue-List>\n")
+    write("  </queue_info>\n  <job_info>\n")
+    for _ in range(pending):
+        job_id += 1
+        write('    <job_list state="pending">\n      <JB_job_number>%d</JB_job_number>\n      <JB_name>job%d</JB_name>\n' % (job_id, job_id))
+        write("      <JB_owner>user%03d</JB_owner>\n      <state>qw</state>\n" % rng.randrange(400))
+        write("      <JB_submission_time>2015-02-12T13:50:48</JB_submission_time>\n      <slots>1</slots>\n    </job_list>\n")
+    write("  </job_info>\n</job_info>\n")
+
+
+def read_sge_file(sge_file, backend, one_pass=True):
+    """The jobs, queues and worker nodes of the sge file, as a refresh would get them"""
+    options = SimpleNamespace(ANONYMIZE=False, SAMPLE=False)
+    batch_system = sge.SGEBatchSystem({"sge_file": sge_file}, {"faster_xml_parsing": backend == "lxml"}, options)
+    batch_system.one_pass = one_pass
+    jobs = batch_system.get_jobs_info()
+    queues = batch_system.get_queues_info()
+    worker_nodes = batch_system.get_worker_nodes(jobs[0], jobs[3], options)
+    for worker_node in worker_nodes:
+        worker_node["qname"] = sorted(worker_node["qname"])
+    return jobs, queues, worker_nodes
+
+
+def merge_queue_lists(batch_system, queue_elems):
+    """The worker nodes and queues of the queue_info/Queue-List elements, merged by host and by queue name"""
+    existing_wns, wns_by_name = list(), dict()
+    qstatq_list, queues_by_name = list(), dict()
+    for queue_elem in queue_elems:
+        batch_system._add_queue(qstatq_list, queues_by_name, queue_elem)
+        batch_system._add_worker_node(existing_wns, wns_by_name, queue_elem)
+    return existing_wns, qstatq_list
+
+
+def time_merge(sge_file, repeat):
+    """Fastest of repeat timings of merge_queue_lists, the file being parsed beforehand"""
+    options = SimpleNamespace(ANONYMIZE=False, SAMPLE=False)
+    batch_system = sge.SGEBatchSystem({"sge_file": sge_file}, {}, options)
+    _, root = batch_system.sge_stat_maker.get_xml_tree(sge_file)
+    queue_elems = batch_system.xml.findall(root, "queue_info/Queue-List")
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            merge_queue_lists(batch_system, queue_elems)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings), len(queue_elems)
+
+
+def run_scaling(max_nodes, queues_per_node, slots, steps, repeat, out=sys.stdout, tmpdir=None):
+    """Returns a list of (queue instances, seconds) pairs of the merge, halving the number of hosts at each step"""
+    results = []
+    for step in reversed(range(steps)):
+        nodes = max(max_nodes >> step, 1)
+        fd, sge_file = tempfile.mkstemp(prefix="qstat_bench_", suffix=".F.xml.stdout", dir=tmpdir)
+        try:
+            with os.fdopen(fd, "w") as fout:
+                write_sge_file(fout, nodes, queues_per_node, slots, pending=0)
+            seconds, queue_instances = time_merge(sge_file, repeat)
+        finally:
+            os.unlink(sge_file)
+        results.append((queue_instances, seconds))
+        out.write("nodes=%-6d queue_instances=%-7d merge_seconds=%.3f us_per_queue_instance=%.1f\n" % (nodes, queue_instances, seconds, seconds / queue_instances * 1e6))
+    return results
+
+
+def scaling_ratio(results):
+    """How many times more a queue instance costs at the largest size than at the smallest one; about 1 for linear scaling"""
+    (first_instances, first_seconds), (last_instances, last_seconds) = results[0], results[-1]
+    return (last_seconds / last_instances) / (first_seconds / first_instances) if first_seconds else 0.0
+
+
+def time_read(sge_file, backend, one_pass, repeat):
+    """Fastest of repeat timings, with the garbage collector off as in timeit, along with the results"""
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = read_sge_file(sge_file, backend, one_pass)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings), results
+
+
+def available_backends():
+    return [backend for backend in BACKENDS if backend != "lxml" or sge.lxml_etree is not None]
+
+
+def run(nodes, queues_per_node, slots, pending, repeat, out=sys.stdout, tmpdir=None):
+    """
+    Returns a {(backend, mode): seconds} dict, mode being "one-pass" or "tree",
+    and whether all backends and modes came up with the same results.
+    """
+    fd, sge_file = tempfile.mkstemp(prefix="qstat_bench_", suffix=".F.xml.stdout", dir=tmpdir)
+    try:
+        with os.fdopen(fd, "w") as fout:
+            write_sge_file(fout, nodes, queues_per_node, slots, pending)
+        out.write("sge file: %d hosts x %d queues, %.1f MiB\n" % (nodes, queues_per_node, os.path.getsize(sge_file) / 1048576.0))
+
+        timings, all_results = dict(), list()
+        for backend in available_backends():
+            for mode in ("one-pass", "tree"):
+                seconds, results = time_read(sge_file, backend, mode == "one-pass", repeat)
+                timings[(backend, mode)] = seconds
+                all_results.append(results)
+                out.write("backend=%-12s mode=%-9s seconds=%.3f jobs=%d worker_nodes=%d\n" % (backend, mode, seconds, len(results[0][0]), len(results[2])))
+    finally:
+        os.unlink(sge_file)
+    return timings, all(results == all_results[0] for results in all_results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=3000, help="Number of hosts in the largest synthetic sge file")
+    parser.add_argument("--queues-per-node", type=int, default=12, help="Number of queues each host is listed in")
+    parser.add_argument("--slots", type=int, default=8, help="Slots per host and queue")
+    parser.add_argument("--pending", type=int, default=50000, help="Number of pending jobs")
+    parser.add_argument("--steps", type=int, default=3, help="Number of sizes the merge is timed at, halving the hosts each time")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings per size, backend and mode; the fastest one is kept")
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="Fail if the merge cost per queue instance grows more than this between the smallest and the largest size")
+    parser.add_argument("--skip-backends", action="store_true", help="Only check the merge scaling, without timing the XML backends")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_scaling(args.nodes, args.queues_per_node, args.slots, args.steps, args.repeat)
+    ratio = scaling_ratio(results)
+    print("scaling: merge cost per queue instance at %d instances is %.2fx the one at %d (max %.2fx)" % (results[-1][0], ratio, results[0][0], args.max_ratio))
+    if args.skip_backends:
+        return 0 if ratio <= args.max_ratio else 1
+
+    if sge.lxml_etree is None:
+        print('lxml is not installed; only ElementTree is timed ("pip install lxml" to compare both backends)')
+    timings, consistent = run(args.nodes, args.queues_per_node, args.slots, args.pending, args.repeat)
+    if not consistent:
+        print("The backends or modes disagree on the results!")
+    return 0 if consistent and ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
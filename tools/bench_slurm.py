@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+"""Benchmark the Slurm job-to-node mapping on a synthetic partition running wide MPI jobs."""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from qtop_py.plugins import slurm  # noqa: E402
+
+
+class Options(object):
+    ANONYMIZE = False
+
+
+def write_slurm_files(sinfo_fout, squeue_fout, nodes, cpus, mpi_nodes, pending=1000):
+    """
+    Writes the sinfo -N and squeue outputs of a partition of nodes nodes with cpus CPUs each.
+    Three quarters of the nodes run MPI jobs spanning mpi_nodes whole nodes, written as bracketed hostlists;
+    each of the other nodes is shared by eight small jobs, and pending jobs wait.
+    """
+    for node in range(nodes):
+        sinfo_fout.write("cn%05d|compute*|alloc|%d\n" % (node, cpus))
+
+    job_id = 100000
+    mpi_last = nodes * 3 // 4
+    for first in range(0, mpi_last, mpi_nodes):
+        last = min(first + mpi_nodes, mpi_last) - 1
+        job_id += 1
+        squeue_fout.write("%d|user%03d|R|compute|%d|cn[%05d-%05d]\n" % (job_id, job_id % 300, (last - first + 1) * cpus, first, last))
+    for node in range(mpi_last, nodes):
+        for _ in range(8):
+            job_id += 1
+            squeue_fout.write("%d|user%03d|R|compute|%d|cn%05d\n" % (job_id, job_id % 300, max(cpus // 8, 1), node))
+    for _ in range(pending):
+        job_id += 1
+        squeue_fout.write("%d|user%03d|PD|compute|%d|(Priority)\n" % (job_id, job_id % 300, cpus))
+
+
+def map_worker_nodes(squeue_file, sinfo_file):
+    """The worker nodes of the files, going through the jobs, queues and worker nodes as a refresh does"""
+    batch_system = slurm.SlurmBatchSystem({"squeue_file": squeue_file, "sinfo_file": sinfo_file}, {}, Options())
+    job_ids, _, _, job_queues = batch_system.get_jobs_info()
+    batch_system.get_queues_info()
+    return batch_system.get_worker_nodes(job_ids, job_queues, Options())
+
+
+def time_mapping(squeue_file, sinfo_file, repeat):
+    """
+    Fastest of repeat timings of the job-to-node mapping alone, the files being parsed beforehand,
+    with the hostlist cache cleared before each timing, along with the number of busy cores.
+    """
+    batch_system = slurm.SlurmBatchSystem({"squeue_file": squeue_file, "sinfo_file": sinfo_file}, {}, Options())
+    jobs = list(batch_system._get_snapshot().iter_jobs(batch_system.ACTIVE_STATES))
+    worker_nodes_by_name = dict((node["raw_domainname"], node) for node in batch_system._get_nodes())
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            slurm.expand_hostlist.cache_clear()
+            start = time.perf_counter()
+            node_cores = batch_system._map_jobs_to_nodes(jobs, worker_nodes_by_name)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings), sum(allocation.used for allocation in node_cores.values())
+
+
+def run(nodes, cpus, mpi_nodes, repeat, out=sys.stdout, tmpdir=None, pending=1000):
+    """Returns the mapping and the whole refresh times in seconds"""
+    sinfo_fd, sinfo_file = tempfile.mkstemp(prefix="sinfo_bench_", suffix=".txt", dir=tmpdir)
+    squeue_fd, squeue_file = tempfile.mkstemp(prefix="squeue_bench_", suffix=".txt", dir=tmpdir)
+    try:
+        with os.fdopen(sinfo_fd, "w") as sinfo_fout, os.fdopen(squeue_fd, "w") as squeue_fout:
+            write_slurm_files(sinfo_fout, squeue_fout, nodes, cpus, mpi_nodes, pending)
+        map_seconds, busy_cores = time_mapping(squeue_file, sinfo_file, repeat)
+
+        start = time.perf_counter()
+        worker_nodes = map_worker_nodes(squeue_file, sinfo_file)
+        read_seconds = time.perf_counter() - start
+    finally:
+        os.unlink(sinfo_file)
+        os.unlink(squeue_file)
+    out.write(
+        "nodes=%-6d cpus=%-4d pending=%-7d busy_cores=%-8d map_ms=%.1f refresh_ms=%.1f\n" % (len(worker_nodes), cpus, pending, busy_cores, map_seconds * 1e3, read_seconds * 1e3)
+    )
+    return map_seconds, read_seconds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=6000, help="Number of nodes in the synthetic partition")
+    parser.add_argument("--cpus", type=int, default=128, help="CPUs per node")
+    parser.add_argument("--mpi-nodes", type=int, default=64, help="Number of nodes each MPI job spans")
+    parser.add_argument("--pending", type=int, default=1000, help="Number of pending jobs, which the refresh goes through but the mapping skips")
+    parser.add_argument("--repeat", type=int, default=5, help="Timings of the mapping; the fastest one is kept")
+    parser.add_argument("--max-map-ms", type=float, default=100.0, help="Fail if mapping the jobs to the nodes takes longer than this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    map_seconds, _ = run(args.nodes, args.cpus, args.mpi_nodes, args.repeat, pending=args.pending)
+    print("mapping: %.1f ms (max %.1f ms)" % (map_seconds * 1e3, args.max_map_ms))
+    return 0 if map_seconds * 1e3 <= args.max_map_ms else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
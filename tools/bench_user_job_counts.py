@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+##
+## qtop is a tool to monitor queuing systems - https://github.com/qtop/qtop
+##
+## SPDX-License-Identifier: MIT
+##
+
+"""Benchmark the per-user job counting of the worker node occupancy on synthetic jobs_dicts of growing size."""
+
+import argparse
+import gc
+import random
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import qtop_py.qtop as qtop  # noqa: E402
+from qtop_py.jobtable import JobDoc, JobTable  # noqa: E402
+
+STATE_ABBREVS = {"R": "running_of_user", "Q": "queued_of_user", "C": "cancelled_of_user", "E": "exiting_of_user"}
+
+
+def make_jobs_dict(jobs, users, queues, seed=0):
+    rng = random.Random(seed)
+    user_names = ["user%03d" % nr for nr in range(users)]
+    queue_names = ["queue%02d" % nr for nr in range(queues)]
+    job_states = sorted(STATE_ABBREVS)
+    jobs_dict = OrderedDict(
+        (str(job_id), JobDoc(user_names[rng.randrange(users)], job_states[rng.randrange(len(job_states))], queue_names[rng.randrange(queues)])) for job_id in range(jobs)
+    )
+    return JobTable.from_mapping(jobs_dict)  # as RefreshEngine hands it over in the Document
+
+
+def count_user_jobs(jobs_dict):
+    """
+    The job counting stage of WNOccupancy.calculate: user names/states/queues, the aggregated counts,
+    the user lot and the per state counts of the accounts table. The cluster is left out, so nothing else is calculated.
+    """
+    document = qtop.Document([], jobs_dict, OrderedDict(), 0, 0)
+    wns_occupancy = qtop.WNOccupancy(None, None, document, None, list(jobs_dict))
+    user_job_counts = wns_occupancy._split_user_job_counts(wns_occupancy._count_user_job_triplets())
+    user_alljobs_sorted_lot = wns_occupancy._produce_user_lot(user_job_counts.totals)
+    user_job_per_state_counts = wns_occupancy._create_user_job_counts_from_state_counts(user_job_counts.states, STATE_ABBREVS)
+    return user_job_counts, user_alljobs_sorted_lot, user_job_per_state_counts
+
+
+def time_count_user_jobs(jobs_dict, repeat):
+    """Fastest of repeat timings, with the garbage collector off as in timeit"""
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count_user_jobs(jobs_dict)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings)
+
+
+def run(max_jobs, users, queues, steps, repeat, out=sys.stdout):
+    """Returns a list of (jobs, seconds) pairs, halving the number of jobs at each step"""
+    results = []
+    for step in reversed(range(steps)):
+        jobs = max(max_jobs >> step, 1)
+        jobs_dict = make_jobs_dict(jobs, users, queues)
+        seconds = time_count_user_jobs(jobs_dict, repeat)
+        results.append((jobs, seconds))
+        out.write("jobs=%-9d users=%-5d seconds=%.4f ns_per_job=%.1f\n" % (jobs, users, seconds, seconds / jobs * 1e9))
+    return results
+
+
+def scaling_ratio(results):
+    """How many times more a job costs at the largest size than at the smallest one; about 1 for linear scaling"""
+    (first_jobs, first_seconds), (last_jobs, last_seconds) = results[0], results[-1]
+    return (last_seconds / last_jobs) / (first_seconds / first_jobs) if first_seconds else 0.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=1000000, help="Number of jobs in the largest synthetic jobs_dict")
+    parser.add_argument("--users", type=int, default=900, help="Number of distinct users the jobs are spread over")
+    parser.add_argument("--queues", type=int, default=20, help="Number of distinct queues the jobs are spread over")
+    parser.add_argument("--steps", type=int, default=4, help="Number of sizes to time, halving the jobs each time")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings per size; the fastest one is kept")
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="Fail if the per-job cost grows more than this between the smallest and the largest size")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args.jobs, args.users, args.queues, args.steps, args.repeat)
+    ratio = scaling_ratio(results)
+    print("scaling: per-job cost at %d jobs is %.2fx the one at %d jobs (max %.2fx)" % (results[-1][0], ratio, results[0][0], args.max_ratio))
+    return 0 if ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
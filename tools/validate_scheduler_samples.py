@@ -129,11 +129,25 @@ STATIC_CASES = {
             "markers": [
                 "Summary: Total:183 Up:172 Free:167 Nodes",
                 "1349/2520 cores",
-                "0+0 jobs",
+                "190+69 jobs",
+                "Queues : default: 187 + 69 | besteffort: 3 |",
                 "Worker Nodes occupancy",
                 "User accounts and pool mappings",
             ],
-        }
+        },
+        {
+            "name": "oar-json",
+            "source": ROOT / "tests" / "plugins" / "oar_samples" / "json",
+            "args": ["-s", str(ROOT / "tests" / "plugins" / "oar_samples" / "json"), "-c", "ON", "-F", "-b", "oar"],
+            "markers": [
+                "Summary: Total:3 Up:2 Free:2 Nodes",
+                "7/12 cores",
+                "3+1 jobs",
+                "Queues : default: 2 + 1 | besteffort: 1 |",
+                "Worker Nodes occupancy",
+                "User accounts and pool mappings",
+            ],
+        },
     ],
     "demo": [
         {
@@ -154,6 +168,7 @@ STATIC_CASES = {
 
 SLURM_MARKERS_BY_SAMPLE = {
     "basic": ["Summary: Total:3 Up:3 Free:2 Nodes", "4/16 cores", "2+1 jobs"],
+    "json": ["Summary: Total:5 Up:4 Free:1 Nodes", "34/80 cores", "5+1 jobs"],
     "large_cluster": ["Summary: Total:18 Up:17 Free:9 Nodes", "120/288 cores", "3+1 jobs"],
     "large_mixed": ["Summary: Total:20 Up:19 Free:9 Nodes", "160/320 cores", "3+1 jobs"],
     "large_multi_partition": ["Summary: Total:18 Up:17 Free:10 Nodes", "104/288 cores", "3+1 jobs"],